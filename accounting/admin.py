@@ -1,5 +1,6 @@
 from django.contrib import admin, messages
-from .models import Account, Payment, Payout, FinancialEntry
+from .balance_ledger import with_balances
+from .models import Account, CurrencyRate, Payment, Payout, FinancialEntry
 from django.db import transaction
 
 
@@ -11,6 +12,14 @@ class AccountAdmin(admin.ModelAdmin):
     ordering = ("-created_at",)
     actions = ["make_primary"]  # ← важно: явно регистрируем экшен
 
+    def get_queryset(self, request):
+        # баланс всех строк списка — подзапросом к леджеру, без N+1
+        return with_balances(super().get_queryset(request))
+
+    @admin.display(description="Баланс", ordering="ledger_balance")
+    def balance(self, obj):
+        return obj.balance
+
     @admin.action(description="Сделать выбранный аккаунт primary")
     def make_primary(self, request, queryset):
         # Разрешаем выделять только 1 запись (иначе смысла нет)
@@ -56,3 +65,11 @@ class FinancialEntryAdmin(admin.ModelAdmin):
             if user_id:
                 kwargs["queryset"] = Account.objects.filter(user_id=user_id)
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+@admin.register(CurrencyRate)
+class CurrencyRateAdmin(admin.ModelAdmin):
+    list_display = ('currency', 'date', 'rate')
+    list_filter = ('currency',)
+    date_hierarchy = 'date'
+    ordering = ('currency', '-date')
@@ -0,0 +1,162 @@
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Account, AccountBalanceCheckpoint
+
+
+ZERO = Decimal("0")
+BALANCE_FIELD = models.DecimalField(max_digits=14, decimal_places=2)
+
+
+def event_contribution(is_active, amount) -> Decimal:
+    """Вклад события в баланс счёта: как в Account.balance — активные с суммой."""
+    return amount if is_active and amount is not None else ZERO
+
+
+def _events_model():
+    from schedule.models import Event  # локальный импорт, чтобы избежать циклов
+    return Event
+
+
+def compute_balances(account_ids: Iterable[int]) -> Dict[int, Decimal]:
+    """{account_id: сумма активных событий} одной группировкой (без точек леджера)."""
+    rows = (
+        _events_model().objects.filter(account_id__in=list(account_ids), is_active=True, amount__isnull=False)
+        .values("account_id")
+        .annotate(total=models.Sum("amount"))
+        .order_by()
+    )
+    return {row["account_id"]: row["total"] for row in rows}
+
+
+# ------------------------------------------------------------
+# 🔹 Чтение: баланс аннотацией, без N+1
+# ------------------------------------------------------------
+def with_balances(queryset):
+    """
+    Аннотирует ledger_balance (его читает Account.balance): balance + delta
+    последней точки одним подзапросом. Счёт без точек (ещё не было правок
+    и снимка) считается по событиям — COALESCE до этого подзапроса доходит
+    только для таких строк.
+    """
+    latest = (
+        AccountBalanceCheckpoint.objects.filter(account=models.OuterRef("pk"))
+        .order_by("-month")
+        .annotate(total=models.F("balance") + models.F("delta"))
+        .values("total")[:1]
+    )
+    from_events = (
+        _events_model().objects.filter(account=models.OuterRef("pk"), is_active=True, amount__isnull=False)
+        .order_by()
+        .values("account")
+        .annotate(total=models.Sum("amount"))
+        .values("total")
+    )
+    return queryset.annotate(
+        ledger_balance=Coalesce(
+            models.Subquery(latest, output_field=BALANCE_FIELD),
+            models.Subquery(from_events, output_field=BALANCE_FIELD),
+            models.Value(ZERO),
+            output_field=BALANCE_FIELD,
+        )
+    )
+
+
+# ------------------------------------------------------------
+# 🔹 Запись: дельты от правок событий
+# ------------------------------------------------------------
+def lock_accounts(account_ids: Iterable[int]) -> List[int]:
+    """
+    SELECT ... FOR UPDATE строк счетов (по возрастанию pk) — общая точка
+    сериализации дельт и снимка: пока строка счёта заблокирована, «последняя
+    точка» не сменится. Возвращает pk счетов, которые ещё существуют.
+    Вызывать внутри transaction.atomic().
+    """
+    return list(
+        Account.objects.select_for_update().filter(pk__in=list(account_ids)).order_by("pk").values_list("pk", flat=True)
+    )
+
+
+def apply_balance_delta(account_id: Optional[int], delta: Decimal, create: bool = True):
+    """
+    Прибавляет delta к последней точке счёта (UPDATE ... SET delta = delta + x).
+    Сначала блокирует строку счёта — как и snapshot_balances, — поэтому
+    последняя точка выбирается уже после того, как параллельный снимок
+    записал свою: дельта не попадёт в вытесненную точку и не потеряется.
+    Если точек ещё нет и create — заводит первую с полным пересчётом: событие
+    к этому моменту уже сохранено, так что delta в неё уже входит. Без точки
+    баланс и так считается по событиям, поэтому при удалении (в том числе
+    каскадом вместе со счётом) новую точку не создаём.
+    """
+    if account_id is None or not delta:
+        return
+    with transaction.atomic():
+        if not lock_accounts([account_id]):
+            return
+        latest_pk = (
+            AccountBalanceCheckpoint.objects.filter(account_id=account_id)
+            .order_by("-month")
+            .values("pk")[:1]
+        )
+        updated = AccountBalanceCheckpoint.objects.filter(pk__in=models.Subquery(latest_pk)).update(
+            delta=models.F("delta") + delta, updated_at=timezone.now(),
+        )
+        if updated or not create:
+            return
+        AccountBalanceCheckpoint.objects.create(
+            account_id=account_id,
+            month=current_month(),
+            balance=compute_balances([account_id]).get(account_id, ZERO),
+        )
+
+
+# ------------------------------------------------------------
+# 🔹 Месячный снимок (сверка)
+# ------------------------------------------------------------
+def current_month(today: Optional[date] = None) -> date:
+    return (today or timezone.localdate()).replace(day=1)
+
+
+def snapshot_balances(account_ids: Optional[Iterable[int]] = None, today: Optional[date] = None,
+                      batch_size: int = 500) -> Dict[int, Decimal]:
+    """
+    Снимок месяца: пересчитывает балансы по событиям и пишет их точкой
+    текущего месяца (delta = 0), по batch_size счетов за раз; строки счетов
+    пачки на это время заблокированы (lock_accounts). Заодно это
+    сверка: правки в обход сигналов (QuerySet.update, фикстуры) здесь
+    выравниваются. Возвращает {account_id: расхождение} там, где леджер
+    разошёлся с пересчётом.
+    """
+    month = current_month(today)
+    accounts = Account.objects.order_by("pk")
+    if account_ids is not None:
+        accounts = accounts.filter(pk__in=list(account_ids))
+    ids = list(accounts.values_list("pk", flat=True))
+
+    drift = {}
+    for offset in range(0, len(ids), batch_size):
+        with transaction.atomic():
+            # те же блокировки, что у apply_balance_delta: дельты ждут, пока снимок не запишется
+            batch = lock_accounts(ids[offset:offset + batch_size])
+            previous = {}
+            for checkpoint in AccountBalanceCheckpoint.objects.filter(account_id__in=batch).order_by("account_id", "-month"):
+                previous.setdefault(checkpoint.account_id, checkpoint.total)
+            totals = compute_balances(batch)
+            AccountBalanceCheckpoint.objects.bulk_create(
+                [
+                    AccountBalanceCheckpoint(account_id=account_id, month=month, balance=totals.get(account_id, ZERO))
+                    for account_id in batch
+                ],
+                update_conflicts=True,
+                unique_fields=["account", "month"],
+                update_fields=["balance", "delta", "updated_at"],
+            )
+        for account_id in batch:
+            if account_id in previous and previous[account_id] != totals.get(account_id, ZERO):
+                drift[account_id] = totals.get(account_id, ZERO) - previous[account_id]
+    return drift
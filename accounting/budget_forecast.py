@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List, Tuple
+
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from schedule.models import CompletionStatus, Occurrence
+from schedule.utils.occurrence_helper import add_months
+from schedule.utils.occurrence_index import get_covering_horizon
+from .month_budget_report import iter_planned_hits
+
+
+FORECAST_MAX_MONTHS = 60
+# границы лет: окно переводится в UTC (1 января 1 года уходит за date.min),
+# а его конец считается от первого числа следующего месяца (после 9999-12 его нет)
+FORECAST_MIN_YEAR = 2
+FORECAST_MAX_YEAR = 9998
+
+
+def month_range(start: Tuple[int, int], end: Tuple[int, int]) -> List[Tuple[int, int]]:
+    """Пары (year, month) от start до end включительно."""
+    first = start[0] * 12 + start[1] - 1
+    last = end[0] * 12 + end[1] - 1
+    return [(serial // 12, serial % 12 + 1) for serial in range(first, last + 1)]
+
+
+def _planned_totals_from_index(user, start_dt, end_dt, tz):
+    """{(year, month): (earn, spend)} одной агрегатной выборкой по индексу Occurrence."""
+    rows = (
+        Occurrence.objects.filter(
+            user=user,
+            occurs_at__gte=start_dt,
+            occurs_at__lte=end_dt,
+            event__is_active=True,
+            event__is_balance_correction=False,
+        )
+        .exclude(event__status=CompletionStatus.CANCELLED)
+        .annotate(bucket=TruncMonth("occurs_at", tzinfo=tz))
+        .values("bucket")
+        .annotate(earn=Sum("amount", filter=Q(amount__gt=0)), spend=Sum("amount", filter=Q(amount__lt=0)))
+    )
+    totals = {}
+    for row in rows:
+        bucket = row["bucket"]
+        totals[(bucket.year, bucket.month)] = (row["earn"] or Decimal("0"), row["spend"] or Decimal("0"))
+    return totals
+
+
+def _planned_totals_from_events(user, start_dt, end_dt, tz):
+    """{(year, month): (earn, spend)} одним проходом по событиям окна (iter_planned_hits)."""
+    totals = {}
+    for amount, dates in iter_planned_hits(user, start_dt, end_dt, tz):
+        for occurs_at in dates:
+            key = (occurs_at.year, occurs_at.month)
+            earn, spend = totals.get(key, (Decimal("0"), Decimal("0")))
+            if amount > 0:
+                earn += amount
+            else:
+                spend += amount
+            totals[key] = (earn, spend)
+    return totals
+
+
+def planned_cash_flow(user, start: Tuple[int, int], end: Tuple[int, int], opening_balance=Decimal("0"), tz=None) -> dict:
+    """
+    Плановый денежный поток по месяцам start..end ((year, month) включительно):
+    earn, spend, net и нарастающий прогнозный остаток от opening_balance.
+
+    Суммы — те же, что у planned_finances_month, но за один проход: если
+    индекс Occurrence покрывает всё окно — одна агрегатная выборка с
+    группировкой по месяцу, иначе события окна разворачиваются один раз и
+    раскладываются по месяцам.
+    """
+    tz = tz or timezone.get_current_timezone()
+    months = month_range(start, end)
+    start_dt = datetime(start[0], start[1], 1, tzinfo=tz)
+    end_dt = add_months(datetime(end[0], end[1], 1, tzinfo=tz), 1) - timedelta(seconds=1)
+
+    if get_covering_horizon(start_dt, end_dt):
+        totals = _planned_totals_from_index(user, start_dt, end_dt, tz)
+    else:
+        totals = _planned_totals_from_events(user, start_dt, end_dt, tz)
+
+    balance = Decimal(opening_balance)
+    result = []
+    total_earn = total_spend = Decimal("0")
+    for year, month in months:
+        earn, spend = totals.get((year, month), (Decimal("0"), Decimal("0")))
+        net = earn + spend
+        balance += net
+        total_earn += earn
+        total_spend += spend
+        result.append({
+            "year": year,
+            "month": month,
+            "earn": float(earn),
+            "spend": float(spend),
+            "net": float(net),
+            "balance": float(balance),
+        })
+
+    return {
+        "from": f"{start[0]}-{start[1]:02d}",
+        "to": f"{end[0]}-{end[1]:02d}",
+        "opening_balance": float(opening_balance),
+        "months": result,
+        "totals": {
+            "earn": float(total_earn),
+            "spend": float(total_spend),
+            "net": float(total_earn + total_spend),
+            "closing_balance": float(balance),
+        },
+    }
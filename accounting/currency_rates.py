@@ -0,0 +1,138 @@
+import csv
+import threading
+import time
+from bisect import bisect_right
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from common.choices import currency_choices
+from .models import CurrencyRate
+
+
+# все курсы — в рублях за единицу валюты
+BASE_CURRENCY = "RUB"
+
+
+# ------------------------------------------------------------
+# 🔹 Индекс курсов «на дату»
+# ------------------------------------------------------------
+class RateIndex:
+    """
+    Все CurrencyRate в памяти: по валюте — отсортированные даты и курсы.
+    as_of — bisect по датам, O(log n) без запросов, так что пачку сумм
+    можно перевести в рубли за один проход.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[str, date, Decimal]] = ()):
+        by_currency = {}
+        for currency, day, rate in sorted(rows):
+            by_currency.setdefault(currency, ([], []))
+            dates, rates = by_currency[currency]
+            dates.append(day)
+            rates.append(rate)
+        self._by_currency: Dict[str, Tuple[List[date], List[Decimal]]] = by_currency
+
+    def __len__(self):
+        return sum(len(dates) for dates, _ in self._by_currency.values())
+
+    def as_of(self, currency: str, on_date: date) -> Optional[Decimal]:
+        """Последний курс валюты с датой <= on_date; None — курса ещё нет."""
+        if currency == BASE_CURRENCY:
+            return Decimal("1")
+        series = self._by_currency.get(currency)
+        if series is None:
+            return None
+        dates, rates = series
+        position = bisect_right(dates, on_date)
+        return rates[position - 1] if position else None
+
+    def convert(self, amount: Decimal, currency: str, on_date: date) -> Optional[Decimal]:
+        """amount в рублях по курсу на on_date; None — курса нет."""
+        rate = self.as_of(currency, on_date)
+        return amount * rate if rate is not None else None
+
+    def convert_many(self, items: Iterable[Tuple[Decimal, str, date]]) -> List[Optional[Decimal]]:
+        """[(amount, currency, date)] → суммы в рублях в том же порядке."""
+        return [self.convert(amount, currency, on_date) for amount, currency, on_date in items]
+
+
+# ------------------------------------------------------------
+# 🔹 Кэш индекса на процесс
+# ------------------------------------------------------------
+_lock = threading.Lock()
+_cached_index: Optional[RateIndex] = None
+_loaded_at = 0.0
+
+
+def rate_index() -> RateIndex:
+    """
+    Индекс курсов процесса: грузится одним запросом при первом обращении.
+    Сбрасывают его сигналы CurrencyRate и load_rates_csv; другие воркеры
+    перечитают таблицу не позже чем через ACCOUNTING_RATE_INDEX_TTL секунд.
+    """
+    global _cached_index, _loaded_at
+    ttl = getattr(settings, "ACCOUNTING_RATE_INDEX_TTL", 300)
+    with _lock:
+        if _cached_index is None or (ttl is not None and time.monotonic() - _loaded_at > ttl):
+            _cached_index = RateIndex(CurrencyRate.objects.values_list("currency", "date", "rate").order_by())
+            _loaded_at = time.monotonic()
+        return _cached_index
+
+
+def invalidate_rate_index():
+    global _cached_index
+    with _lock:
+        _cached_index = None
+
+
+# ------------------------------------------------------------
+# 🔹 Загрузка из CSV
+# ------------------------------------------------------------
+def parse_rates_csv(lines: Iterable[str]) -> List[CurrencyRate]:
+    """
+    CSV с заголовком currency,date,rate (date — YYYY-MM-DD, rate — рублей
+    за единицу). Битая строка — ValueError с её номером.
+    """
+    known = {code for code, _ in currency_choices}
+    rates = []
+    reader = csv.DictReader(lines)
+    missing = {"currency", "date", "rate"} - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"В CSV нет колонок: {', '.join(sorted(missing))}")
+    for row in reader:
+        line = reader.line_num
+        currency = (row["currency"] or "").strip().upper()
+        if currency not in known:
+            raise ValueError(f"Строка {line}: неизвестная валюта {row['currency']!r}")
+        try:
+            day = date.fromisoformat((row["date"] or "").strip())
+            rate = Decimal((row["rate"] or "").strip())
+        except (ValueError, InvalidOperation):
+            raise ValueError(f"Строка {line}: ожидаются date=YYYY-MM-DD и числовой rate")
+        if rate <= 0:
+            raise ValueError(f"Строка {line}: курс должен быть больше нуля")
+        rates.append(CurrencyRate(currency=currency, date=day, rate=rate))
+    return rates
+
+
+def load_rates_csv(lines: Iterable[str], batch_size: int = 1000) -> int:
+    """
+    Загружает курсы пачками: bulk_create с обновлением курса у уже
+    существующих (currency, date). Возвращает число строк CSV.
+    """
+    rates = parse_rates_csv(lines)
+    # повтор (currency, date) в одном файле — побеждает последняя строка
+    unique = {(rate.currency, rate.date): rate for rate in rates}
+    CurrencyRate.objects.bulk_create(
+        list(unique.values()),
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["currency", "date"],
+        update_fields=["rate"],
+    )
+    # bulk_create сигналов не шлёт
+    invalidate_rate_index()
+    return len(rates)
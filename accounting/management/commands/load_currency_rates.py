@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounting.currency_rates import load_rates_csv
+
+
+class Command(BaseCommand):
+    help = "Загружает курсы валют (CurrencyRate) из CSV: currency,date,rate. Существующие даты обновляются."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к CSV-файлу.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Размер пачки bulk_create.")
+
+    def handle(self, *args, **opts):
+        try:
+            with open(opts["path"], newline="", encoding="utf-8-sig") as csv_file:
+                loaded = load_rates_csv(csv_file, batch_size=opts["batch_size"])
+        except OSError as e:
+            raise CommandError(f"Не удалось прочитать {opts['path']}: {e}")
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Загружено курсов: {loaded}"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from accounting.balance_ledger import snapshot_balances
+
+
+class Command(BaseCommand):
+    help = "Снимок балансов счетов за текущий месяц (леджер AccountBalanceCheckpoint) со сверкой по событиям. Гонять по cron раз в месяц."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--account", type=int, action="append", help="Только этот счёт (можно несколько раз).")
+        parser.add_argument("--batch-size", type=int, default=500, help="Сколько счетов пересчитывать за транзакцию.")
+
+    def handle(self, *args, **opts):
+        drift = snapshot_balances(opts["account"], batch_size=opts["batch_size"])
+        for account_id, diff in sorted(drift.items()):
+            self.stdout.write(self.style.WARNING(f"Счёт #{account_id}: леджер разошёлся с событиями на {diff}"))
+        self.stdout.write(self.style.SUCCESS(f"Снимок записан, расхождений: {len(drift)}"))
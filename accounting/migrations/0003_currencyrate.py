@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:37
+
+import django.core.validators
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurrencyRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(choices=[('USD', 'USD'), ('RUB', 'RUB'), ('EUR', 'EUR'), ('KZT', 'KZT')], max_length=3)),
+                ('date', models.DateField()),
+                ('rate', models.DecimalField(decimal_places=6, max_digits=14, validators=[django.core.validators.MinValueValidator(Decimal('0.000001'))])),
+            ],
+            options={
+                'ordering': ['currency', 'date'],
+                'constraints': [models.UniqueConstraint(fields=('currency', 'date'), name='unique_currency_rate_per_date')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:39
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0003_currencyrate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountBalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Первое число месяца снимка')),
+                ('balance', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('delta', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_checkpoints', to='accounting.account')),
+            ],
+            options={
+                'ordering': ['account', '-month'],
+                'constraints': [models.UniqueConstraint(fields=('account', 'month'), name='unique_balance_checkpoint_per_month')],
+            },
+        ),
+    ]
@@ -115,6 +115,16 @@ class Account(models.Model):
 
     @property
     def balance(self):
+        """
+        Сумма активных событий счёта. Берётся из аннотации ledger_balance
+        (balance_ledger.with_balances), иначе — из последней точки леджера,
+        иначе считается по событиям.
+        """
+        if 'ledger_balance' in self.__dict__:
+            return self.ledger_balance
+        checkpoint = self.balance_checkpoints.order_by('-month').first()
+        if checkpoint is not None:
+            return checkpoint.total
         total = self.events.filter(
             is_active=True,
             amount__isnull=False,
@@ -122,6 +132,33 @@ class Account(models.Model):
         return total
 
 
+class AccountBalanceCheckpoint(models.Model):
+    """
+    Точка леджера баланса счёта: balance — пересчитанная сумма событий на
+    момент снимка (раз в месяц, `manage.py snapshot_account_balances`),
+    delta — чистое изменение от правок событий после него. Баланс счёта —
+    balance + delta последней точки. Ведёт accounting/balance_ledger.py.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="balance_checkpoints")
+    month = models.DateField(help_text="Первое число месяца снимка")
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+    delta = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["account", "-month"]
+        constraints = [
+            models.UniqueConstraint(fields=["account", "month"], name="unique_balance_checkpoint_per_month"),
+        ]
+
+    def __str__(self):
+        return f"{self.account} {self.month:%Y-%m}: {self.total}"
+
+    @property
+    def total(self):
+        return self.balance + self.delta
+
+
 class Payment(models.Model):
     PAY_SYSTEM_CHOICES = [
         ('paypal', 'PayPal'),
@@ -214,3 +251,22 @@ class FinancialEntry(models.Model):
     def save(self, *args, **kwargs):
         self.full_clean()
         return super().save(*args, **kwargs)
+
+
+class CurrencyRate(models.Model):
+    """
+    Курс валюты к рублю, действующий с date (до следующей записи этой валюты).
+    Поиск «на дату» — accounting/currency_rates.py.
+    """
+    currency = models.CharField(max_length=3, choices=currency_choices)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=14, decimal_places=6, validators=[MinValueValidator(Decimal('0.000001'))])
+
+    class Meta:
+        ordering = ["currency", "date"]
+        constraints = [
+            models.UniqueConstraint(fields=["currency", "date"], name="unique_currency_rate_per_date"),
+        ]
+
+    def __str__(self):
+        return f"{self.currency} {self.date}: {self.rate}"
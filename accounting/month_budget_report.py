@@ -1,12 +1,43 @@
+from .currency_rates import rate_index
 from .models import FinancialEntry
 from decimal import Decimal
-from django.db.models import Sum
-from datetime import datetime
+from django.db.models import F, Q, Sum, Window
+from django.db.models.functions import RowNumber
+from datetime import date, datetime
 from django.utils import timezone
-from schedule.models import Event, CompletionStatus
+from common.choices import EventDateMode, currency_choices
+from schedule.models import Event, CompletionStatus, Occurrence
+from schedule.utils.occurrence_helper import add_months, expand_event, first_of_month
+from schedule.utils.occurrence_index import get_covering_horizon
+from schedule.utils.recurrence_cache import with_cached_recurrence
 import calendar
 
 
+# курс, если нет ни вывода за месяц, ни CurrencyRate на его конец
+DEFAULT_RATES = {
+    'RUB': Decimal('1'),
+    'USD': Decimal('72'),
+    'EUR': Decimal('80')
+}
+
+
+def _month_last_day(year, month):
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _rate_from_entry(latest_entry, currency, on_date):
+    """
+    Курс месяца: по последнему выводу (local_amount / amount), иначе —
+    CurrencyRate на on_date (индекс процесса), иначе — дефолт.
+    """
+    if latest_entry and latest_entry.local_amount is not None and latest_entry.amount:
+        return latest_entry.local_amount / latest_entry.amount
+    rate = rate_index().as_of(currency, on_date)
+    if rate is not None:
+        return rate
+    return DEFAULT_RATES.get(currency, Decimal('0'))
+
+
 def get_rate(user, year, month, currency):
     latest_entry = FinancialEntry.objects.filter(
         user=user,
@@ -16,16 +47,28 @@ def get_rate(user, year, month, currency):
         currency=currency
     ).order_by('-id').first()
 
-    if latest_entry:
-        return latest_entry.local_amount / latest_entry.amount
+    return _rate_from_entry(latest_entry, currency, _month_last_day(year, month))
 
-    default_rates = {
-        'rub': Decimal('1'),
-        'usd': Decimal('72'),
-        'eur': Decimal('80')
-    }
 
-    return default_rates.get(currency, Decimal('0'))
+def get_rates(user, year, month):
+    """
+    Курсы всех валют за месяц одним запросом: последний (по id) вывод
+    в каждой валюте — через оконную ROW_NUMBER() по currency (аналог
+    DISTINCT ON, но работает и на SQLite). Где вывода нет — CurrencyRate
+    на последний день месяца из индекса в памяти.
+    """
+    latest_withdrawals = (
+        FinancialEntry.objects.filter(user=user, year=year, month=month, entry_type="withdraw")
+        .annotate(position=Window(RowNumber(), partition_by=[F("currency")], order_by=F("id").desc()))
+        .filter(position=1)
+        .only("currency", "amount", "local_amount")
+    )
+    latest = {entry.currency: entry for entry in latest_withdrawals}
+    on_date = _month_last_day(year, month)
+    return {
+        currency: _rate_from_entry(latest.get(currency), currency, on_date)
+        for currency, _ in currency_choices
+    }
 
 
 def planned_finances_month(user, month: int, year: int, tz=None):
@@ -41,37 +84,86 @@ def planned_finances_month(user, month: int, year: int, tz=None):
     last_day = calendar.monthrange(year, month)[1]
     end_dt = datetime(year, month, last_day, 23, 59, 59, tzinfo=tz)
 
-    earn = 0
-    spend = 0
+    # индекс вхождений покрывает месяц → одна агрегатная выборка по (user, occurs_at)
+    if get_covering_horizon(start_dt, end_dt):
+        totals = Occurrence.objects.filter(
+            user=user,
+            occurs_at__gte=start_dt,
+            occurs_at__lte=end_dt,
+            event__is_active=True,
+            event__is_balance_correction=False,
+        ).exclude(event__status=CompletionStatus.CANCELLED).aggregate(
+            earn=Sum('amount', filter=Q(amount__gt=0)),
+            spend=Sum('amount', filter=Q(amount__lt=0)),
+        )
+        return {
+            "earn": float(totals['earn'] or 0),
+            "spend": float(totals['spend'] or 0),
+        }
+
+    return planned_finances_from_events(user, start_dt, end_dt, tz)
+
+
+# ------------------------------------------------------------
+# 🔹 Плановые суммы без индекса: SQL-префильтр + поток
+# ------------------------------------------------------------
+PLANNED_EVENT_FIELDS = (
+    "id", "amount", "date_mode", "is_recurring_monthly", "month_interval",
+    "start_datetime", "end_datetime", "updated_at",
+)
+
+
+def planned_events_q(month_start, next_month) -> Q:
+    """
+    События, у которых МОГУТ быть вхождения в месяцах [month_start, next_month):
+      • одиночные (и «за месяц») — start_datetime внутри окна;
+      • серии (RRULE в режиме точной даты или «каждые N месяцев») —
+        начались до конца окна и не закончились до его начала.
+    Точную отсечку делает expand_event — фильтр только отбрасывает историю.
+    """
+    has_rrule = Q(date_mode=EventDateMode.EXACT_DATE, recurrence__isnull=False) & ~Q(recurrence="")
+    monthly = Q(date_mode=EventDateMode.NUMBER_OF_MONTH, is_recurring_monthly=True)
+    alive = Q(end_datetime__isnull=True) | Q(end_datetime__gte=month_start)
+    return (
+        Q(start_datetime__gte=month_start, start_datetime__lt=next_month)
+        | ((has_rrule | monthly) & Q(start_datetime__lt=next_month) & alive)
+    )
 
-    # Берём все активные события без фильтра по start_datetime
-    events = Event.objects.filter(
-        user=user,
-        is_active=True,
-        is_balance_correction=False
-    ).exclude(status=CompletionStatus.CANCELLED)
-
-    print(events)
-
-    for event in events:
-        # --- одноразовые события ---
-        if not event.recurrence:
-            if start_dt <= event.start_datetime <= end_dt:
-                if event.amount:
-                    if event.amount > 0:
-                        earn += event.amount
-                    elif event.amount < 0:
-                        spend += event.amount
-
-        # --- повторяющиеся события ---
+
+def iter_planned_hits(user, start_dt, end_dt, tz, chunk_size=500):
+    """
+    Поток (event.amount, [даты вхождений]) по событиям с суммой, которые
+    могут попасть в [start_dt, end_dt]. Стоимость — от числа таких событий,
+    а не от всей истории пользователя: SQL-префильтр (planned_events_q),
+    только нужные колонки, чтение потоком (.iterator()), правила — из
+    recurrence_cache. Сумма вхождения — сумма события (EventInstance меняет
+    только статус), поэтому объекты вхождений не создаются.
+    """
+    range_start = first_of_month(start_dt, tz)
+    range_end = add_months(first_of_month(end_dt, tz), 1)
+    events = (
+        Event.objects.filter(user=user, is_active=True, is_balance_correction=False)
+        .exclude(status=CompletionStatus.CANCELLED)
+        .exclude(amount__isnull=True)
+        .exclude(amount=0)
+        .filter(planned_events_q(range_start, range_end))
+        .only(*PLANNED_EVENT_FIELDS)
+    )
+    for event in with_cached_recurrence(events, chunk_size=chunk_size):
+        dates = [occurs_at for occurs_at, _ in expand_event(event, start_dt, end_dt, tz)]
+        if dates:
+            yield event.amount, dates
+
+
+def planned_finances_from_events(user, start_dt, end_dt, tz, chunk_size=500):
+    """Плановые earn/spend за месяц разворачиванием «на лету» (см. iter_planned_hits)."""
+    earn = Decimal("0")
+    spend = Decimal("0")
+    for amount, dates in iter_planned_hits(user, start_dt, end_dt, tz, chunk_size):
+        if amount > 0:
+            earn += amount * len(dates)
         else:
-            occurrences = event.get_occurrences(start_dt, end_dt, tz)
-            for occ in occurrences:
-                if occ.amount:
-                    if occ.amount > 0:
-                        earn += occ.amount
-                    elif occ.amount < 0:
-                        spend += occ.amount
+            spend += amount * len(dates)
 
     return {
         "earn": float(earn),
@@ -79,51 +171,41 @@ def planned_finances_month(user, month: int, year: int, tz=None):
     }
 
 
-def get_complete_report(user, month, year):
-    all_currencies = [code for code, _ in FinancialEntry.currency_choices]
-
-    rates = {
-        currency: get_rate(user, year, month, currency)
-        for currency in all_currencies
-    }
-
-    total_income_rub = Decimal('0')
-    total_withdraw_rub = Decimal('0')
-
-    # Группировка доходов по валютам
-    earn_entries_by_currency = FinancialEntry.objects.filter(
-        user=user,
-        month=month,
-        year=year,
-        entry_type="earn"
-    ).values('currency').annotate(total=Sum('amount'))
-
-    for item in earn_entries_by_currency:
-        currency = item['currency']
-        amount = item['total'] or Decimal('0')
-        rate = rates.get(currency, Decimal('0'))
-        total_income_rub += amount * rate
+def get_entries_report(user, month, year):
+    """
+    Фактические суммы месяца в рублях — ровно два запроса (плюс разовая
+    загрузка индекса курсов процесса):
+      1) курсы (get_rates);
+      2) одна агрегация FinancialEntry по валютам с условными суммами
+         earn / withdraw.
+    """
+    rates = get_rates(user, year, month)
 
-    # Группировка выводов по валютам
-    withdraw_entries_by_currency = FinancialEntry.objects.filter(
+    totals_by_currency = FinancialEntry.objects.filter(
         user=user,
         month=month,
         year=year,
-        entry_type="withdraw"
-    ).values('currency').annotate(total=Sum('amount'))
-
-    for item in withdraw_entries_by_currency:
-        currency = item['currency']
-        amount = item['total'] or Decimal('0')
-        rate = rates.get(currency, Decimal('0'))
-        total_withdraw_rub += amount * rate
+    ).values('currency').annotate(
+        earn=Sum('amount', filter=Q(entry_type="earn")),
+        withdraw=Sum('amount', filter=Q(entry_type="withdraw")),
+    ).order_by()
 
-    remaining_rub = total_income_rub - total_withdraw_rub
+    total_income_rub = Decimal('0')
+    total_withdraw_rub = Decimal('0')
+    for item in totals_by_currency:
+        rate = rates.get(item['currency'], Decimal('0'))
+        total_income_rub += (item['earn'] or Decimal('0')) * rate
+        total_withdraw_rub += (item['withdraw'] or Decimal('0')) * rate
 
     return {
         'total_income_rub': total_income_rub,
         'total_withdraw_rub': total_withdraw_rub,
-        'remaining_rub': remaining_rub,
-        'rates': rates,  # {'usd': Decimal(...), ...}
-        'planned': planned_finances_month(user, month, year)
+        'remaining_rub': total_income_rub - total_withdraw_rub,
+        'rates': rates,  # {'USD': Decimal(...), ...}
     }
+
+
+def get_complete_report(user, month, year):
+    report = get_entries_report(user, month, year)
+    report['planned'] = planned_finances_month(user, month, year)
+    return report
@@ -3,6 +3,9 @@ from .models import Account, Payment, Payout
 
 
 class AccountSerializer(serializers.ModelSerializer):
+    # из аннотации ledger_balance (balance_ledger.with_balances)
+    balance = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+
     class Meta:
         model = Account
         fields = '__all__'
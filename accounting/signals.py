@@ -1,7 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import Account
+from schedule.models import Event
+from .balance_ledger import apply_balance_delta, event_contribution
+from .currency_rates import invalidate_rate_index
+from .models import Account, CurrencyRate
 
 User = get_user_model()
 
@@ -14,4 +17,43 @@ def create_default_account(sender, instance, created, **kwargs):
                 user=instance,
                 name="Основной счет",
                 is_primary=True,
-            )
\ No newline at end of file
+            )
+
+
+@receiver([post_save, post_delete], sender=CurrencyRate)
+def reset_rate_index(sender, **kwargs):
+    invalidate_rate_index()
+
+
+# --- Леджер балансов (AccountBalanceCheckpoint) ---
+# Правка события двигает delta последней точки его счёта (старого и нового,
+# если счёт сменился). Правки в обход сигналов выравнивает месячный снимок.
+
+@receiver(pre_save, sender=Event)
+def remember_event_balance(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    old = Event.objects.filter(pk=instance.pk).values_list("account_id", "is_active", "amount").first()
+    instance._cached_old_balance = (old[0], event_contribution(old[1], old[2])) if old else None
+
+
+@receiver(post_save, sender=Event)
+def update_balance_on_event_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    new = event_contribution(instance.is_active, instance.amount)
+    old = None if created else getattr(instance, "_cached_old_balance", None)
+    if old is not None and old[0] == instance.account_id:
+        apply_balance_delta(instance.account_id, new - old[1])
+        return
+    moves = [(instance.account_id, new)]
+    if old is not None:
+        moves.append((old[0], -old[1]))
+    # счета блокируются по возрастанию pk, как в snapshot_balances, — без взаимных блокировок
+    for account_id, delta in sorted(moves, key=lambda move: move[0] or 0):
+        apply_balance_delta(account_id, delta)
+
+
+@receiver(post_delete, sender=Event)
+def update_balance_on_event_delete(sender, instance, **kwargs):
+    apply_balance_delta(instance.account_id, -event_contribution(instance.is_active, instance.amount), create=False)
@@ -1,3 +1,231 @@
+import random
+from datetime import date, datetime
+from decimal import Decimal
+
+import recurrence
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from common.choices import EventDateMode
+from schedule.models import CompletionStatus, Event
+from schedule.utils.occurrence_index import rebuild_occurrence_index
+from .balance_ledger import apply_balance_delta, snapshot_balances, with_balances
+from .currency_rates import RateIndex, invalidate_rate_index, load_rates_csv, rate_index
+from .models import Account, AccountBalanceCheckpoint, CurrencyRate, FinancialEntry
+from .budget_forecast import planned_cash_flow
+from .month_budget_report import get_entries_report, planned_finances_month
+
+
+class EntriesReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="report", password="x")
+        entries = [
+            ("USD", "earn", "100", None),
+            ("USD", "earn", "50", None),
+            ("USD", "withdraw", "40", "3600"),   # старый вывод — 90
+            ("USD", "withdraw", "20", "2000"),   # последний вывод — 100
+            ("RUB", "earn", "1000", None),
+            ("RUB", "spend", "300", None),
+            ("EUR", "withdraw", "10", None),     # без local_amount — дефолт
+        ]
+        FinancialEntry.objects.bulk_create([
+            FinancialEntry(user=cls.user, year=2025, month=3, currency=currency, entry_type=entry_type,
+                           amount=Decimal(amount), local_amount=local and Decimal(local))
+            for currency, entry_type, amount, local in entries
+        ])
+        # другой месяц не должен попадать в отчёт
+        FinancialEntry.objects.create(user=cls.user, year=2025, month=4, currency="USD",
+                                      entry_type="earn", amount=Decimal("999"))
+
+    def setUp(self):
+        invalidate_rate_index()
+
+    def test_two_queries(self):
+        rate_index()  # индекс курсов грузится раз на процесс
+        with self.assertNumQueries(2):
+            get_entries_report(self.user, 3, 2025)
+
+    def test_totals(self):
+        # USD — 100 по последнему выводу, RUB — 1, EUR — дефолтные 80 (курсов в CurrencyRate нет)
+        report = get_entries_report(self.user, 3, 2025)
+        self.assertEqual(report["rates"]["USD"], Decimal("100"))
+        self.assertEqual(report["rates"]["RUB"], Decimal("1"))
+        self.assertEqual(report["rates"]["EUR"], Decimal("80"))
+        self.assertEqual(report["total_income_rub"], Decimal("16000"))    # 150 * 100 + 1000 * 1
+        self.assertEqual(report["total_withdraw_rub"], Decimal("6800"))   # 60 * 100 + 10 * 80
+        self.assertEqual(report["remaining_rub"], Decimal("9200"))
+
+    def test_currency_rate_fallback(self):
+        CurrencyRate.objects.create(currency="EUR", date=date(2025, 3, 1), rate=Decimal("95"))
+        CurrencyRate.objects.create(currency="EUR", date=date(2025, 4, 1), rate=Decimal("99"))
+        report = get_entries_report(self.user, 3, 2025)
+        self.assertEqual(report["rates"]["EUR"], Decimal("95"))
+        self.assertEqual(report["rates"]["RUB"], Decimal("1"))
+
+
+class BudgetForecastTests(TestCase):
+    RULES = (
+        "RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH",
+        "RRULE:FREQ=MONTHLY;BYMONTHDAY=31",
+        "RRULE:FREQ=DAILY;INTERVAL=9;COUNT=20",
+    )
+
+    def setUp(self):
+        self.tz = timezone.get_current_timezone()
+        self.user = get_user_model().objects.create_user(username="forecast", password="x")
+        rng = random.Random(22)
+        for _ in range(40):
+            start = datetime(rng.choice((2024, 2025)), rng.randint(1, 12), rng.randint(1, 28), rng.randint(0, 23),
+                             tzinfo=self.tz)
+            kwargs = {
+                "name": "e",
+                "amount": Decimal(rng.choice((-1, 1)) * rng.randint(1, 500)),
+                "start_datetime": start,
+                "is_active": rng.random() > 0.1,
+            }
+            if rng.random() < 0.1:
+                kwargs["status"] = CompletionStatus.CANCELLED
+            kind = rng.choice(("single", "rrule", "months"))
+            if kind == "rrule":
+                kwargs["recurrence"] = recurrence.deserialize(rng.choice(self.RULES))
+            elif kind == "months":
+                kwargs.update(date_mode=EventDateMode.NUMBER_OF_MONTH, is_recurring_monthly=True,
+                              month_interval=rng.randint(1, 4))
+            if kind != "single" and rng.random() < 0.5:
+                kwargs["end_datetime"] = start.replace(year=start.year + 1)
+            Event.objects.create(user=self.user, **kwargs)
+        self.windows = []
+        for _ in range(15):
+            first = rng.randint(2024 * 12, 2026 * 12 + 6)
+            last = first + rng.randint(0, 8)
+            self.windows.append(((first // 12, first % 12 + 1), (last // 12, last % 12 + 1)))
+
+    def assertForecastMatchesMonths(self):
+        for start, end in self.windows:
+            with self.subTest(start=start, end=end):
+                forecast = planned_cash_flow(self.user, start, end)
+                for row in forecast["months"]:
+                    month = planned_finances_month(self.user, row["month"], row["year"])
+                    self.assertAlmostEqual(row["earn"], month["earn"], places=2)
+                    self.assertAlmostEqual(row["spend"], month["spend"], places=2)
+
+    def test_matches_planned_finances_month_from_events(self):
+        self.assertForecastMatchesMonths()
+
+    def test_matches_planned_finances_month_from_index(self):
+        rebuild_occurrence_index(datetime(2024, 1, 1, tzinfo=self.tz), datetime(2027, 12, 31, 23, 59, 59, tzinfo=self.tz))
+        self.assertForecastMatchesMonths()
+
+    def test_out_of_range_years_are_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for params in ({"from": "0-01", "to": "0-12"}, {"from": "1-01", "to": "1-12"},
+                       {"from": "9999-12", "to": "9999-12"}, {"from": "9998-12", "to": "9999-01"}):
+            with self.subTest(**params):
+                self.assertEqual(client.get("/api/accounting/budget/forecast/", params).status_code, 400)
+        response = client.get("/api/accounting/budget/forecast/", {"from": "9998-01", "to": "9998-12"})
+        self.assertEqual(response.status_code, 200)
+
+
+class RateIndexTests(TestCase):
+    def test_as_of(self):
+        index = RateIndex([
+            ("USD", date(2025, 2, 1), Decimal("90")),
+            ("USD", date(2025, 1, 1), Decimal("80")),
+        ])
+        self.assertIsNone(index.as_of("USD", date(2024, 12, 31)))
+        self.assertEqual(index.as_of("USD", date(2025, 1, 31)), Decimal("80"))
+        self.assertEqual(index.as_of("USD", date(2025, 2, 1)), Decimal("90"))
+        self.assertEqual(index.as_of("RUB", date(2000, 1, 1)), Decimal("1"))
+        self.assertIsNone(index.as_of("KZT", date(2025, 2, 1)))
+        self.assertEqual(
+            index.convert_many([(Decimal("2"), "USD", date(2025, 3, 1)), (Decimal("5"), "KZT", date(2025, 3, 1))]),
+            [Decimal("180"), None],
+        )
+
+    def test_load_csv_updates_existing(self):
+        CurrencyRate.objects.create(currency="USD", date=date(2025, 1, 1), rate=Decimal("1"))
+        loaded = load_rates_csv([
+            "currency,date,rate",
+            "usd,2025-01-01,80.5",
+            "EUR,2025-01-01,88",
+        ])
+        self.assertEqual(loaded, 2)
+        self.assertEqual(CurrencyRate.objects.get(currency="USD").rate, Decimal("80.5"))
+        self.assertEqual(rate_index().as_of("EUR", date(2025, 6, 1)), Decimal("88"))
+
+    def test_load_csv_rejects_bad_rows(self):
+        with self.assertRaises(ValueError):
+            load_rates_csv(["currency,date,rate", "GBP,2025-01-01,100"])
+        with self.assertRaises(ValueError):
+            load_rates_csv(["currency,date,rate", "USD,01.01.2025,100"])
+
+
+class BalanceLedgerTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="ledger", password="x")
+        self.account = Account.objects.get(user=self.user)
+        # не objects.create: Account.save для нового непервичного счёта сохраняет дважды
+        self.other = Account(user=self.user, name="Карта")
+        self.other.save()
+
+    def event(self, amount, **kwargs):
+        return Event.objects.create(user=self.user, account=self.account, name="e", amount=Decimal(amount), **kwargs)
+
+    def assertLedgerMatchesEvents(self):
+        for account in with_balances(Account.objects.filter(user=self.user)):
+            expected = sum(
+                account.events.filter(is_active=True, amount__isnull=False).values_list("amount", flat=True),
+                Decimal("0"),
+            )
+            self.assertEqual(account.balance, expected)
+
+    def test_event_changes_move_delta(self):
+        first = self.event("100")
+        second = self.event("-30")
+        self.assertEqual(AccountBalanceCheckpoint.objects.get(account=self.account).total, Decimal("70"))
+
+        second.amount = Decimal("-50")
+        second.save()
+        first.is_active = False
+        first.save()
+        second.account = self.other
+        second.save()
+        self.event("10").delete()
+        self.assertLedgerMatchesEvents()
+        self.assertEqual(AccountBalanceCheckpoint.objects.get(account=self.other).total, Decimal("-50"))
+
+    def test_list_annotates_in_one_query(self):
+        self.event("100")
+        Event.objects.create(user=self.user, account=self.other, name="e", amount=Decimal("5"))
+        AccountBalanceCheckpoint.objects.filter(account=self.other).delete()  # без точки — по событиям
+        with self.assertNumQueries(1):
+            balances = {account.pk: account.balance for account in with_balances(Account.objects.all())}
+        self.assertEqual(balances[self.account.pk], Decimal("100"))
+        self.assertEqual(balances[self.other.pk], Decimal("5"))
+
+    def test_snapshot_reconciles_bypassed_updates(self):
+        self.event("100")
+        Event.objects.filter(account=self.account).update(amount=Decimal("120"))
+        drift = snapshot_balances([self.account.pk, self.other.pk])
+        self.assertEqual(drift, {self.account.pk: Decimal("20")})
+        self.assertLedgerMatchesEvents()
+
+    def test_delta_after_new_snapshot_lands_on_latest_checkpoint(self):
+        self.event("100")
+        snapshot_balances([self.account.pk], today=date(2000, 1, 15))
+        snapshot_balances([self.account.pk])  # точка текущего месяца вытесняет январскую
+        self.event("25")
+        checkpoints = AccountBalanceCheckpoint.objects.filter(account=self.account).order_by("month")
+        self.assertEqual([checkpoint.delta for checkpoint in checkpoints], [Decimal("0"), Decimal("25")])
+        self.assertLedgerMatchesEvents()
 
-# Create your tests here.
+    def test_delta_for_missing_account_is_ignored(self):
+        missing_pk = self.other.pk
+        self.other.delete()
+        apply_balance_delta(missing_pk, Decimal("10"))
+        self.assertFalse(AccountBalanceCheckpoint.objects.filter(account_id=missing_pk).exists())
+        self.assertEqual(snapshot_balances([missing_pk]), {})
@@ -1,5 +1,5 @@
 from rest_framework.routers import DefaultRouter
-from .views import AccountViewSet, PaymentViewSet, PayoutViewSet, BudgetReport
+from .views import AccountViewSet, PaymentViewSet, PayoutViewSet, BudgetReport, BudgetForecast
 from django.urls import path, include
 
 
@@ -11,6 +11,7 @@ router.register(r'payouts', PayoutViewSet)
 urlpatterns = [
 
     path('budget/',  BudgetReport.as_view(), name='budget-remaining'),
+    path('budget/forecast/', BudgetForecast.as_view(), name='budget-forecast'),
 
     # ViewSets (DRF)
     path('', include(router.urls)),
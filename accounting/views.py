@@ -1,15 +1,19 @@
+from decimal import Decimal, InvalidOperation
+
 from rest_framework import viewsets
 from rest_framework.response import Response
 from .models import Account, Payment, Payout
 from .serializers import AccountSerializer, PaymentSerializer, PayoutSerializer
 from rest_framework.views import APIView
 from .month_budget_report import get_complete_report
+from .balance_ledger import with_balances
+from .budget_forecast import FORECAST_MAX_MONTHS, FORECAST_MAX_YEAR, FORECAST_MIN_YEAR, planned_cash_flow
 from rest_framework.permissions import IsAuthenticated
 
 
 
 class AccountViewSet(viewsets.ModelViewSet):
-    queryset = Account.objects.all()
+    queryset = with_balances(Account.objects.all())
     serializer_class = AccountSerializer
 
 
@@ -36,3 +40,39 @@ class BudgetReport(APIView):
         budget_report = get_complete_report(user, month, year, )
 
         return Response(budget_report)
+
+
+def _parse_year_month(value):
+    """'YYYY-MM' → (year, month) или None (в том числе для года вне FORECAST_MIN_YEAR..FORECAST_MAX_YEAR)."""
+    try:
+        year, month = (int(part) for part in str(value).split("-"))
+    except (TypeError, ValueError):
+        return None
+    if not 1 <= month <= 12 or not FORECAST_MIN_YEAR <= year <= FORECAST_MAX_YEAR:
+        return None
+    return year, month
+
+
+class BudgetForecast(APIView):
+    """
+    Плановый денежный поток по месяцам: ?from=YYYY-MM&to=YYYY-MM[&opening_balance=].
+    Один проход по событиям вместо вызова budget/ на каждый месяц.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        start = _parse_year_month(request.query_params.get('from'))
+        end = _parse_year_month(request.query_params.get('to'))
+        if start is None or end is None:
+            return Response({'error': 'Неверные параметры from/to (YYYY-MM)'}, status=400)
+        months_count = (end[0] * 12 + end[1]) - (start[0] * 12 + start[1]) + 1
+        if months_count < 1:
+            return Response({'error': "'from' не может быть позже 'to'"}, status=400)
+        if months_count > FORECAST_MAX_MONTHS:
+            return Response({'error': f'Не больше {FORECAST_MAX_MONTHS} месяцев за запрос'}, status=400)
+        try:
+            opening_balance = Decimal(request.query_params.get('opening_balance', '0'))
+        except InvalidOperation:
+            return Response({'error': 'Неверный параметр opening_balance'}, status=400)
+
+        return Response(planned_cash_flow(request.user, start, end, opening_balance=opening_balance))
@@ -112,3 +112,46 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
+
+
+# Индекс вхождений событий (schedule.Occurrence): сколько месяцев истории
+# и сколько месяцев вперёд держать материализованными.
+# Горизонт двигает `manage.py rebuild_occurrences --extend` (по cron).
+SCHEDULE_OCCURRENCE_HISTORY_MONTHS = 12
+SCHEDULE_OCCURRENCE_HORIZON_MONTHS = 12
+
+# Кэш скомпилированных RRULE событий (ключ — event_id + updated_at):
+# размер локального LRU на процесс и, опционально, алиас из CACHES
+# для общего уровня между воркерами (None — только локальный).
+SCHEDULE_RECURRENCE_CACHE_SIZE = 2048
+SCHEDULE_RECURRENCE_SHARED_CACHE = None
+
+# Кэш готовых месячных ответов (all_events, preview): алиас из CACHES,
+# TTL записей и общий выключатель. Сброс — сигналами (schedule/signals.py).
+SCHEDULE_MONTH_CACHE_ALIAS = "default"
+SCHEDULE_MONTH_CACHE_TIMEOUT = 3600
+SCHEDULE_MONTH_CACHE_ENABLED = True
+
+# Размер LRU-мемо разметки дней по шаблону (ключ — версия шаблона + год/месяц).
+SCHEDULE_DAY_TYPES_MEMO_SIZE = 1024
+
+# На сколько месяцев вперёд заранее создавать MonthSchedule всем пользователям
+# (`manage.py materialize_month_schedules`, по cron) — превью тогда только читает.
+SCHEDULE_MONTH_SCHEDULE_HORIZON_MONTHS = 12
+
+# Планировщик заказов (schedule/utils/capacity_planner.py): окно в днях и,
+# при желании, часы на работу по Artwork.type (перекрывают встроенные).
+SCHEDULE_PLANNER_HORIZON_DAYS = 120
+# SCHEDULE_ARTWORK_TYPE_HOURS = {"sketch": 4, "premium_render": 28}
+# Автораскладка задач: не больше N задач с таким type / category в день.
+# SCHEDULE_TASK_DAY_LIMITS = {"type": {"heavy": 1}, "category": {}}
+
+# Поиск свободного времени: начало рабочего дня (длина — working_day_duration
+# шаблона) и длина забронированного Slot (у модели есть только начало).
+SCHEDULE_WORKDAY_START = "10:00"
+SCHEDULE_SLOT_MINUTES = 120
+
+# Курсы валют (accounting.CurrencyRate, `manage.py load_currency_rates`):
+# индекс курсов держится в памяти процесса; через сколько секунд другие
+# воркеры перечитают таблицу после правки (None — только по сигналам).
+ACCOUNTING_RATE_INDEX_TTL = 300
@@ -0,0 +1,86 @@
+import tracemalloc
+from copy import deepcopy
+from datetime import datetime, timedelta
+from decimal import Decimal
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from recurrence import Recurrence, Rule, DAILY
+
+from schedule.models import Event
+from schedule.utils.occurrence_helper import EventOccurrence, expand_event
+
+
+def _deepcopy_occurrences(event, dates):
+    """Прежняя реализация get_occurrences: deepcopy модели на каждое вхождение."""
+    result = []
+    for dt in dates:
+        copy_obj = deepcopy(event)
+        copy_obj.id = None
+        copy_obj.is_occurrence = True
+        copy_obj.start_datetime = dt
+        if event.duration_minutes:
+            copy_obj.end_datetime = dt + timedelta(minutes=event.duration_minutes)
+        result.append(copy_obj)
+    return result
+
+
+def _slot_occurrences(event, dates):
+    return [EventOccurrence.from_event(event, dt) for dt in dates]
+
+
+class Command(BaseCommand):
+    help = ("Бенчмарк вхождений: deepcopy(Event) против EventOccurrence (__slots__). "
+            "Ежедневное событие на N дней, время и пиковая память. БД не трогает.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=365, help="Длина окна в днях.")
+        parser.add_argument("--repeat", type=int, default=5, help="Сколько раз строить вхождения.")
+
+    def handle(self, *args, **opts):
+        tz = timezone.get_current_timezone()
+        start = timezone.make_aware(datetime(2026, 1, 1), tz)
+        end = start + timedelta(days=opts["days"]) - timedelta(seconds=1)
+
+        event = Event(
+            id=1, user_id=1, name="bench", amount=Decimal("-100.00"),
+            start_datetime=start, duration_minutes=60,
+            recurrence=Recurrence(rrules=[Rule(DAILY)]),
+        )
+        dates = [dt for dt, _ in expand_event(event, start, end, tz)]
+
+        legacy = _deepcopy_occurrences(event, dates)
+        slots = _slot_occurrences(event, dates)
+        for old, new in zip(legacy, slots):
+            if (old.start_datetime, old.end_datetime, old.amount, old.status, old.name) != \
+                    (new.start_datetime, new.end_datetime, new.amount, new.status, new.name):
+                raise CommandError(f"Вхождение {old.start_datetime} разошлось")
+
+        self.stdout.write(f"Вхождений: {len(dates)}")
+        self.stdout.write(f"{'variant':<16}{'ms':>10}{'peak KiB':>12}")
+        for name, build in (("deepcopy", _deepcopy_occurrences), ("__slots__", _slot_occurrences)):
+            ms = self._time(lambda: build(event, dates), opts["repeat"])
+            kib = self._peak(lambda: build(event, dates))
+            self.stdout.write(f"{name:<16}{ms:>10.2f}{kib:>12.1f}")
+
+        self.stdout.write(self.style.SUCCESS("✅ Вхождения совпадают."))
+
+    @staticmethod
+    def _time(fn, repeat):
+        started = perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (perf_counter() - started) * 1000 / repeat
+
+    @staticmethod
+    def _peak(fn):
+        tracemalloc.start()
+        try:
+            result = fn()  # держим результат живым до замера
+            _, peak = tracemalloc.get_traced_memory()
+            del result
+        finally:
+            tracemalloc.stop()
+        return peak / 1024
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recurrence import Recurrence, Rule, DAILY, WEEKLY, MONTHLY, MO, WE, FR
+
+from schedule.utils.occurrence_helper import RRULE_ANCHOR, skip_ahead_dtstart
+
+
+def _rules():
+    """Набор типовых правил: имя → Recurrence."""
+    return {
+        "daily": Recurrence(rrules=[Rule(DAILY)]),
+        "daily/3 @9,18h": Recurrence(rrules=[Rule(DAILY, interval=3, byhour=[9, 18])]),
+        "weekly MO,WE": Recurrence(rrules=[Rule(WEEKLY, byday=[MO, WE])]),
+        "weekly/2 FR": Recurrence(rrules=[Rule(WEEKLY, interval=2, byday=[FR])]),
+        "monthly/3 d15": Recurrence(rrules=[Rule(MONTHLY, interval=3, bymonthday=[15])]),
+        "monthly last day": Recurrence(rrules=[Rule(MONTHLY, bymonthday=[-1])]),
+        "monthly 2nd FR": Recurrence(rrules=[Rule(MONTHLY, byday=[FR(2)])]),
+        "daily - weekly/2 WE": Recurrence(
+            rrules=[Rule(DAILY)], exrules=[Rule(WEEKLY, interval=2, byday=[WE])],
+        ),
+        "daily until 2030": Recurrence(rrules=[Rule(DAILY, until=datetime(2030, 6, 30))]),
+    }
+
+
+class Command(BaseCommand):
+    help = ("Бенчмарк разворачивания RRULE: опора 2010-01-01 против skip_ahead_dtstart. "
+            "Сверяет, что вхождения совпадают, и печатает время на месячное окно.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20, help="Сколько раз разворачивать каждое окно.")
+        parser.add_argument("--years", type=int, nargs="+", default=[2011, 2015, 2020, 2025, 2030, 2040],
+                            help="Годы, в которых берём окно (январь).")
+
+    def handle(self, *args, **opts):
+        repeat = opts["repeat"]
+        years = opts["years"]
+
+        header = f"{'rule':<22}" + "".join(f"{y:>18}" for y in years)
+        self.stdout.write(header)
+        self.stdout.write(f"{'':<22}" + "".join(f"{'anchor / skip, ms':>18}" for _ in years))
+
+        for name, recurrence in _rules().items():
+            cells = []
+            for year in years:
+                start = datetime(year, 1, 1)
+                end = datetime(year, 2, 1) - timedelta(seconds=1)
+                dtstart = skip_ahead_dtstart(recurrence, start)
+
+                legacy = recurrence.between(start, end, inc=True, dtstart=RRULE_ANCHOR)
+                skipped = recurrence.between(start, end, inc=True, dtstart=dtstart)
+                if legacy != skipped:
+                    raise CommandError(f"{name} @ {year}: вхождения разошлись ({len(legacy)} vs {len(skipped)})")
+
+                t_legacy = self._time(lambda: recurrence.between(start, end, inc=True, dtstart=RRULE_ANCHOR), repeat)
+                t_skip = self._time(
+                    lambda: recurrence.between(start, end, inc=True,
+                                               dtstart=skip_ahead_dtstart(recurrence, start)),
+                    repeat,
+                )
+                cells.append(f"{t_legacy:>8.2f} /{t_skip:>7.2f}")
+            self.stdout.write(f"{name:<22}" + "".join(f"{c:>18}" for c in cells))
+
+        self.stdout.write(self.style.SUCCESS("✅ Вхождения совпадают во всех окнах."))
+
+    @staticmethod
+    def _time(fn, repeat):
+        started = perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (perf_counter() - started) * 1000 / repeat
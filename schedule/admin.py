@@ -8,6 +8,8 @@ from .models import Event, EventInstance, Slot
 from .forms import EventAdminForm
 from accounting.models import Account
 
+from datetime import date
+
 from django import forms
 from django.contrib import admin
 from django.core.exceptions import ValidationError
@@ -15,8 +17,10 @@ from django.core.exceptions import ValidationError
 from .models import (
     EventInstance, Event, Slot,
     SchedulePattern, MonthSchedule, DayOverride,
-    PatternMode, DayType
+    PatternMode, DayType, Occurrence
 )
+from .utils.pattern_engine import month_day_types
+
 
 
 @admin.register(Event)
@@ -106,6 +110,15 @@ class EventInstanceAdmin(admin.ModelAdmin):
     ordering = ("-modified_at",)
 
 
+@admin.register(Occurrence)
+class OccurrenceAdmin(admin.ModelAdmin):
+    # индекс пересобирается сигналами / rebuild_occurrences — руками не правим
+    list_display = ("event", "user", "occurs_at", "recurrence_type", "status", "amount")
+    list_filter = ("recurrence_type", "status")
+    ordering = ("-occurs_at",)
+    readonly_fields = ("event", "user", "occurs_at", "recurrence_type", "status", "amount", "instance")
+
+
 @admin.register(Slot)
 class SlotAdmin(admin.ModelAdmin):
     list_display = ('id', 'date_range', 'status')
@@ -160,6 +173,7 @@ class SchedulePatternForm(forms.ModelForm):
             "name", "description",
             "mode",
             "days_off_at_start", "pattern_after_start",  # будут управляться через pattern_text
+            "phase_anchor",
             "weekday_map",  # будет собираться из mon..sun
             "last_day_always_working",
             "working_day_duration",
@@ -236,6 +250,7 @@ class SchedulePatternForm(forms.ModelForm):
             cleaned["weekday_map"] = wm
             # Эти поля должны быть пустыми в WEEKDAY-режиме
             cleaned["pattern_after_start"] = []
+            cleaned["phase_anchor"] = None
             if cleaned.get("days_off_at_start", 0) != 0:
                 raise ValidationError({"days_off_at_start": "В режиме WEEKDAY значение должно быть равно 0."})
 
@@ -270,7 +285,7 @@ class SchedulePatternAdmin(admin.ModelAdmin):
 
     list_display = (
         'name', 'mode', 'display_cycle', 'days_off_at_start',
-        'working_day_duration', 'last_day_always_working'
+        'working_day_duration', 'last_day_always_working', 'display_current_month'
     )
     list_filter = ('mode', 'last_day_always_working')
     search_fields = ('name',)
@@ -283,13 +298,24 @@ class SchedulePatternAdmin(admin.ModelAdmin):
 
     display_cycle.short_description = "Длина цикла"
 
+    def display_current_month(self, obj):
+        # Рабочих дней в текущем месяце (разметка из day_types_memo)
+        today = date.today()
+        try:
+            day_types = month_day_types(obj, today.year, today.month)
+        except ValueError:
+            return "—"
+        return day_types.count(DayType.WORK)
+
+    display_current_month.short_description = "Рабочих дней в этом месяце"
+
     # Немного улучшим UX группировкой полей
     fieldsets = (
         ("Основное", {
             "fields": ("name", "description", "mode", "working_day_duration", "last_day_always_working")
         }),
         ("Чередование блоков (ALTERNATING)", {
-            "fields": ("days_off_at_start", "pattern_text", "pattern_after_start"),
+            "fields": ("days_off_at_start", "pattern_text", "pattern_after_start", "phase_anchor"),
             "description": "Начинаем с рабочих, затем выходные, затем снова рабочие и т.д. "
                            "Пример: 2,2 или 2,1,2,2",
         }),
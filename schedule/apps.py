@@ -10,6 +10,8 @@ class ScheduleConfig(AppConfig):
         """
         При старте приложения гарантируем, что шаблон 'Классика' существует.
         """
+        from . import signals  # noqa: F401 — подключаем обработчики индекса вхождений и кэшей
+
         try:
             from schedule.models import SchedulePattern, PatternMode
             SchedulePattern.objects.get_or_create(
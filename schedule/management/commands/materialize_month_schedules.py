@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from schedule.utils.month_schedules import materialize_month_schedules, months_window
+
+
+class Command(BaseCommand):
+    help = ("Заранее создаёт MonthSchedule на текущий и N следующих месяцев всем пользователям "
+            "(наследуя шаблон предыдущего месяца). Удобно гонять по cron раз в сутки.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead", type=int,
+            default=getattr(settings, "SCHEDULE_MONTH_SCHEDULE_HORIZON_MONTHS", 12),
+            help="На сколько месяцев вперёд создавать расписания.",
+        )
+        parser.add_argument(
+            "--user", type=int, action="append", dest="users",
+            help="Только этот пользователь (можно повторять).",
+        )
+        parser.add_argument("--batch-size", type=int, default=500, help="Пользователей на один bulk_create.")
+
+    def handle(self, *args, **opts):
+        if opts["months_ahead"] < 0:
+            raise CommandError("--months-ahead не может быть отрицательным.")
+        if opts["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть положительным.")
+
+        months = months_window(opts["months_ahead"])
+        created = materialize_month_schedules(
+            months_ahead=opts["months_ahead"], user_ids=opts["users"], batch_size=opts["batch_size"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ MonthSchedule {months[0][0]}-{months[0][1]:02d}..{months[-1][0]}-{months[-1][1]:02d}: "
+            f"создано {created}"
+        ))
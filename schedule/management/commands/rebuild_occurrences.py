@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from schedule.models import Event
+from schedule.utils.occurrence_index import (
+    default_horizon, extend_occurrence_index, get_horizon,
+    rebuild_event_occurrences, rebuild_occurrence_index,
+)
+
+
+class Command(BaseCommand):
+    help = "Пересобирает индекс вхождений (Occurrence) и сдвигает его горизонт. Удобно гонять по cron раз в сутки."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-back", type=int,
+            default=getattr(settings, "SCHEDULE_OCCURRENCE_HISTORY_MONTHS", 12),
+            help="Сколько месяцев истории держать в индексе.",
+        )
+        parser.add_argument(
+            "--months-ahead", type=int,
+            default=getattr(settings, "SCHEDULE_OCCURRENCE_HORIZON_MONTHS", 12),
+            help="На сколько месяцев вперёд строить индекс.",
+        )
+        parser.add_argument(
+            "--extend", action="store_true",
+            help="Не пересобирать всё, а только сдвинуть горизонт (удалить старое, достроить края).",
+        )
+        parser.add_argument(
+            "--user", type=int,
+            help="Пересобрать события только этого пользователя в текущем горизонте.",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["user"] is not None:
+            self._rebuild_user(opts["user"])
+            return
+
+        starts_at, ends_at = default_horizon(opts["months_back"], opts["months_ahead"])
+
+        if opts["extend"]:
+            horizon, created = extend_occurrence_index(starts_at, ends_at)
+        else:
+            horizon, created = rebuild_occurrence_index(starts_at, ends_at)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Индекс вхождений: {horizon} (создано строк: {created})"
+        ))
+
+    def _rebuild_user(self, user_id):
+        horizon = get_horizon()
+        if horizon is None:
+            raise CommandError("Индекс ещё не строился — сначала запустите команду без --user.")
+
+        user = get_user_model().objects.filter(pk=user_id).first()
+        if user is None:
+            raise CommandError(f"Пользователь {user_id} не найден.")
+
+        created = 0
+        for event in Event.objects.filter(user=user).iterator():
+            created += rebuild_event_occurrences(event, horizon)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Индекс вхождений пользователя {user_id}: {horizon} (создано строк: {created})"
+        ))
+
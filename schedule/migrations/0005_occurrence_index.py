@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0004_event_date_mode_event_is_recurring_monthly_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccurrenceHorizon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField()),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Горизонт индекса вхождений',
+            },
+        ),
+        migrations.CreateModel(
+            name='Occurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('occurs_at', models.DateTimeField()),
+                ('recurrence_type', models.CharField(choices=[('single', 'Single'), ('monthly', 'Monthly'), ('rrule', 'RRULE')], default='single', max_length=10)),
+                ('status', models.CharField(choices=[('incomplete', 'INCOMPLETE'), ('complete', 'COMPLETE'), ('cancelled', 'CANCELLED'), ('on_pause', 'ON_PAUSE'), ('in_process', 'IN_PROCESS')], default='incomplete', max_length=50)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='schedule.event')),
+                ('instance', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='schedule.eventinstance')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Индекс вхождений',
+                'indexes': [models.Index(fields=['user', 'occurs_at'], name='schedule_oc_user_id_30ae61_idx')],
+                'constraints': [models.UniqueConstraint(fields=('event', 'occurs_at'), name='unique_occurrence_per_event')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0005_occurrence_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedulepattern',
+            name='phase_anchor',
+            field=models.DateField(blank=True, help_text='Дата начала цикла для ALTERNATING. Если задана — цикл идёт непрерывно через границы месяцев; если пусто — перезапускается с 1-го числа каждого месяца.', null=True),
+        ),
+    ]
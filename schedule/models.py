@@ -1,8 +1,6 @@
 from recurrence.fields import RecurrenceField
 from django.utils import timezone
 
-from copy import deepcopy
-from datetime import datetime, timedelta
 import calendar
 
 from decimal import Decimal, ROUND_FLOOR
@@ -11,7 +9,7 @@ from django.db import models
 from django.conf import settings
 from datetime import date
 from django.db.models import Q
-from common.choices import EventDateMode
+from common.choices import EventDateMode, RecurrenceType
 from common.datetime import ensure_timezone
 
 
@@ -184,7 +182,6 @@ class Event(models.Model):
                     user_id=self.user_id,
                     name="Основной счёт",
                     is_primary=True,
-                    balance=0
                 )
             self.account = primary
         current_tz = timezone.get_current_timezone()
@@ -206,73 +203,28 @@ class Event(models.Model):
         return f"[{self.get_event_type_display()}] {self.name or self.title or 'Без названия'}"
 
 
-    def get_occurrences(self, start_dt, end_dt, tz):
+    def get_occurrences(self, start_dt, end_dt, tz, overlay_index=None):
         """
-        Возвращает список occurrence-событий в диапазоне [start_dt, end_dt].
+        Возвращает список вхождений (EventOccurrence) в диапазоне [start_dt, end_dt].
+        Даты вхождений — те же, что в календаре (occurrence_helper.expand_event).
+        Вхождение хранит только дату/сумму/статус и ссылку на self;
+        если нужен настоящий Event — occurrence.as_event().
+
+        overlay_index — заранее собранный build_overlay_index(...) за то же окно
+        (например, один на все события пользователя). Если не передан —
+        собираем свой, одним запросом на событие.
         """
-        occurrences = []
-        mode = self.date_mode
-
-        def _copy_with_datetime(dt: datetime):
-            from copy import deepcopy
-            copy_obj = deepcopy(self)
-            copy_obj.id = None
-            copy_obj.is_occurrence = True
-            copy_obj.start_datetime = dt
-            if self.duration_minutes:
-                copy_obj.end_datetime = dt + timedelta(minutes=self.duration_minutes)
-            return copy_obj
-
-        # 1) NUMBER_OF_MONTH
-        if mode == EventDateMode.NUMBER_OF_MONTH:
-            # a) без recurrence -> одно вхождение на 1-е число указанного месяца
-            if not self.recurrence:
-                if self.month_year and self.month_number:
-                    dt = datetime(int(self.month_year), int(self.month_number), 1, 0, 0, tzinfo=tz)
-                    if start_dt <= dt <= end_dt:
-                        occurrences.append(_copy_with_datetime(dt))
-                return occurrences
-
-            # b) с recurrence (ожидаем RRULE:FREQ=MONTHLY ...):
-            #    используем between(), якоримся на dtstart (первое число указанного месяца)
-            if self.month_year and self.month_number:
-                dtstart = datetime(int(self.month_year), int(self.month_number), 1, 0, 0, tzinfo=tz)
-            else:
-                # если не указали месяц/год — fallback к 2010-01-01
-                dtstart = datetime(2010, 1, 1, 0, 0, tzinfo=tz)
+        from schedule.utils.occurrence_helper import EventOccurrence, build_overlay_index, expand_event
 
-            recurrences = self.recurrence.between(
-                start_dt, end_dt, inc=True, dtstart=dtstart
-            )
-            for dt in recurrences:
-                # применяем кастомные инстансы, если есть
-                instance = self.instances.filter(instance_datetime=dt).first()
-                copy_obj = _copy_with_datetime(dt)
-                if instance:
-                    copy_obj.status = instance.status
-                    copy_obj.is_completed = instance.is_completed
-                occurrences.append(copy_obj)
-            return occurrences
-
-        # 2) EXACT_DATE без recurrence -> одиночная дата
-        if mode == EventDateMode.EXACT_DATE and self.start_datetime and not self.recurrence:
-            if start_dt <= self.start_datetime <= end_dt:
-                occurrences.append(_copy_with_datetime(self.start_datetime))
-            return occurrences
-
-        # 3) EXACT_DATE с recurrence
-        if self.recurrence:
-            recurrences = self.recurrence.between(
-                start_dt, end_dt, inc=True,
-                dtstart=datetime(2010, 1, 1, 0, 0).replace(tzinfo=tz)
-            )
-            for dt in recurrences:
-                instance = self.instances.filter(instance_datetime=dt).first()
-                copy_obj = _copy_with_datetime(dt)
-                if instance:
-                    copy_obj.status = instance.status
-                    copy_obj.is_completed = instance.is_completed
-                occurrences.append(copy_obj)
+        occurrences = []
+        for dt, rtype in expand_event(self, start_dt, end_dt, tz):
+            instance = None
+            # кастомные инстансы применяем только к повторяемым вхождениям
+            if rtype != RecurrenceType.SINGLE:
+                if overlay_index is None:
+                    overlay_index = build_overlay_index(start_dt, end_dt, events=[self])
+                instance = overlay_index.get((self.id, dt))
+            occurrences.append(EventOccurrence.from_event(self, dt, instance))
 
         return occurrences
 
@@ -297,6 +249,54 @@ class EventInstance(models.Model):
         return f"{self.parent_event.name} ({self.instance_datetime.strftime('%Y-%m-%d %H:%M')})"
 
 
+class Occurrence(models.Model):
+    """
+    Материализованное вхождение события (индекс для календаря и бюджета).
+    Пересобирается для события целиком при сохранении Event и
+    патчится при изменении EventInstance (см. schedule/signals.py).
+    """
+    event = models.ForeignKey('Event', on_delete=models.CASCADE, related_name='occurrences')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='occurrences')
+    occurs_at = models.DateTimeField()
+    recurrence_type = models.CharField(max_length=10, choices=RecurrenceType.choices,
+                                       default=RecurrenceType.SINGLE)
+    status = models.CharField(max_length=50, choices=CompletionStatus.choices, default=CompletionStatus.INCOMPLETE)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    instance = models.ForeignKey('EventInstance', on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='+')
+
+    class Meta:
+        verbose_name_plural = 'Индекс вхождений'
+        indexes = [
+            models.Index(fields=['user', 'occurs_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'occurs_at'], name='unique_occurrence_per_event'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} @ {self.occurs_at.isoformat()}"
+
+
+class OccurrenceHorizon(models.Model):
+    """
+    Окно [starts_at, ends_at], на которое построен индекс Occurrence.
+    Одна запись; двигает её команда rebuild_occurrences.
+    """
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+    built_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Горизонт индекса вхождений'
+
+    def __str__(self):
+        return f"{timezone.localtime(self.starts_at):%Y-%m-%d} — {timezone.localtime(self.ends_at):%Y-%m-%d}"
+
+    def covers(self, start_dt, end_dt) -> bool:
+        return self.starts_at <= start_dt and end_dt <= self.ends_at
+
+
 class Slot(models.Model):
     date_range = models.DateTimeField()
     status = models.CharField(max_length=255, choices=[('available', 'Available'), ('booked', 'Booked')])
@@ -335,6 +335,11 @@ class SchedulePattern(models.Model):
     # ALTERNATING
     days_off_at_start = models.PositiveSmallIntegerField(default=0)
     pattern_after_start = models.JSONField(default=list)
+    phase_anchor = models.DateField(
+        null=True, blank=True,
+        help_text="Дата начала цикла для ALTERNATING. Если задана — цикл идёт непрерывно "
+                  "через границы месяцев; если пусто — перезапускается с 1-го числа каждого месяца."
+    )
 
     # WEEKDAY: JSON вида {"mon":"work","tue":"work","wed":"off","thu":"work","fri":"work","sat":"off","sun":"off"}
     weekday_map = models.JSONField(null=True, blank=True, default=None)
@@ -397,6 +402,8 @@ class SchedulePattern(models.Model):
                 errors['pattern_after_start'] = 'В режиме WEEKDAY pattern_after_start должен быть пустым.'
             if self.days_off_at_start != 0:
                 errors['days_off_at_start'] = 'В режиме WEEKDAY days_off_at_start должен быть равен 0.'
+            if self.phase_anchor:
+                errors['phase_anchor'] = 'В режиме WEEKDAY phase_anchor должен быть пустым.'
             # validate weekday_map
             required_keys = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
             if not isinstance(self.weekday_map, dict):
@@ -481,6 +488,16 @@ class MonthSchedule(models.Model):
             ), True
 
         # 3️⃣ Если нет вообще никаких расписаний — берём 'Классику'
+        return cls.objects.create(
+            user=user,
+            year=year,
+            month=month,
+            pattern=cls.default_pattern()
+        ), True
+
+    @classmethod
+    def default_pattern(cls):
+        """Шаблон 'Классика' (создаётся, если ready() не успел)."""
         from schedule.models import SchedulePattern
         default_pattern = SchedulePattern.objects.filter(name__iexact="Классика").first()
         if default_pattern is None:
@@ -502,13 +519,116 @@ class MonthSchedule(models.Model):
                 },
                 description="Пятидневка: Пн–Пт рабочие, Сб–Вс выходные.",
             )
+        return default_pattern
 
-        return cls.objects.create(
-            user=user,
-            year=year,
-            month=month,
-            pattern=default_pattern
-        ), True
+    @classmethod
+    def get_or_create_for_range(cls, user, start, end):
+        """
+        Пакетный get_or_create_for_month для месяцев start..end включительно
+        (пары (year, month)). Возвращает список [(year, month, MonthSchedule)].
+
+        Запросов — константа, а не «по 2–3 на месяц»:
+          1) расписания диапазона (+ pattern);
+          2) ближайшее расписание до диапазона — если первый месяц пуст;
+          3) 'Классика' — если нет и его;
+          4) один bulk_create на все недостающие месяцы.
+        Недостающий месяц наследует шаблон ближайшего предыдущего, как и
+        в get_or_create_for_month.
+        """
+        start_serial = start[0] * 12 + start[1]
+        end_serial = end[0] * 12 + end[1]
+        months = [((serial - 1) // 12, (serial - 1) % 12 + 1) for serial in range(start_serial, end_serial + 1)]
+
+        existing = {
+            (schedule.year, schedule.month): schedule
+            for schedule in (
+                cls.objects.filter(user=user)
+                .annotate(serial=models.F("year") * 12 + models.F("month"))
+                .filter(serial__gte=start_serial, serial__lte=end_serial)
+                .select_related("pattern")
+            )
+        }
+
+        previous_pattern = None
+        if months and months[0] not in existing:
+            prev_schedule = (
+                cls.objects.filter(user=user)
+                .annotate(serial=models.F("year") * 12 + models.F("month"))
+                .filter(serial__lt=start_serial)
+                .select_related("pattern")
+                .order_by("-year", "-month")
+                .first()
+            )
+            previous_pattern = prev_schedule.pattern if prev_schedule else cls.default_pattern()
+
+        result = []
+        missing = []
+        for year, month in months:
+            schedule = existing.get((year, month))
+            if schedule is None:
+                schedule = cls(user=user, year=year, month=month, pattern=previous_pattern)
+                missing.append(schedule)
+            previous_pattern = schedule.pattern
+            result.append((year, month, schedule))
+
+        if missing:
+            # ignore_conflicts: параллельный запрос мог успеть создать месяц
+            cls.objects.bulk_create(missing, ignore_conflicts=True)
+        return result
+
+    @classmethod
+    def get_or_create_for_users(cls, user_ids, year, month):
+        """
+        Пакетный get_or_create_for_month для многих пользователей на один
+        месяц. Возвращает {user_id: MonthSchedule} в порядке user_ids.
+
+        Запросов — константа при любом размере команды:
+          1) расписания месяца (+ pattern);
+          2) ближайшие предыдущие расписания тех, у кого месяца нет
+             (по одному на пользователя — коррелированный подзапрос);
+          3) 'Классика' — если у кого-то нет вообще ничего;
+          4) один bulk_create на все недостающие расписания.
+        """
+        user_ids = list(user_ids)
+        result = {
+            schedule.user_id: schedule
+            for schedule in cls.objects.filter(user_id__in=user_ids, year=year, month=month).select_related("pattern")
+        }
+        missing_ids = [user_id for user_id in user_ids if user_id not in result]
+        if not missing_ids:
+            return {user_id: result[user_id] for user_id in user_ids}
+
+        current_serial = year * 12 + month
+        latest_before = (
+            cls.objects.filter(user=models.OuterRef("user"))
+            .annotate(serial=models.F("year") * 12 + models.F("month"))
+            .filter(serial__lt=current_serial)
+            .order_by("-year", "-month")
+            .values("pk")[:1]
+        )
+        previous_patterns = {
+            schedule.user_id: schedule.pattern
+            for schedule in (
+                cls.objects.filter(user_id__in=missing_ids, pk=models.Subquery(latest_before))
+                .select_related("pattern")
+            )
+        }
+
+        default_pattern = None
+        missing = []
+        for user_id in missing_ids:
+            pattern = previous_patterns.get(user_id)
+            if pattern is None:
+                if default_pattern is None:
+                    default_pattern = cls.default_pattern()
+                pattern = default_pattern
+            schedule = cls(user_id=user_id, year=year, month=month, pattern=pattern)
+            missing.append(schedule)
+            result[user_id] = schedule
+
+        # ignore_conflicts: параллельный запрос мог успеть создать месяц
+        cls.objects.bulk_create(missing, ignore_conflicts=True)
+        return {user_id: result[user_id] for user_id in user_ids}
 
 
 class DayOverride(models.Model):
@@ -136,7 +136,7 @@ class SchedulePatternSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'name', 'description',
             'mode', 'weekday_map',
-            'days_off_at_start', 'pattern_after_start',
+            'days_off_at_start', 'pattern_after_start', 'phase_anchor',
             'last_day_always_working', 'working_day_duration',
             'cycle_length'
         )
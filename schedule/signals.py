@@ -0,0 +1,113 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import DayOverride, Event, EventInstance, MonthSchedule, SchedulePattern
+from .utils.month_cache import EVENTS, PREVIEW, month_cache
+from .utils.pattern_engine import day_types_memo
+from .utils.occurrence_index import (
+    rebuild_event_occurrences, patch_instance_occurrence, unpatch_instance_occurrence,
+)
+
+
+# --- Индекс вхождений (Occurrence) ---
+# Удаление Event чистит строки каскадом по FK, отдельный обработчик не нужен.
+
+@receiver(post_save, sender=Event)
+def reindex_event_occurrences(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rebuild_event_occurrences(instance)
+
+
+@receiver(post_save, sender=EventInstance)
+def patch_occurrence_on_instance_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old_slot = getattr(instance, "_cached_old_slot", None)
+    if old_slot and old_slot != (instance.parent_event_id, instance.instance_datetime):
+        # оверлей перенесли — строка на старой дате снова принадлежит событию
+        unpatch_instance_occurrence(instance, event_id=old_slot[0], occurs_at=old_slot[1])
+    patch_instance_occurrence(instance)
+
+
+@receiver(post_delete, sender=EventInstance)
+def patch_occurrence_on_instance_delete(sender, instance, **kwargs):
+    unpatch_instance_occurrence(instance)
+
+
+# --- Кэш месячных ответов (month_cache) ---
+# Event: RRULE может задеть любой месяц — сбрасываем всё у пользователя.
+# EventInstance: только месяц(ы) instance_datetime (старый и новый).
+# MonthSchedule / DayOverride: только свой месяц превью (правка MonthSchedule —
+# всё превью пользователя, т.к. year/month могли измениться).
+# SchedulePattern: общий для всех — сбрасываем превью у всех.
+
+def _local_month(dt):
+    local = timezone.localtime(dt, timezone.get_current_timezone())
+    return local.year, local.month
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_month_cache_on_event(sender, instance, **kwargs):
+    month_cache.invalidate_user(EVENTS, instance.user_id)
+
+
+@receiver(pre_save, sender=EventInstance)
+def remember_instance_month(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    old_slot = EventInstance.objects.filter(pk=instance.pk).values_list("parent_event_id", "instance_datetime").first()
+    # старое место оверлея нужно и индексу вхождений (снять патч), и кэшу (старый месяц)
+    instance._cached_old_slot = old_slot
+    instance._cached_old_month = _local_month(old_slot[1]) if old_slot else None
+
+
+@receiver(post_save, sender=EventInstance)
+@receiver(post_delete, sender=EventInstance)
+def invalidate_month_cache_on_instance(sender, instance, **kwargs):
+    user_id = Event.objects.filter(pk=instance.parent_event_id).values_list("user_id", flat=True).first()
+    if user_id is None:
+        # событие удаляется каскадом — его сигнал сбросит пользователя целиком
+        return
+    months = {_local_month(instance.instance_datetime)}
+    old_month = getattr(instance, "_cached_old_month", None)
+    if old_month:
+        months.add(old_month)
+    for year, month in months:
+        month_cache.invalidate_month(EVENTS, user_id, year, month)
+
+
+@receiver(post_save, sender=MonthSchedule)
+@receiver(post_delete, sender=MonthSchedule)
+def invalidate_month_cache_on_schedule(sender, instance, created=True, **kwargs):
+    if not created:
+        # правка существующего: year/month могли поменяться — старый месяц не знаем
+        month_cache.invalidate_user(PREVIEW, instance.user_id)
+        return
+    month_cache.invalidate_month(PREVIEW, instance.user_id, instance.year, instance.month)
+
+
+@receiver(post_save, sender=DayOverride)
+@receiver(post_delete, sender=DayOverride)
+def invalidate_month_cache_on_override(sender, instance, **kwargs):
+    schedule = MonthSchedule.objects.filter(pk=instance.month_schedule_id).values("user_id", "year", "month").first()
+    if schedule is None:
+        return
+    month_cache.invalidate_month(PREVIEW, schedule["user_id"], schedule["year"], schedule["month"])
+
+
+@receiver(post_save, sender=SchedulePattern)
+@receiver(post_delete, sender=SchedulePattern)
+def invalidate_month_cache_on_pattern(sender, instance, **kwargs):
+    month_cache.invalidate_all(PREVIEW)
+
+
+# --- Мемо разметки дней (day_types_memo) ---
+# Ключ и так зависит от содержимого шаблона; тут сразу выкидываем старую версию.
+
+@receiver(post_save, sender=SchedulePattern)
+@receiver(post_delete, sender=SchedulePattern)
+def forget_pattern_day_types(sender, instance, **kwargs):
+    day_types_memo.forget_pattern(instance.pk)
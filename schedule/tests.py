@@ -1,3 +1,970 @@
-from django.test import TestCase
+import copy
+import pickle
+import random
+from collections import Counter
+from datetime import date, datetime, timedelta
 
-# Create your tests here.
+import recurrence
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from common.choices import EventDateMode, RecurrenceType
+from artworks.models import Artwork, Commission
+from identity.models import Artist, Commissioner, Manager
+from .models import (
+    CompletionStatus, DayOverride, DayType, Event, EventInstance, MonthSchedule, Occurrence, PatternMode,
+    SchedulePattern, Slot,
+)
+from .utils.capacity_planner import WorkCapacity, plan_commissions
+from .utils.task_scheduler import DEFAULT_TASK_DAY_LIMITS, auto_schedule_tasks, pack_tasks
+from .utils.month_cache import month_cache
+from .utils.availability import FreeWindow, find_free_windows, merge_intervals, next_free_windows, subtract_intervals
+from .utils.occurrence_helper import (
+    RRULE_ANCHOR, EventOccurrence, add_months, expand_event, first_of_month, monthly_series_hits, skip_ahead_dtstart,
+)
+from .utils.pattern_engine import DayTypesMemo, compile_pattern, days_of_mask, month_overrides
+from .views import build_month_preview
+from .utils.occurrence_index import (
+    get_covering_horizon, iter_indexed_occurrences, rebuild_event_occurrences, rebuild_occurrence_index,
+)
+
+
+def aware(*args):
+    return timezone.make_aware(datetime(*args), timezone.get_current_timezone())
+
+
+# ------------------------------------------------------------
+# 🔹 Индекс вхождений (Occurrence)
+# ------------------------------------------------------------
+class OccurrenceIndexTests(TestCase):
+    def setUp(self):
+        self.tz = timezone.get_current_timezone()
+        self.user = get_user_model().objects.create_user(username="index", password="x")
+        self.starts_at = aware(2025, 1, 1)
+        self.ends_at = aware(2025, 12, 31, 23, 59, 59)
+        self.horizon, _ = rebuild_occurrence_index(self.starts_at, self.ends_at)
+
+    def event(self, **kwargs):
+        kwargs.setdefault("name", "e")
+        kwargs.setdefault("amount", 100)
+        return Event.objects.create(user=self.user, **kwargs)
+
+    def single(self):
+        return self.event(start_datetime=aware(2025, 3, 10, 12))
+
+    def rrule(self):
+        return self.event(
+            start_datetime=aware(2025, 2, 1, 9),
+            recurrence=recurrence.deserialize("RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH"),
+        )
+
+    def every_n_months(self):
+        return self.event(
+            date_mode=EventDateMode.NUMBER_OF_MONTH,
+            is_recurring_monthly=True,
+            month_interval=3,
+            start_datetime=aware(2024, 11, 1),
+            end_datetime=aware(2026, 2, 1),
+        )
+
+    def assertIndexMatchesExpansion(self, event):
+        expected = expand_event(event, self.starts_at, self.ends_at, self.tz)
+        rows = list(
+            Occurrence.objects.filter(event=event).order_by("occurs_at").values_list("occurs_at", "recurrence_type")
+        )
+        self.assertTrue(expected)
+        self.assertEqual(rows, expected)
+
+    def test_rows_match_expand_event(self):
+        for make in (self.single, self.rrule, self.every_n_months):
+            with self.subTest(make.__name__):
+                self.assertIndexMatchesExpansion(make())
+
+    def test_full_rebuild_matches_per_event_rebuild(self):
+        events = [self.single(), self.rrule(), self.every_n_months()]
+        before = set(Occurrence.objects.values_list("event_id", "occurs_at", "recurrence_type"))
+        rebuild_occurrence_index(self.starts_at, self.ends_at)
+        self.assertEqual(set(Occurrence.objects.values_list("event_id", "occurs_at", "recurrence_type")), before)
+        self.assertEqual(sum(rebuild_event_occurrences(event) for event in events), len(before))
+
+    def test_save_reindexes_event(self):
+        event = self.rrule()
+        event.recurrence = recurrence.deserialize("RRULE:FREQ=DAILY;INTERVAL=10")
+        event.amount = 5
+        event.save()
+        self.assertIndexMatchesExpansion(event)
+        self.assertEqual(set(Occurrence.objects.filter(event=event).values_list("amount", flat=True)), {5})
+
+        event.start_datetime = aware(2026, 6, 1)  # целиком за горизонтом
+        event.save()
+        self.assertFalse(Occurrence.objects.filter(event=event).exists())
+
+    def test_delete_removes_rows(self):
+        event = self.every_n_months()
+        self.assertTrue(Occurrence.objects.filter(event=event).exists())
+        event.delete()
+        self.assertFalse(Occurrence.objects.filter(event_id=event.pk).exists())
+
+    def test_instance_status_patch_and_unpatch(self):
+        event = self.rrule()
+        occurs_at = Occurrence.objects.filter(event=event).order_by("occurs_at").values_list("occurs_at", flat=True)[2]
+        instance = EventInstance.objects.create(
+            parent_event=event, instance_datetime=occurs_at, status=CompletionStatus.CANCELLED,
+        )
+        row = Occurrence.objects.get(event=event, occurs_at=occurs_at)
+        self.assertEqual((row.status, row.instance_id), (CompletionStatus.CANCELLED, instance.pk))
+
+        instance.status = CompletionStatus.COMPLETE
+        instance.save()
+        self.assertEqual(Occurrence.objects.get(event=event, occurs_at=occurs_at).status, CompletionStatus.COMPLETE)
+
+        instance.delete()
+        row = Occurrence.objects.get(event=event, occurs_at=occurs_at)
+        self.assertEqual((row.status, row.instance_id), (event.status, None))
+        # остальные вхождения не тронуты
+        self.assertEqual(
+            set(Occurrence.objects.filter(event=event).values_list("status", flat=True)), {event.status},
+        )
+
+    def test_moved_instance_unpatches_old_row(self):
+        event = self.event(start_datetime=aware(2025, 3, 1), recurrence=recurrence.deserialize("RRULE:FREQ=DAILY"))
+        old_at, new_at = Occurrence.objects.filter(event=event).order_by("occurs_at").values_list("occurs_at", flat=True)[5:7]
+        instance = EventInstance.objects.create(
+            parent_event=event, instance_datetime=old_at, status=CompletionStatus.CANCELLED,
+        )
+        instance.instance_datetime = new_at
+        instance.save()
+
+        old_row = Occurrence.objects.get(event=event, occurs_at=old_at)
+        new_row = Occurrence.objects.get(event=event, occurs_at=new_at)
+        self.assertEqual((old_row.status, old_row.instance_id), (event.status, None))
+        self.assertEqual((new_row.status, new_row.instance_id), (CompletionStatus.CANCELLED, instance.pk))
+        self.assertEqual(list(Occurrence.objects.filter(instance=instance).values_list("occurs_at", flat=True)), [new_at])
+
+    def test_instance_does_not_patch_single_event(self):
+        event = self.single()
+        EventInstance.objects.create(
+            parent_event=event, instance_datetime=event.start_datetime, status=CompletionStatus.CANCELLED,
+        )
+        row = Occurrence.objects.get(event=event)
+        self.assertEqual((row.status, row.instance_id), (event.status, None))
+
+    def test_horizon_coverage(self):
+        self.assertIsNotNone(get_covering_horizon(self.starts_at, self.ends_at))
+        self.assertIsNotNone(get_covering_horizon(aware(2025, 5, 1), aware(2025, 5, 31)))
+        self.assertIsNone(get_covering_horizon(aware(2024, 12, 31), aware(2025, 1, 31)))
+        self.assertIsNone(get_covering_horizon(aware(2025, 12, 1), aware(2026, 1, 1)))
+
+    def test_keyset_resume_has_no_gaps_or_duplicates(self):
+        for _ in range(3):
+            self.rrule()  # одинаковые occurs_at у разных событий — граница страницы внутри них
+        self.every_n_months()
+        full = [(dt, event.pk) for event, dt, _, _ in iter_indexed_occurrences(self.user, self.starts_at, self.ends_at)]
+        self.assertEqual(full, sorted(full))
+
+        resumed = []
+        after = None
+        while True:
+            page = []
+            for event, dt, _, _ in iter_indexed_occurrences(self.user, self.starts_at, self.ends_at, after=after):
+                page.append((dt, event.pk))
+                if len(page) == 7:
+                    break
+            if not page:
+                break
+            resumed.extend(page)
+            after = page[-1]
+        self.assertEqual(resumed, full)
+
+    def test_without_horizon_nothing_is_indexed(self):
+        self.horizon.delete()
+        event = self.single()
+        self.assertEqual(rebuild_event_occurrences(event), 0)
+        self.assertFalse(Occurrence.objects.filter(event=event).exists())
+        self.assertEqual(
+            [rtype for _, rtype in expand_event(event, self.starts_at, self.ends_at, self.tz)],
+            [RecurrenceType.SINGLE],
+        )
+
+
+# ------------------------------------------------------------
+# 🔹 all_events: диапазон from/to с курсором
+# ------------------------------------------------------------
+class AllEventsRangeTests(TestCase):
+    url = "/api/schedule/all_events/"
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="range", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        rules = ["RRULE:FREQ=DAILY", "RRULE:FREQ=DAILY", "RRULE:FREQ=WEEKLY;BYDAY=MO,FR", "RRULE:FREQ=DAILY;INTERVAL=3"]
+        for rule in rules:
+            # два ежедневных с одним временем — равные occurs_at на границах страниц
+            Event.objects.create(user=self.user, name="r", start_datetime=aware(2025, 1, 1, 10),
+                                 recurrence=recurrence.deserialize(rule))
+        Event.objects.create(user=self.user, name="s", start_datetime=aware(2025, 2, 3, 10))
+        self.params = {"from": "2025-01-01", "to": "2025-03-31"}
+
+    def fetch_all(self, limit):
+        items = []
+        cursor = None
+        while True:
+            params = dict(self.params, limit=limit)
+            if cursor:
+                params["cursor"] = cursor
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 200, response.content)
+            items.extend((item["datetime"], item["source_event_id"]) for item in response.data["results"])
+            cursor = response.data["next_cursor"]
+            if cursor is None:
+                return items
+
+    def assertPagesMatchExpansion(self):
+        tz = timezone.get_current_timezone()
+        start, end = aware(2025, 1, 1), aware(2025, 3, 31, 23, 59, 59, 999999)
+        expected = sorted(
+            (occurs_at, event.pk)
+            for event in Event.objects.filter(user=self.user)
+            for occurs_at, _ in expand_event(event, start, end, tz)
+        )
+        expected = [(occurs_at.isoformat(), pk) for occurs_at, pk in expected]
+        for limit in (1, 7, 50, 1000):
+            with self.subTest(limit=limit):
+                pages = self.fetch_all(limit)
+                self.assertEqual(len(pages), len(set(pages)))
+                self.assertEqual(pages, expected)
+
+    def test_cursor_pages_from_expansion(self):
+        self.assertPagesMatchExpansion()
+
+    def test_cursor_pages_from_index(self):
+        rebuild_occurrence_index(aware(2024, 12, 1), aware(2025, 6, 30, 23, 59, 59))
+        self.assertPagesMatchExpansion()
+
+    def test_out_of_range_bounds_are_rejected(self):
+        for params in (
+            {"from": "2025-01-01", "to": "9999-12-31"},
+            {"from": "0001-01-01", "to": "2025-01-01"},
+            {"from": "2025-01-01", "to": "9999-12-31T23:59:59"},
+            {"from": "2025-13-01", "to": "2025-12-31"},
+        ):
+            with self.subTest(**params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+
+# ------------------------------------------------------------
+# 🔹 Пропуск истории RRULE (skip_ahead_dtstart)
+# ------------------------------------------------------------
+class SkipAheadDtstartTests(SimpleTestCase):
+    shiftable = [
+        "RRULE:FREQ=DAILY",
+        "RRULE:FREQ=DAILY;INTERVAL=3",
+        "RRULE:FREQ=DAILY;INTERVAL=13;BYHOUR=9,18",
+        "RRULE:FREQ=WEEKLY;BYDAY=MO,WE,FR",
+        "RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=SU",
+        "RRULE:FREQ=WEEKLY;INTERVAL=3;BYDAY=TU,SA;WKST=SU",
+        "RRULE:FREQ=MONTHLY",
+        "RRULE:FREQ=MONTHLY;INTERVAL=5;BYMONTHDAY=31",
+        "RRULE:FREQ=MONTHLY;BYDAY=MO,TU,WE,TH,FR;BYSETPOS=-1",
+        "RRULE:FREQ=MONTHLY;INTERVAL=2;BYDAY=2TH",
+        "RRULE:FREQ=WEEKLY;BYDAY=MO,TH;UNTIL=20260315T000000",
+        "RRULE:FREQ=DAILY;INTERVAL=2\nEXRULE:FREQ=WEEKLY;BYDAY=SA,SU",
+        "RRULE:FREQ=WEEKLY;BYDAY=MO\nRRULE:FREQ=DAILY;INTERVAL=10\nEXRULE:FREQ=DAILY;INTERVAL=4",
+        "RRULE:FREQ=MONTHLY;INTERVAL=3;BYMONTHDAY=1,15\nEXRULE:FREQ=MONTHLY;INTERVAL=2;BYMONTHDAY=15",
+    ]
+    # правила, которые сдвигать нельзя: остаёмся на опоре
+    anchored = [
+        "RRULE:FREQ=DAILY;COUNT=5000",
+        "RRULE:FREQ=WEEKLY;BYDAY=MO\nEXRULE:FREQ=DAILY;COUNT=30",
+        "RRULE:FREQ=YEARLY;BYMONTH=2;BYMONTHDAY=29",
+        "RRULE:FREQ=DAILY;INTERVAL=5\nRRULE:FREQ=MONTHLY;INTERVAL=2",
+    ]
+    windows = [
+        (datetime(2010, 1, 1), datetime(2010, 3, 1)),
+        (datetime(2010, 2, 10), datetime(2011, 1, 1)),
+        (datetime(2025, 1, 1), datetime(2025, 2, 1)),
+        (datetime(2025, 2, 27, 12), datetime(2025, 3, 3, 12)),
+        (datetime(2026, 3, 1), datetime(2026, 4, 30)),
+        (datetime(2031, 12, 25), datetime(2032, 3, 5)),
+    ]
+
+    @staticmethod
+    def between(rule, start, end, dtstart):
+        return rule.to_dateutil_rruleset(dtstart).between(start, end, inc=True)
+
+    def test_shifted_dtstart_gives_same_occurrences(self):
+        for text in self.shiftable:
+            rule = recurrence.deserialize(text)
+            for start, end in self.windows:
+                with self.subTest(rule=text, window=start):
+                    dtstart = skip_ahead_dtstart(rule, start)
+                    self.assertLessEqual(dtstart, max(start, RRULE_ANCHOR))
+                    self.assertEqual(
+                        self.between(rule, start, end, dtstart),
+                        self.between(rule, start, end, RRULE_ANCHOR),
+                    )
+
+    def test_far_windows_actually_skip(self):
+        start = datetime(2025, 6, 1)
+        for text in self.shiftable:
+            with self.subTest(rule=text):
+                self.assertGreater(skip_ahead_dtstart(recurrence.deserialize(text), start), datetime(2020, 1, 1))
+
+    def test_count_yearly_and_mixed_periods_stay_anchored(self):
+        for text in self.anchored:
+            rule = recurrence.deserialize(text)
+            with self.subTest(rule=text):
+                self.assertEqual(skip_ahead_dtstart(rule, datetime(2025, 6, 1)), RRULE_ANCHOR)
+
+    def test_window_before_anchor(self):
+        rule = recurrence.deserialize("RRULE:FREQ=DAILY")
+        self.assertEqual(skip_ahead_dtstart(rule, RRULE_ANCHOR - timedelta(days=30)), RRULE_ANCHOR)
+
+
+# ------------------------------------------------------------
+# 🔹 EventOccurrence
+# ------------------------------------------------------------
+class EventOccurrenceTests(SimpleTestCase):
+    def test_copy_and_pickle(self):
+        occurrence = EventOccurrence(Event(pk=7, name="e"), datetime(2025, 1, 1), amount=10)
+        for clone in (copy.copy(occurrence), pickle.loads(pickle.dumps(occurrence))):
+            self.assertEqual((clone.event.pk, clone.name, clone.amount), (7, "e", 10))
+
+    def test_unset_event_raises_attribute_error(self):
+        empty = EventOccurrence.__new__(EventOccurrence)
+        with self.assertRaises(AttributeError):
+            empty.name
+
+
+# ------------------------------------------------------------
+# 🔹 Серии «каждые N месяцев» (monthly_series_hits)
+# ------------------------------------------------------------
+class MonthlySeriesHitsTests(SimpleTestCase):
+    @staticmethod
+    def walk(series_start, series_end, interval, start_dt, end_dt):
+        """Прежняя реализация: шагаем по серии от её начала."""
+        hits = []
+        current = series_start
+        while current <= series_end:
+            if start_dt <= current <= end_dt:
+                hits.append(current)
+            current = add_months(current, interval)
+        return hits
+
+    def test_matches_month_walk(self):
+        tz = timezone.get_current_timezone()
+        rng = random.Random(20250101)
+
+        def random_dt(year_from, year_to):
+            return aware(rng.randint(year_from, year_to), rng.randint(1, 12), rng.randint(1, 28),
+                         rng.randint(0, 23), rng.choice((0, 30, 59)))
+
+        for _ in range(500):
+            series_start = first_of_month(random_dt(2000, 2030), tz)
+            series_end = add_months(series_start, rng.randint(0, 120))
+            interval = rng.randint(1, 12)
+            # окно — рядом с серией, чтобы пересечения были частыми
+            start_dt = series_start + timedelta(days=rng.randint(-400, 3700), minutes=rng.randint(0, 1439))
+            if rng.random() < 0.3:
+                start_dt = first_of_month(start_dt, tz)  # граница точно на первом числе
+            end_dt = start_dt + timedelta(days=rng.randint(0, 2000))
+            with self.subTest(series=(series_start, series_end, interval), window=(start_dt, end_dt)):
+                self.assertEqual(
+                    monthly_series_hits(series_start, series_end, interval, start_dt, end_dt, tz),
+                    self.walk(series_start, series_end, interval, start_dt, end_dt),
+                )
+
+
+# ------------------------------------------------------------
+# 🔹 Мемо разметки дней (DayTypesMemo)
+# ------------------------------------------------------------
+class DayTypesMemoTests(SimpleTestCase):
+    @staticmethod
+    def pattern(pk, work, off):
+        return SchedulePattern(pk=pk, name=f"p{pk}", mode=PatternMode.ALTERNATING, pattern_after_start=[work, off])
+
+    @staticmethod
+    def days(memo, pattern, year=2025, month=1):
+        return memo.get_or_compute("days", pattern, year, month, lambda c: tuple(c.month_day_types(year, month)))
+
+    def test_pattern_edits_do_not_grow_memory(self):
+        memo = DayTypesMemo(maxsize=8)
+        for edit in range(1, 60):
+            # одна и та же запись шаблона, правка за правкой
+            self.days(memo, self.pattern(1, edit, 1))
+            self.days(memo, self.pattern(1, edit, 1), month=2)
+        self.assertEqual(memo.stats()["patterns"], 1)
+        self.assertEqual(memo.stats()["size"], 2)
+        self.assertEqual(len(memo._by_pattern), 1)
+
+    def test_compiled_patterns_are_bounded(self):
+        memo = DayTypesMemo(maxsize=4)
+        for pk in range(1, 30):
+            self.days(memo, self.pattern(pk, pk, 2))
+        stats = memo.stats()
+        self.assertLessEqual(stats["patterns"], 4)
+        self.assertLessEqual(stats["size"], 4)
+
+    def test_forget_pattern_and_hits(self):
+        memo = DayTypesMemo(maxsize=16)
+        first = self.days(memo, self.pattern(1, 2, 2))
+        self.assertEqual(self.days(memo, self.pattern(1, 2, 2)), first)
+        self.assertEqual(memo.hits, 1)
+        memo.forget_pattern(1)
+        self.assertEqual(memo.stats()["size"], 0)
+        self.assertEqual(memo.stats()["patterns"], 0)
+        self.assertEqual(self.days(memo, self.pattern(1, 2, 2)), first)
+
+
+# ------------------------------------------------------------
+# 🔹 Битовые маски месяца против поденного списка
+# ------------------------------------------------------------
+class MonthMasksTests(SimpleTestCase):
+    patterns = [
+        SchedulePattern(mode=PatternMode.WEEKDAY, weekday_map={
+            "mon": "work", "tue": "work", "wed": "work", "thu": "work", "fri": "work", "sat": "off", "sun": "off",
+        }),
+        SchedulePattern(mode=PatternMode.WEEKDAY, weekday_map={
+            "mon": "off", "tue": "work", "wed": "off", "thu": "work", "fri": "off", "sat": "work", "sun": "off",
+        }),
+        SchedulePattern(mode=PatternMode.ALTERNATING, pattern_after_start=[2, 2]),
+        SchedulePattern(mode=PatternMode.ALTERNATING, pattern_after_start=[5, 2, 3, 1], days_off_at_start=3),
+        SchedulePattern(mode=PatternMode.ALTERNATING, pattern_after_start=[40, 1], days_off_at_start=35),
+        SchedulePattern(mode=PatternMode.ALTERNATING, pattern_after_start=[3, 4],
+                        days_off_at_start=2, phase_anchor=date(2024, 11, 20)),
+        SchedulePattern(mode=PatternMode.ALTERNATING, pattern_after_start=[1, 6], phase_anchor=date(2026, 3, 5)),
+    ]
+    months = [(2024, 2), (2024, 11), (2025, 1), (2025, 2), (2026, 3), (2026, 4), (2027, 12)]
+
+    def test_masks_match_day_list(self):
+        for index, pattern in enumerate(self.patterns):
+            compiled = compile_pattern(pattern)
+            for year, month in self.months:
+                with self.subTest(pattern=index, month=(year, month)):
+                    day_list = compiled.month_day_types(year, month)
+                    masks = compiled.month_masks(year, month)
+                    self.assertEqual(masks.labels(), day_list)
+                    self.assertEqual(masks.counts(), dict(Counter(day_list)))
+                    for label in set(day_list):
+                        self.assertEqual(
+                            days_of_mask(masks.mask(label)),
+                            [i + 1 for i, item in enumerate(day_list) if item == label],
+                        )
+
+    def test_overrides_match_full_date_merge(self):
+        rng = random.Random(15)
+        for index, pattern in enumerate(self.patterns):
+            compiled = compile_pattern(pattern)
+            for year, month in self.months:
+                start = date(year, month, 1)
+                # часть исключений — из соседних месяцев (DayOverride этого не запрещает)
+                overrides = {
+                    start + timedelta(days=rng.randint(-40, 70)): rng.choice(list(DayType.values))
+                    for _ in range(12)
+                }
+                with self.subTest(pattern=index, month=(year, month)):
+                    day_list = [
+                        overrides.get(start + timedelta(days=i), label)
+                        for i, label in enumerate(compiled.month_day_types(year, month))
+                    ]
+                    masks = compiled.month_masks(year, month).with_overrides(
+                        month_overrides(overrides.items(), year, month)
+                    )
+                    self.assertEqual(masks.labels(), day_list)
+                    self.assertEqual(masks.counts(), dict(Counter(day_list)))
+
+    def test_preview_ignores_override_from_another_month(self):
+        pattern = self.patterns[0]
+        schedule = MonthSchedule(year=2025, month=3, pattern=pattern)
+        foreign = DayOverride(date=date(2025, 4, 3), type=DayType.VACATION)
+        own = DayOverride(date=date(2025, 3, 5), type=DayType.HOLIDAY)
+        payload = build_month_preview(schedule, 2025, 3, {}, overrides=[foreign, own])
+        types = [day["type"] for day in payload["days"]]
+        self.assertEqual(types[2], compile_pattern(pattern).month_day_types(2025, 3)[2])
+        self.assertEqual(types[4], DayType.HOLIDAY)
+        self.assertEqual(payload["summary"]["overridden_days"], 1)
+
+
+# ------------------------------------------------------------
+# 🔹 Свободное время (availability)
+# ------------------------------------------------------------
+class IntervalOpsTests(SimpleTestCase):
+    def h(self, day, hour, minute=0):
+        return datetime(2025, 3, day, hour, minute)
+
+    def test_merge_overlapping_adjacent_and_nested(self):
+        h = self.h
+        merged = merge_intervals([
+            (h(3, 14), h(3, 16)),
+            (h(3, 10), h(3, 12)),
+            (h(3, 12), h(3, 13)),    # смежный — склеивается
+            (h(3, 11), h(3, 11, 30)),  # вложенный
+            (h(3, 15), h(3, 17)),    # пересекается
+            (h(3, 18), h(3, 18)),    # пустой — выбрасывается
+        ])
+        self.assertEqual(merged, [(h(3, 10), h(3, 13)), (h(3, 14), h(3, 17))])
+        self.assertEqual(merge_intervals([]), [])
+
+    def test_subtract_busy_spanning_several_work_intervals(self):
+        h = self.h
+        work = [(h(3, 10), h(3, 18)), (h(4, 10), h(4, 18)), (h(5, 10), h(5, 18))]
+        busy = merge_intervals([
+            (h(3, 9), h(3, 11)),    # начинается до рабочего дня
+            (h(3, 15), h(5, 12)),   # накрывает вечер, целый день и утро
+            (h(5, 13), h(5, 14)),
+            (h(5, 17), h(5, 20)),   # заходит за конец дня
+        ])
+        self.assertEqual(subtract_intervals(work, busy), [
+            (h(3, 11), h(3, 15)),
+            (h(5, 12), h(5, 13)),
+            (h(5, 14), h(5, 17)),
+        ])
+
+    def test_subtract_without_overlap(self):
+        h = self.h
+        work = [(h(3, 10), h(3, 18))]
+        self.assertEqual(subtract_intervals(work, []), work)
+        self.assertEqual(subtract_intervals(work, [(h(2, 10), h(2, 18)), (h(4, 10), h(4, 18))]), work)
+        self.assertEqual(subtract_intervals(work, [(h(3, 10), h(3, 18))]), [])
+
+
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="free", password="x")
+        weekdays = SchedulePattern.objects.create(
+            name="Будни", mode=PatternMode.WEEKDAY, working_day_duration=8,
+            weekday_map={"mon": "work", "tue": "work", "wed": "work", "thu": "work", "fri": "work",
+                         "sat": "off", "sun": "off"},
+        )
+        MonthSchedule.objects.create(user=self.user, year=2025, month=3, pattern=weekdays)
+        # пн 2025-03-03: событие 10:00–11:00 и бронь 13:00–15:00 (SCHEDULE_SLOT_MINUTES = 120)
+        Event.objects.create(user=self.user, name="call", start_datetime=aware(2025, 3, 3, 10), duration_minutes=60)
+        artist = Artist.objects.create(user=self.user)
+        commission = Commission.objects.create(artist=artist, commissioner=Commissioner.objects.create(name="c"),
+                                               amount=100)
+        booked = Slot.objects.create(date_range=aware(2025, 3, 3, 13), status="booked")
+        available = Slot.objects.create(date_range=aware(2025, 3, 4, 10), status="available")
+        for slot in (booked, available):
+            Artwork.objects.create(description="a", type="sketch", status="pending", slot=slot, commission=commission)
+
+    def test_free_windows_exclude_events_and_booked_slots(self):
+        windows = find_free_windows(self.user, aware(2025, 3, 3), aware(2025, 3, 4, 23, 59))
+        self.assertEqual(windows, [
+            FreeWindow(aware(2025, 3, 3, 11), aware(2025, 3, 3, 13)),
+            FreeWindow(aware(2025, 3, 3, 15), aware(2025, 3, 3, 18)),
+            FreeWindow(aware(2025, 3, 4, 10), aware(2025, 3, 4, 18)),  # свободный Slot не занимает время
+        ])
+
+    def test_event_started_before_window_stays_busy(self):
+        # одиночное событие 2025-03-05 .. 2025-03-14 закрывает 10–12 марта целиком
+        Event.objects.create(user=self.user, name="trip", start_datetime=aware(2025, 3, 5, 9),
+                             end_datetime=aware(2025, 3, 14, 12))
+        self.assertEqual(find_free_windows(self.user, aware(2025, 3, 10), aware(2025, 3, 12, 23, 59)), [])
+        self.assertEqual(
+            find_free_windows(self.user, aware(2025, 3, 14), aware(2025, 3, 14, 23, 59)),
+            [FreeWindow(aware(2025, 3, 14, 12), aware(2025, 3, 14, 18))],
+        )
+
+    def test_next_free_windows(self):
+        windows = next_free_windows(self.user, 120, 4, after=aware(2025, 3, 1), max_days=10)
+        self.assertEqual([(window.start, window.end) for window in windows], [
+            (aware(2025, 3, 3, 11), aware(2025, 3, 3, 13)),
+            (aware(2025, 3, 3, 15), aware(2025, 3, 3, 17)),
+            (aware(2025, 3, 4, 10), aware(2025, 3, 4, 12)),
+            (aware(2025, 3, 4, 12), aware(2025, 3, 4, 14)),
+        ])
+
+    def test_out_of_range_bounds_are_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get("/api/schedule/availability/", {"from": "2025-01-01", "to": "9999-12-31"})
+        self.assertEqual(response.status_code, 400)
+        response = client.get("/api/schedule/availability/next/", {"after": "9999-12-31"})
+        self.assertEqual(response.status_code, 400)
+
+
+# ------------------------------------------------------------
+# 🔹 Сетка команды (preview/team)
+# ------------------------------------------------------------
+class ScheduleTeamPreviewTests(TestCase):
+    year, month = 2025, 3
+
+    def setUp(self):
+        User = get_user_model()
+        self.manager_user = User.objects.create_user(username="boss", password="x")
+        self.manager = Manager.objects.create(user=self.manager_user)
+        weekdays = SchedulePattern.objects.create(name="Пн–Пт", mode=PatternMode.WEEKDAY, weekday_map={
+            "mon": "work", "tue": "work", "wed": "work", "thu": "work", "fri": "work", "sat": "off", "sun": "off",
+        })
+        short_week = SchedulePattern.objects.create(name="Пн–Чт", mode=PatternMode.WEEKDAY, weekday_map={
+            "mon": "work", "tue": "work", "wed": "work", "thu": "work", "fri": "off", "sat": "off", "sun": "off",
+        })
+        shifts = SchedulePattern.objects.create(name="2/2", mode=PatternMode.ALTERNATING, pattern_after_start=[2, 2])
+        self.artists = []
+        overrides = {
+            weekdays: [(date(2025, 3, 3), DayType.VACATION)],
+            short_week: [(date(2025, 3, 8), DayType.WORK), (date(2025, 4, 7), DayType.OFF)],  # апрельская — чужая
+            shifts: [(date(2025, 3, 10), DayType.WORK)],
+        }
+        for index, pattern in enumerate((weekdays, short_week, shifts)):
+            user = User.objects.create_user(username=f"artist{index}", password="x")
+            self.artists.append(Artist.objects.create(user=user, manager=self.manager))
+            schedule = MonthSchedule.objects.create(user=user, year=self.year, month=self.month, pattern=pattern)
+            for day, day_type in overrides[pattern]:
+                DayOverride.objects.create(month_schedule=schedule, date=day, type=day_type)
+        self.client = APIClient()
+
+    def get(self, user, **params):
+        self.client.force_authenticate(user)
+        params.setdefault("year", self.year)
+        params.setdefault("month", self.month)
+        return self.client.get("/api/schedule/preview/team/", params)
+
+    def expected_types(self, artist):
+        # эталон — посуточный список шаблона с наложенными исключениями своего месяца
+        schedule = MonthSchedule.objects.get(user=artist.user, year=self.year, month=self.month)
+        types = compile_pattern(schedule.pattern).month_day_types(self.year, self.month)
+        for override in schedule.overrides.all():
+            if (override.date.year, override.date.month) == (self.year, self.month):
+                types[override.date.day - 1] = override.type
+        return types
+
+    def test_team_days_match_per_day_intersection(self):
+        response = self.get(self.manager_user)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+
+        all_types = [self.expected_types(artist) for artist in self.artists]
+        self.assertEqual([row["types"] for row in data["artists"]], all_types)
+        days = range(1, len(all_types[0]) + 1)
+        self.assertEqual(data["team"]["all_work_days"],
+                         [day for day in days if all(types[day - 1] == "work" for types in all_types)])
+        self.assertEqual(data["team"]["all_off_days"],
+                         [day for day in days if all(types[day - 1] == "off" for types in all_types)])
+        self.assertTrue(data["team"]["all_work_days"])
+        self.assertNotIn(3, data["team"]["all_work_days"])  # у первого — отпуск
+        self.assertEqual([row["overridden_days"] for row in data["artists"]], [[3], [8], [10]])
+
+    def test_foreign_team_is_forbidden_except_for_staff(self):
+        stranger = get_user_model().objects.create_user(username="stranger", password="x")
+        Manager.objects.create(user=stranger)
+        self.assertEqual(self.get(stranger, manager=self.manager.pk).status_code, 403)
+
+        stranger.is_staff = True
+        stranger.save()
+        self.assertEqual(self.get(stranger, manager=self.manager.pk).status_code, 200)
+
+    def test_out_of_range_year_is_rejected(self):
+        for year in (0, 1, 9999, 10000):
+            with self.subTest(year=year):
+                self.assertEqual(self.get(self.manager_user, year=year).status_code, 400)
+
+
+# ------------------------------------------------------------
+# 🔹 Раскладка задач (task_scheduler)
+# ------------------------------------------------------------
+def task(pk, minutes=60, date_day=None, **kwargs):
+    return Event(pk=pk, event_type=Event.EventType.TASK, duration_minutes=minutes, date_day=date_day, **kwargs)
+
+
+class PackTasksTests(SimpleTestCase):
+    def capacity(self, *hours):
+        capacity = WorkCapacity(1, date(2025, 3, 3), len(hours))
+        capacity.hours = list(hours)
+        return capacity
+
+    def placed(self, assignments):
+        return [(item.task_id, item.new_date and item.new_date.day, item.oversized) for item in assignments]
+
+    def test_heavy_limit_per_day(self):
+        tasks = [task(pk, type=Event.TypeChoices.HEAVY) for pk in (1, 2, 3)] + [task(4)]
+        result = pack_tasks(tasks, self.capacity(8, 8, 0, 8), limits=DEFAULT_TASK_DAY_LIMITS)
+        self.assertEqual(self.placed(result), [(1, 3, False), (2, 4, False), (3, 6, False), (4, 3, False)])
+
+    def test_busy_tasks_take_hours_and_limits(self):
+        busy = [
+            task(10, minutes=180, date_day=date(2025, 3, 3), type=Event.TypeChoices.HEAVY),
+            task(11, date_day=date(2025, 2, 1)),  # вне окна — не учитывается
+        ]
+        tasks = [task(1, minutes=120), task(2, minutes=60, type=Event.TypeChoices.HEAVY), task(3, minutes=60)]
+        result = pack_tasks(tasks, self.capacity(4, 4), busy=busy, limits=DEFAULT_TASK_DAY_LIMITS)
+        # 3 марта свободен 1 час и уже стоит тяжёлая: туда встаёт только обычная часовая
+        self.assertEqual(self.placed(result), [(1, 4, False), (2, 4, False), (3, 3, False)])
+
+    def test_oversized_task_takes_first_empty_day(self):
+        tasks = [task(1, minutes=60), task(2, minutes=600), task(3, minutes=600)]
+        result = pack_tasks(tasks, self.capacity(4, 4), limits={})
+        self.assertEqual(self.placed(result), [(1, 3, False), (2, 4, True), (3, None, False)])
+        self.assertEqual(result[2].hours, 10)
+
+    def test_matches_plain_first_fit(self):
+        # first_open только пропускает заведомо полные дни — результат как у наивного first fit
+        rng = random.Random(19)
+        for case in range(30):
+            hours = [rng.choice((0, 2, 4, 6, 8)) for _ in range(rng.randint(1, 20))]
+            tasks = [
+                task(pk, minutes=rng.choice((30, 60, 90, 120, 240)),
+                     type=rng.choice((None, Event.TypeChoices.HEAVY, Event.TypeChoices.FUN)))
+                for pk in range(1, rng.randint(1, 60))
+            ]
+            tasks.sort(key=lambda item: -item.duration_minutes)
+            with self.subTest(case=case):
+                free = list(hours)
+                heavy = [0] * len(hours)
+                taken = [0] * len(hours)
+                expected = []
+                for item in tasks:
+                    need = item.duration_minutes / 60
+                    allowed = [not (item.type == Event.TypeChoices.HEAVY and heavy[i]) for i in range(len(hours))]
+                    day = next((i for i in range(len(hours)) if hours[i] and free[i] >= need and allowed[i]), None)
+                    oversized = False
+                    if day is None:
+                        day = next((i for i in range(len(hours)) if hours[i] and not taken[i] and allowed[i]), None)
+                        oversized = day is not None
+                    if day is not None:
+                        free[day] -= need
+                        taken[day] += 1
+                        heavy[day] += item.type == Event.TypeChoices.HEAVY
+                    expected.append((day, oversized))
+                result = pack_tasks(tasks, self.capacity(*hours), limits=DEFAULT_TASK_DAY_LIMITS)
+                self.assertEqual(
+                    [(item.new_date and (item.new_date - date(2025, 3, 3)).days, item.oversized) for item in result],
+                    expected,
+                )
+
+
+class AutoScheduleTasksTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="tasks", password="x")
+        weekdays = SchedulePattern.objects.create(
+            name="Будни 8ч", mode=PatternMode.WEEKDAY, working_day_duration=8,
+            weekday_map={"mon": "work", "tue": "work", "wed": "work", "thu": "work", "fri": "work",
+                         "sat": "off", "sun": "off"},
+        )
+        MonthSchedule.objects.create(user=self.user, year=2025, month=3, pattern=weekdays)
+        self.busy = self.task("busy", 420, date(2025, 3, 3))
+        self.overdue = self.task("overdue", 120, date(2025, 2, 20), type=Event.TypeChoices.IMPORTANT)
+        self.heavy_first = self.task("heavy 1", 60, type=Event.TypeChoices.HEAVY)
+        self.heavy_second = self.task("heavy 2", 60, type=Event.TypeChoices.HEAVY)
+        self.plain = self.task("plain", 60)
+        self.done = self.task("done", 60, status=CompletionStatus.COMPLETE)
+
+    def task(self, name, minutes, date_day=None, **kwargs):
+        return Event.objects.create(user=self.user, name=name, event_type=Event.EventType.TASK,
+                                    duration_minutes=minutes, date_day=date_day, **kwargs)
+
+    def dates(self):
+        return dict(Event.objects.filter(user=self.user).values_list("name", "date_day"))
+
+    def test_plan(self):
+        result = auto_schedule_tasks(self.user, days=7, start_date=date(2025, 3, 3), dry_run=True)
+        # пн 3-го свободен час (7 из 8 занято): туда встаёт первая тяжёлая, остальное — на вт
+        self.assertEqual(
+            {item["task_id"]: item["new_date"] for item in result["assigned"]},
+            {
+                self.overdue.pk: date(2025, 3, 4),
+                self.heavy_first.pk: date(2025, 3, 3),
+                self.heavy_second.pk: date(2025, 3, 4),
+                self.plain.pk: date(2025, 3, 4),
+            },
+        )
+        self.assertEqual(result["unplaced"], [])
+        self.assertEqual(result["capacity_hours"], 40)
+
+    def test_dry_run_does_not_write(self):
+        before = self.dates()
+        auto_schedule_tasks(self.user, days=7, start_date=date(2025, 3, 3), dry_run=True)
+        self.assertEqual(self.dates(), before)
+
+    def test_bulk_update_writes_dates(self):
+        result = auto_schedule_tasks(self.user, days=7, start_date=date(2025, 3, 3))
+        self.assertEqual(self.dates(), {
+            "busy": date(2025, 3, 3),
+            "overdue": date(2025, 3, 4),
+            "heavy 1": date(2025, 3, 3),
+            "heavy 2": date(2025, 3, 4),
+            "plain": date(2025, 3, 4),
+            "done": None,  # закрытые задачи не трогаем
+        })
+        self.assertEqual(len(result["assigned"]), 4)
+
+    def test_view(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        before = self.dates()
+        response = client.post("/api/schedule/tasks/auto-schedule/",
+                               {"days": 7, "start": "2025-03-03", "dry_run": "1"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["assigned"]), 4)
+        self.assertEqual(self.dates(), before)
+        response = client.post("/api/schedule/tasks/auto-schedule/", {"days": 0}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+# ------------------------------------------------------------
+# 🔹 План сдачи работ (capacity_planner)
+# ------------------------------------------------------------
+class CommissionPlanTests(TestCase):
+    start = date(2025, 3, 27)  # чт; окно 10 дней: 27, 28, 31 марта и 1–4 апреля рабочие — 56 часов
+
+    def setUp(self):
+        User = get_user_model()
+        self.manager_user = User.objects.create_user(username="planner boss", password="x")
+        manager = Manager.objects.create(user=self.manager_user)
+        weekdays = SchedulePattern.objects.create(
+            name="Будни 8ч", mode=PatternMode.WEEKDAY, working_day_duration=8,
+            weekday_map={"mon": "work", "tue": "work", "wed": "work", "thu": "work", "fri": "work",
+                         "sat": "off", "sun": "off"},
+        )
+        broken = SchedulePattern.objects.create(name="Битый", mode=PatternMode.ALTERNATING, pattern_after_start=[])
+
+        self.artist = Artist.objects.create(user=User.objects.create_user(username="painter", password="x"),
+                                            manager=manager)
+        self.other = Artist.objects.create(user=User.objects.create_user(username="broken", password="x"),
+                                           manager=manager)
+        for year, month in ((2025, 3), (2025, 4)):
+            MonthSchedule.objects.create(user=self.artist.user, year=year, month=month, pattern=weekdays)
+            MonthSchedule.objects.create(user=self.other.user, year=year, month=month,
+                                         pattern=weekdays if month == 3 else broken)
+
+        commission = Commission.objects.create(artist=self.artist, commissioner=Commissioner.objects.create(name="c"),
+                                               amount=100)
+        # (тип — часы, дедлайн, дата заказа); EDF: sketch, basic_render, premium_render, затем без дедлайна по дате
+        self.artworks = {
+            name: Artwork.objects.create(description=name, type=artwork_type, status="pending", commission=commission,
+                                         expected_completion_date=deadline, date=ordered)
+            for name, artwork_type, deadline, ordered in (
+                ("premium", "premium_render", date(2025, 4, 10), date(2025, 1, 1)),  # 28 ч
+                ("no deadline, late order", "flat_colors", None, date(2025, 2, 1)),  # 10 ч
+                ("sketch", "sketch", date(2025, 3, 27), date(2025, 3, 1)),          # 4 ч
+                ("no deadline", "lineart", None, date(2025, 1, 1)),                 # 6 ч
+                ("basic", "basic_render", date(2025, 3, 28), date(2025, 3, 1)),     # 16 ч
+            )
+        }
+        Artwork.objects.create(description="done", type="sketch", status="completed", commission=commission)
+
+    def plan(self):
+        return plan_commissions([self.artist, self.other], start_date=self.start, days=10)
+
+    def test_edf_order_and_dates(self):
+        row = self.plan()["artists"][0]
+        pk = {artwork.pk: name for name, artwork in self.artworks.items()}
+        self.assertEqual(
+            [(pk[item["artwork"]], item["start_date"], item["completion_date"], item["late_days"])
+             for item in row["artworks"]],
+            [
+                ("sketch", date(2025, 3, 27), date(2025, 3, 27), 0),
+                ("basic", date(2025, 3, 27), date(2025, 3, 31), 3),           # через выходные
+                ("premium", date(2025, 3, 31), date(2025, 4, 3), 0),          # через границу месяца
+                ("no deadline", date(2025, 4, 4), date(2025, 4, 4), 0),
+                ("no deadline, late order", date(2025, 4, 4), None, 0),       # не влезает в окно
+            ],
+        )
+        self.assertEqual(row["capacity_hours"], 56)
+        self.assertEqual(row["planned_hours"], 64)
+
+    def test_warnings(self):
+        artist_row, broken_row = self.plan()["artists"]
+        self.assertEqual(
+            [(warning["kind"], warning.get("artwork")) for warning in artist_row["warnings"]],
+            [("late", self.artworks["basic"].pk), ("beyond_horizon", self.artworks["no deadline, late order"].pk)],
+        )
+        self.assertEqual(artist_row["warnings"][0]["late_days"], 3)
+        # битый апрельский шаблон: предупреждение, а апрель считается нерабочим
+        self.assertEqual([warning["kind"] for warning in broken_row["warnings"]], ["schedule_error"])
+        self.assertTrue(broken_row["warnings"][0]["detail"].startswith("2025-04"))
+        self.assertEqual(broken_row["capacity_hours"], 24)
+        self.assertEqual(broken_row["artworks"], [])
+
+    def test_view_access(self):
+        client = APIClient()
+        params = {"artist": self.artist.pk, "start": self.start.isoformat(), "days": 10}
+        client.force_authenticate(self.other.user)
+        self.assertEqual(client.get("/api/schedule/planner/", params).status_code, 403)
+
+        for user in (self.artist.user, self.manager_user):
+            client.force_authenticate(user)
+            response = client.get("/api/schedule/planner/", params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()["artists"][0]["artworks"]), 5)
+
+
+# ------------------------------------------------------------
+# 🔹 Кэш месячных ответов: сброс сигналами
+# ------------------------------------------------------------
+class MonthCacheInvalidationTests(TestCase):
+    def setUp(self):
+        month_cache.cache.clear()
+        self.user = get_user_model().objects.create_user(username="cached", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.event = Event.objects.create(
+            user=self.user, name="mondays", start_datetime=aware(2025, 3, 1, 9),
+            recurrence=recurrence.deserialize("RRULE:FREQ=WEEKLY;BYDAY=MO"),
+        )
+
+    def fetch(self, path, **params):
+        """(ответ, был ли он из кэша)."""
+        hits = month_cache.hits
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), month_cache.hits > hits
+
+    def events(self):
+        return self.fetch("/api/schedule/all_events/", year=2025, month=3)
+
+    def preview(self):
+        return self.fetch("/api/schedule/preview/", user=self.user.pk, year=2025, month=3)
+
+    def test_preview_cold_month_is_cached_on_first_build(self):
+        self.assertFalse(MonthSchedule.objects.filter(user=self.user, year=2025, month=3).exists())
+        _, cached = self.preview()
+        self.assertFalse(cached)
+        _, cached = self.preview()
+        self.assertTrue(cached)
+
+    def test_event_save_invalidates_all_events(self):
+        payload, _ = self.events()
+        self.assertTrue(self.events()[1])
+        Event.objects.create(user=self.user, name="single", start_datetime=aware(2025, 3, 20, 12))
+        fresh, cached = self.events()
+        self.assertFalse(cached)
+        self.assertEqual(len(payload), 5)
+        self.assertEqual(len(fresh), 6)
+
+    def test_instance_save_invalidates_all_events(self):
+        payload, _ = self.events()
+        instance = EventInstance.objects.create(
+            parent_event=self.event, instance_datetime=datetime.fromisoformat(payload[1]["datetime"]),
+            status=CompletionStatus.CANCELLED,
+        )
+        fresh, cached = self.events()
+        self.assertFalse(cached)
+        self.assertEqual([item["instance_id"] for item in fresh][:2], [None, instance.pk])
+
+        instance.delete()
+        fresh, cached = self.events()
+        self.assertFalse(cached)
+        self.assertEqual({item["instance_id"] for item in fresh}, {None})
+
+    def test_day_override_save_invalidates_preview(self):
+        self.preview()
+        self.assertTrue(self.preview()[1])
+        schedule = MonthSchedule.objects.get(user=self.user, year=2025, month=3)
+        DayOverride.objects.create(month_schedule=schedule, date=date(2025, 3, 3), type=DayType.VACATION)
+        fresh, cached = self.preview()
+        self.assertFalse(cached)
+        self.assertEqual(fresh["days"][2]["type"], DayType.VACATION)
+
+    def test_pattern_save_invalidates_preview(self):
+        payload, _ = self.preview()
+        self.assertTrue(self.preview()[1])
+        pattern = MonthSchedule.objects.get(user=self.user, year=2025, month=3).pattern
+        pattern.working_day_duration = 6
+        pattern.save()
+        fresh, cached = self.preview()
+        self.assertFalse(cached)
+        self.assertNotEqual(fresh["summary"]["hours_per_day"], payload["summary"]["hours_per_day"])
+        self.assertEqual(fresh["summary"]["hours_per_day"], 6)
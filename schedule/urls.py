@@ -3,7 +3,8 @@ from rest_framework.routers import DefaultRouter
 from django.views.i18n import JavaScriptCatalog
 
 from .views import (
-    schedule_preview, EventExpandedListView,
+    schedule_preview, schedule_preview_range, schedule_preview_team, commission_plan, auto_schedule_tasks_view,
+    availability, availability_next, cache_stats, EventExpandedListView,
     EventViewSet, EventInstanceViewSet, SlotViewSet,
     SchedulePatternViewSet, MonthScheduleViewSet, DayOverrideViewSet, DeleteEventOrOccurrenceView, UpdateOccurrenceStatusView
 )
@@ -22,6 +23,13 @@ urlpatterns = [
     path('all_events/', EventExpandedListView.as_view(), name='events-expanded'),
     # Schedule & Tasks
     path('preview/', schedule_preview, name='schedule-preview'),
+    path('preview/range/', schedule_preview_range, name='schedule-preview-range'),
+    path('preview/team/', schedule_preview_team, name='schedule-preview-team'),
+    path('planner/', commission_plan, name='schedule-commission-plan'),
+    path('tasks/auto-schedule/', auto_schedule_tasks_view, name='schedule-tasks-auto-schedule'),
+    path('availability/', availability, name='schedule-availability'),
+    path('availability/next/', availability_next, name='schedule-availability-next'),
+    path('cache-stats/', cache_stats, name='schedule-cache-stats'),
 
     path('events/<int:event_id>/delete/', DeleteEventOrOccurrenceView.as_view()),
     path('events/<int:event_id>/update-status/', UpdateOccurrenceStatusView.as_view()),
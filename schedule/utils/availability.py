@@ -0,0 +1,210 @@
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from common.choices import EventDateMode, RecurrenceType
+from schedule.models import CompletionStatus, Event, Slot
+from schedule.utils.capacity_planner import build_work_capacities
+from schedule.utils.occurrence_helper import first_of_month, iter_expanded_occurrences
+from schedule.utils.occurrence_index import get_covering_horizon, iter_indexed_occurrences
+
+
+Interval = Tuple[datetime, datetime]
+
+
+# ------------------------------------------------------------
+# 🔹 Интервалы: слияние и вычитание
+# ------------------------------------------------------------
+class FreeWindow(NamedTuple):
+    start: datetime
+    end: datetime
+
+    @property
+    def minutes(self) -> int:
+        return int((self.end - self.start).total_seconds() // 60)
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Сортирует [start, end) и склеивает пересекающиеся/смежные. O(n log n)."""
+    merged = []
+    for start, end in sorted(interval for interval in intervals if interval[1] > interval[0]):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(base: List[Interval], busy: List[Interval]) -> List[Interval]:
+    """base минус busy; оба — отсортированы и слиты. Два указателя, O(n + m)."""
+    result = []
+    j = 0
+    for start, end in base:
+        cursor = start
+        while j < len(busy) and busy[j][1] <= cursor:
+            j += 1
+        k = j
+        while k < len(busy) and busy[k][0] < end:
+            if busy[k][0] > cursor:
+                result.append((cursor, busy[k][0]))
+            cursor = max(cursor, busy[k][1])
+            k += 1
+        if cursor < end:
+            result.append((cursor, end))
+    return result
+
+
+# ------------------------------------------------------------
+# 🔹 Рабочее время и занятость
+# ------------------------------------------------------------
+def workday_start() -> time:
+    """Начало рабочего дня (SCHEDULE_WORKDAY_START, 'HH:MM'); длину даёт working_day_duration."""
+    return time.fromisoformat(getattr(settings, "SCHEDULE_WORKDAY_START", "10:00"))
+
+
+def slot_duration() -> timedelta:
+    """Длина забронированного Slot: у модели только момент начала."""
+    return timedelta(minutes=getattr(settings, "SCHEDULE_SLOT_MINUTES", 120))
+
+
+def work_intervals(user, start_date: date, days: int, tz) -> List[Interval]:
+    """Рабочие интервалы по дням: [начало дня, + working_day_duration) на 'work'-днях."""
+    capacity = build_work_capacities([user.pk], start_date, days)[user.pk]
+    begin = workday_start()
+    intervals = []
+    for index, hours in enumerate(capacity.hours):
+        if hours <= 0:
+            continue
+        start = timezone.make_aware(datetime.combine(capacity.date_at(index), begin), tz)
+        intervals.append((start, start + timedelta(hours=hours)))
+    return intervals
+
+
+def _occurrence_end(event, occurs_at: datetime, rtype) -> Optional[datetime]:
+    """Конец вхождения: duration_minutes, а у одиночного — ещё end_datetime. Иначе None (точка)."""
+    if event.duration_minutes:
+        return occurs_at + timedelta(minutes=event.duration_minutes)
+    if rtype == RecurrenceType.SINGLE and event.end_datetime and event.end_datetime > occurs_at:
+        return event.end_datetime
+    return None
+
+
+def _busy_lookback(user, start_dt: datetime, tz) -> datetime:
+    """
+    С какого момента разворачивать вхождения, чтобы не потерять начавшиеся
+    до окна: назад на самый длинный duration_minutes пользователя и до начала
+    одиночных событий, чей end_datetime заходит в окно. Одна агрегатная выборка.
+    """
+    single = (
+        Q(date_mode=EventDateMode.NUMBER_OF_MONTH, is_recurring_monthly=False)
+        | (~Q(date_mode=EventDateMode.NUMBER_OF_MONTH) & (Q(recurrence__isnull=True) | Q(recurrence="")))
+    )
+    spans = Event.objects.filter(user=user, is_active=True).aggregate(
+        longest=Max("duration_minutes"),
+        spanning_from=Min(
+            "start_datetime",
+            filter=single & Q(start_datetime__lt=start_dt, end_datetime__gt=start_dt),
+        ),
+    )
+    lookback = start_dt - timedelta(minutes=spans["longest"] or 0)
+    if spans["spanning_from"] is not None:
+        # «за месяц» встаёт на 1-е число месяца start_datetime
+        lookback = min(lookback, first_of_month(spans["spanning_from"], tz))
+    return lookback
+
+
+def busy_intervals(user, start_dt: datetime, end_dt: datetime, tz) -> List[Interval]:
+    """
+    Занятость пользователя в окне, уже слитая: вхождения его событий (из
+    индекса Occurrence, если он покрывает окно, иначе разворачиванием) и
+    забронированные Slot его работ. Отменённые вхождения и события без
+    длительности не занимают времени.
+    """
+    # запас назад: вхождение, начавшееся до окна, может в него заходить
+    lookback = _busy_lookback(user, start_dt, tz)
+    if get_covering_horizon(lookback, end_dt):
+        occurrences = iter_indexed_occurrences(user, lookback, end_dt)
+    else:
+        occurrences = iter_expanded_occurrences(user, lookback, end_dt, tz)
+
+    intervals = []
+    for event, occurs_at, rtype, instance in occurrences:
+        status = instance.status if instance is not None else event.status
+        if status == CompletionStatus.CANCELLED or not event.is_active:
+            continue
+        end = _occurrence_end(event, occurs_at, rtype)
+        if end is not None and end > start_dt:
+            intervals.append((occurs_at, end))
+
+    length = slot_duration()
+    booked = (
+        Slot.objects.filter(
+            status="booked",
+            artwork__commission__artist__user=user,
+            date_range__gt=start_dt - length,
+            date_range__lt=end_dt,
+        )
+        .values_list("date_range", flat=True)
+        .distinct()
+    )
+    for starts_at in booked:
+        intervals.append((starts_at, starts_at + length))
+    return merge_intervals(intervals)
+
+
+# ------------------------------------------------------------
+# 🔹 Свободные окна
+# ------------------------------------------------------------
+def find_free_windows(user, start_dt: datetime, end_dt: datetime, min_minutes: int = 0,
+                      tz=None) -> List[FreeWindow]:
+    """Свободное рабочее время в [start_dt, end_dt): рабочие интервалы минус занятость."""
+    tz = tz or timezone.get_current_timezone()
+    start_date = timezone.localtime(start_dt, tz).date()
+    days = (timezone.localtime(end_dt, tz).date() - start_date).days + 1
+
+    work = [
+        (max(start, start_dt), min(end, end_dt))
+        for start, end in work_intervals(user, start_date, days, tz)
+        if end > start_dt and start < end_dt
+    ]
+    free = subtract_intervals(work, busy_intervals(user, start_dt, end_dt, tz))
+    minimum = timedelta(minutes=min_minutes)
+    return [FreeWindow(start, end) for start, end in free if end - start >= minimum]
+
+
+def next_free_windows(user, duration_minutes: int, count: int, after: Optional[datetime] = None,
+                      max_days: Optional[int] = None, tz=None) -> List[FreeWindow]:
+    """
+    Ближайшие count окон длиной duration_minutes для брони: свободные
+    интервалы режутся на окна подряд. Ищем кусками (14, 28, 56… дней),
+    пока не наберём count или не упрёмся в max_days
+    (SCHEDULE_PLANNER_HORIZON_DAYS).
+    """
+    tz = tz or timezone.get_current_timezone()
+    after = after or timezone.now()
+    if max_days is None:
+        max_days = getattr(settings, "SCHEDULE_PLANNER_HORIZON_DAYS", 120)
+    limit = after + timedelta(days=max_days)
+    length = timedelta(minutes=duration_minutes)
+
+    windows = []
+    chunk_start = after
+    chunk_days = 14
+    while chunk_start < limit and len(windows) < count:
+        # режем по полуночи, чтобы рабочий интервал не разрывался границей куска
+        chunk_midnight = datetime.combine(timezone.localtime(chunk_start, tz).date() + timedelta(days=chunk_days), time.min)
+        chunk_end = min(timezone.make_aware(chunk_midnight, tz), limit)
+        for free in find_free_windows(user, chunk_start, chunk_end, duration_minutes, tz):
+            cursor = free.start
+            while cursor + length <= free.end and len(windows) < count:
+                windows.append(FreeWindow(cursor, cursor + length))
+                cursor += length
+            if len(windows) >= count:
+                break
+        chunk_start = chunk_end
+        chunk_days *= 2
+    return windows
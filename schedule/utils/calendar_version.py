@@ -0,0 +1,48 @@
+import hashlib
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from django.db.models import Count, Max
+
+from schedule.models import Event, EventInstance
+
+
+# ------------------------------------------------------------
+# 🔹 Версия календаря пользователя (для ETag / Last-Modified)
+# ------------------------------------------------------------
+class CalendarVersion(NamedTuple):
+    etag: str
+    last_modified: Optional[datetime]
+
+
+def get_calendar_version(user, start_dt: datetime, end_dt: datetime, variant: str = "") -> CalendarVersion:
+    """
+    Дешёвый отпечаток данных, из которых собирается all_events за окно:
+    max(updated_at) и количество событий пользователя + max(modified_at)
+    и количество его EventInstance в окне. Два агрегатных запроса, без
+    разворачивания. Количество ловит удаления, max — правки и создания.
+
+    События берём все (не только «в окне»): RRULE-серия может попасть в окно
+    при любом start_datetime, а агрегат по индексу user всё равно дешёвый.
+
+    variant — всё, от чего ещё зависит тело ответа (параметры запроса),
+    подмешивается в ETag.
+    """
+    events = Event.objects.filter(user=user).aggregate(last=Max("updated_at"), total=Count("id"))
+    instances = EventInstance.objects.filter(
+        parent_event__user=user,
+        instance_datetime__gte=start_dt,
+        instance_datetime__lte=end_dt,
+    ).aggregate(last=Max("modified_at"), total=Count("id"))
+
+    stamps = [dt for dt in (events["last"], instances["last"]) if dt is not None]
+    last_modified = max(stamps) if stamps else None
+
+    raw = "|".join(str(part) for part in (
+        getattr(user, "pk", user), start_dt.isoformat(), end_dt.isoformat(),
+        events["last"] and events["last"].isoformat(), events["total"],
+        instances["last"] and instances["last"].isoformat(), instances["total"],
+        variant,
+    ))
+    etag = '"%s"' % hashlib.md5(raw.encode("utf-8")).hexdigest()
+    return CalendarVersion(etag=etag, last_modified=last_modified)
@@ -0,0 +1,244 @@
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from schedule.models import DayOverride, DayType
+from schedule.utils.month_schedules import resolve_month_schedules
+from schedule.utils.pattern_engine import days_of_mask, month_masks, month_overrides, pattern_hours_per_day
+
+
+# ------------------------------------------------------------
+# 🔹 Трудоёмкость работ
+# ------------------------------------------------------------
+# часы на работу по Artwork.type; переопределяется SCHEDULE_ARTWORK_TYPE_HOURS
+DEFAULT_ARTWORK_TYPE_HOURS = {
+    "sketch": 4.0,
+    "lineart": 6.0,
+    "flat_colors": 10.0,
+    "basic_render": 16.0,
+    "premium_render": 28.0,
+}
+FALLBACK_ARTWORK_HOURS = 8.0
+
+# погрешность float при вычитании часов
+EPSILON = 1e-9
+
+
+def artwork_type_hours() -> Dict[str, float]:
+    hours = dict(DEFAULT_ARTWORK_TYPE_HOURS)
+    hours.update(getattr(settings, "SCHEDULE_ARTWORK_TYPE_HOURS", {}) or {})
+    return hours
+
+
+# ------------------------------------------------------------
+# 🔹 Ёмкость художника по дням
+# ------------------------------------------------------------
+class WorkCapacity:
+    """Рабочие часы пользователя по дням окна: hours[i] — день start_date + i."""
+    __slots__ = ("user_id", "start_date", "hours", "errors")
+
+    def __init__(self, user_id: int, start_date: date, days: int):
+        self.user_id = user_id
+        self.start_date = start_date
+        self.hours = [0.0] * days
+        self.errors = []
+
+    @property
+    def total_hours(self) -> float:
+        return sum(self.hours)
+
+    def date_at(self, index: int) -> date:
+        return self.start_date + timedelta(days=index)
+
+
+def build_work_capacities(user_ids: Iterable[int], start_date: date, days: int) -> Dict[int, WorkCapacity]:
+    """
+    {user_id: WorkCapacity} на окно [start_date, start_date + days).
+
+    Рабочий день — 'work' по шаблону MonthSchedule с учётом DayOverride,
+    часов в нём — working_day_duration шаблона. Расписания читаются без
+    записи (resolve_month_schedules), исключения — одним запросом, разметка
+    месяца — битовыми масками из day_types_memo.
+    """
+    end_date = start_date + timedelta(days=days - 1)
+    start_serial = start_date.year * 12 + start_date.month
+    end_serial = end_date.year * 12 + end_date.month
+    months = [((serial - 1) // 12, (serial - 1) % 12 + 1) for serial in range(start_serial, end_serial + 1)]
+
+    capacities = {user_id: WorkCapacity(user_id, start_date, days) for user_id in user_ids}
+    schedules = resolve_month_schedules(capacities, months)
+
+    overrides = {}
+    saved_ids = [schedule.pk for schedule in schedules.values() if schedule.pk]
+    rows = DayOverride.objects.filter(month_schedule_id__in=saved_ids).values_list("month_schedule_id", "date", "type")
+    for schedule_id, day, day_type in rows:
+        overrides.setdefault(schedule_id, []).append((day, day_type))
+
+    for capacity in capacities.values():
+        for year, month in months:
+            schedule = schedules[(capacity.user_id, year, month)]
+            try:
+                masks = month_masks(schedule.pattern, year, month)
+            except ValueError as e:
+                capacity.errors.append(f"{year}-{month:02d}: {e}")
+                continue
+            if schedule.pk in overrides:
+                masks = masks.with_overrides(month_overrides(overrides[schedule.pk], year, month))
+            hours_per_day = pattern_hours_per_day(schedule.pattern)
+            month_start = date(year, month, 1)
+            for day in days_of_mask(masks.mask(DayType.WORK)):
+                index = (month_start - start_date).days + day - 1
+                if 0 <= index < days:
+                    capacity.hours[index] = hours_per_day
+    return capacities
+
+
+# ------------------------------------------------------------
+# 🔹 Раскладка работ (earliest deadline first)
+# ------------------------------------------------------------
+class PlannedArtwork(NamedTuple):
+    artwork_id: int
+    commission_id: int
+    artist_id: int
+    type: str
+    hours: float
+    deadline: Optional[date]
+    start_date: Optional[date]
+    completion_date: Optional[date]  # None — не влезает в окно
+
+    @property
+    def late_days(self) -> int:
+        if self.deadline is None or self.completion_date is None:
+            return 0
+        return max((self.completion_date - self.deadline).days, 0)
+
+
+def pack_artworks(artist_id: int, capacity: WorkCapacity, artworks: Iterable[dict]) -> List[PlannedArtwork]:
+    """
+    Раскладывает работы по рабочим часам подряд, без простоев, в порядке
+    artworks (его задаёт вызывающий: EDF). Один проход указателем по дням —
+    O(дней + работ).
+    """
+    hours = capacity.hours
+    index = 0
+    remaining = hours[0] if hours else 0.0
+    planned = []
+    for artwork in artworks:
+        need = artwork["hours"]
+        started = None
+        while need > EPSILON and index < len(hours):
+            if remaining <= EPSILON:
+                index += 1
+                remaining = hours[index] if index < len(hours) else 0.0
+                continue
+            if started is None:
+                started = index
+            taken = min(need, remaining)
+            need -= taken
+            remaining -= taken
+        finished = need <= EPSILON
+        planned.append(PlannedArtwork(
+            artwork_id=artwork["id"],
+            commission_id=artwork["commission_id"],
+            artist_id=artist_id,
+            type=artwork["type"],
+            hours=artwork["hours"],
+            deadline=artwork["deadline"],
+            start_date=capacity.date_at(started) if started is not None else None,
+            completion_date=capacity.date_at(index) if finished else None,
+        ))
+    return planned
+
+
+def pending_artworks_by_artist(artist_ids: Iterable[int]) -> Dict[int, List[dict]]:
+    """
+    Незавершённые работы по художникам (через Commission), одним запросом,
+    уже в порядке EDF: сначала с дедлайном (раньше — первее), потом без
+    него; при равенстве — по дате и id.
+    """
+    from artworks.models import Artwork
+
+    type_hours = artwork_type_hours()
+    rows = (
+        Artwork.objects.filter(status="pending", commission__artist_id__in=list(artist_ids))
+        .order_by(F("expected_completion_date").asc(nulls_last=True), "date", "pk")
+        .values_list("pk", "commission_id", "commission__artist_id", "type", "expected_completion_date")
+    )
+    result = {}
+    for pk, commission_id, artist_id, artwork_type, deadline in rows:
+        result.setdefault(artist_id, []).append({
+            "id": pk,
+            "commission_id": commission_id,
+            "type": artwork_type,
+            "hours": float(type_hours.get(artwork_type, FALLBACK_ARTWORK_HOURS)),
+            "deadline": deadline,
+        })
+    return result
+
+
+# ------------------------------------------------------------
+# 🔹 План команды
+# ------------------------------------------------------------
+def plan_commissions(artists, start_date: Optional[date] = None, days: Optional[int] = None) -> dict:
+    """
+    «Когда художник сдаст»: ёмкость каждого художника на окно, раскладка его
+    незавершённых работ по EDF, прогноз дат и предупреждения:
+      • late — прогноз позже expected_completion_date;
+      • beyond_horizon — работа не влезает в окно;
+      • schedule_error — битый шаблон, месяц посчитан как нерабочий.
+    Запросов — константа при любом числе художников и работ.
+    """
+    start_date = start_date or timezone.localdate()
+    if days is None:
+        days = getattr(settings, "SCHEDULE_PLANNER_HORIZON_DAYS", 120)
+    artists = list(artists)
+
+    capacities = build_work_capacities([artist.user_id for artist in artists], start_date, days)
+    artworks = pending_artworks_by_artist([artist.pk for artist in artists])
+
+    result = []
+    for artist in artists:
+        capacity = capacities[artist.user_id]
+        planned = pack_artworks(artist.pk, capacity, artworks.get(artist.pk, []))
+        warnings = [{"kind": "schedule_error", "detail": error} for error in capacity.errors]
+        for item in planned:
+            if item.completion_date is None:
+                warnings.append({"kind": "beyond_horizon", "artwork": item.artwork_id, "deadline": item.deadline})
+            elif item.late_days:
+                warnings.append({
+                    "kind": "late", "artwork": item.artwork_id, "deadline": item.deadline,
+                    "completion_date": item.completion_date, "late_days": item.late_days,
+                })
+
+        capacity_hours = capacity.total_hours
+        planned_hours = sum(item.hours for item in planned)
+        result.append({
+            "artist": artist.pk,
+            "name": str(artist),
+            "capacity_hours": capacity_hours,
+            "planned_hours": planned_hours,
+            "utilization": round(planned_hours / capacity_hours, 4) if capacity_hours else None,
+            "artworks": [
+                {
+                    "artwork": item.artwork_id,
+                    "commission": item.commission_id,
+                    "type": item.type,
+                    "hours": item.hours,
+                    "deadline": item.deadline,
+                    "start_date": item.start_date,
+                    "completion_date": item.completion_date,
+                    "late_days": item.late_days,
+                }
+                for item in planned
+            ],
+            "warnings": warnings,
+        })
+
+    return {
+        "start": start_date,
+        "end": start_date + timedelta(days=days - 1),
+        "artists": result,
+    }
@@ -0,0 +1,144 @@
+import threading
+from typing import Any, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+# ------------------------------------------------------------
+# 🔹 Кэш готовых месячных ответов (all_events, preview)
+# ------------------------------------------------------------
+EVENTS = "events"
+PREVIEW = "preview"
+
+# генерация для всех пользователей сразу (правка общего SchedulePattern)
+ALL_USERS = "all"
+
+
+class MonthPayloadCache:
+    """
+    Готовые месячные ответы в Django cache (SCHEDULE_MONTH_CACHE_ALIAS,
+    по умолчанию — 'default', т.е. LocMemCache, если CACHES не настроен).
+
+    Ключ ответа: (kind, user, year, month, версия, variant). Версия —
+    счётчики в том же кэше, их двигают сигналы (schedule/signals.py):
+      • месяц — (kind, user, year, month): точечные правки (EventInstance,
+        MonthSchedule, DayOverride);
+      • генерация — (kind, user): правка Event (RRULE задевает любые месяцы);
+      • общая генерация kind: правка SchedulePattern.
+    Старые записи не удаляются, а просто перестают совпадать и уходят по TTL.
+
+    LocMemCache живёт в процессе: при нескольких воркерах сигнал сбросит
+    версию только у себя — для прода нужен общий бэкенд (redis/memcached/db).
+    """
+
+    def __init__(self, alias: str = "default", timeout: int = 3600, enabled: bool = True):
+        self.alias = alias
+        self.timeout = timeout
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            alias=getattr(settings, "SCHEDULE_MONTH_CACHE_ALIAS", "default"),
+            timeout=getattr(settings, "SCHEDULE_MONTH_CACHE_TIMEOUT", 3600),
+            enabled=getattr(settings, "SCHEDULE_MONTH_CACHE_ENABLED", True),
+        )
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    # --- версии ---
+    @staticmethod
+    def _month_version_key(kind, user_id, year, month):
+        return f"schedule:month:v:{kind}:{user_id}:{year}-{month:02d}"
+
+    @staticmethod
+    def _generation_key(kind, user_id):
+        return f"schedule:month:g:{kind}:{user_id}"
+
+    def _bump(self, key):
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # ключа ещё нет (или вытеснен) — любое новое значение отличается от «нет версии»
+            self.cache.set(key, 1, None)
+        self._count("invalidations")
+
+    def invalidate_month(self, kind, user_id, year, month):
+        self._bump(self._month_version_key(kind, user_id, year, month))
+
+    def invalidate_user(self, kind, user_id):
+        self._bump(self._generation_key(kind, user_id))
+
+    def invalidate_all(self, kind):
+        self._bump(self._generation_key(kind, ALL_USERS))
+
+    # --- чтение/запись ---
+    def make_key(self, kind, user_id, year, month, variant="") -> str:
+        """
+        Ключ ответа с текущими версиями. Снимать ДО сборки ответа: если
+        во время сборки придёт правка, запись ляжет под старый ключ и не
+        будет прочитана.
+        """
+        version_keys = [
+            self._generation_key(kind, ALL_USERS),
+            self._generation_key(kind, user_id),
+            self._month_version_key(kind, user_id, year, month),
+        ]
+        versions = self.cache.get_many(version_keys)
+        stamp = ".".join(str(versions.get(key, 0)) for key in version_keys)
+        return f"schedule:month:{kind}:{user_id}:{year}-{month:02d}:{stamp}:{variant}"
+
+    def lookup(self, kind, user_id, year, month, variant="", bypass=False) -> Tuple[Optional[str], Any]:
+        """
+        Возвращает (key, payload): payload — None при промахе или обходе
+        кэша; key — None, если кэш выключен/обходится (тогда и сохранять нечего).
+        """
+        if bypass or not self.enabled:
+            self._count("bypassed")
+            return None, None
+        key = self.make_key(kind, user_id, year, month, variant)
+        payload = self.cache.get(key)
+        self._count("hits" if payload is not None else "misses")
+        return key, payload
+
+    def store(self, key: Optional[str], payload):
+        if key is not None:
+            self.cache.set(key, payload, self.timeout)
+
+    def clear_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.bypassed = self.invalidations = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "alias": self.alias,
+                "enabled": self.enabled,
+                "timeout": self.timeout,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+month_cache = MonthPayloadCache.from_settings()
+
+
+def is_cache_bypassed(request) -> bool:
+    """?nocache=1 — собрать ответ заново, не читая и не записывая кэш (для отладки)."""
+    return request.query_params.get("nocache") == "1"
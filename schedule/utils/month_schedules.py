@@ -0,0 +1,170 @@
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.utils import timezone
+
+from schedule.models import MonthSchedule
+
+
+# ------------------------------------------------------------
+# 🔹 Окно материализации
+# ------------------------------------------------------------
+def months_window(months_ahead: Optional[int] = None, today: Optional[date] = None) -> List[Tuple[int, int]]:
+    """
+    Пары (year, month): текущий месяц и months_ahead следующих
+    (по умолчанию — SCHEDULE_MONTH_SCHEDULE_HORIZON_MONTHS).
+    """
+    today = today or timezone.localdate()
+    if months_ahead is None:
+        months_ahead = getattr(settings, "SCHEDULE_MONTH_SCHEDULE_HORIZON_MONTHS", 12)
+    start_serial = today.year * 12 + today.month
+    return [
+        ((serial - 1) // 12, (serial - 1) % 12 + 1)
+        for serial in range(start_serial, start_serial + int(months_ahead) + 1)
+    ]
+
+
+# ------------------------------------------------------------
+# 🔹 Материализация MonthSchedule
+# ------------------------------------------------------------
+def materialize_month_schedules(months_ahead: Optional[int] = None, user_ids: Optional[Iterable[int]] = None,
+                                today: Optional[date] = None, batch_size: int = 500) -> int:
+    """
+    Заранее создаёт MonthSchedule на окно months_window() всем пользователям
+    (или только user_ids), чтобы чтения превью не писали в БД.
+
+    Правило то же, что у get_or_create_for_month: пустой месяц наследует
+    шаблон ближайшего предыдущего, а если раньше ничего нет — 'Классика'.
+    Один проход:
+      1) пользователи + шаблон их последнего расписания ДО окна (подзапрос);
+      дальше пачками по batch_size пользователей:
+      2) уже существующие расписания окна (только user/year/month/pattern_id);
+      3) bulk_create(ignore_conflicts=True) на все дыры.
+    Шаблоны не загружаются — ходим по pattern_id.
+
+    Возвращает число месяцев, отправленных в bulk_create (с ignore_conflicts
+    параллельно созданные строки молча пропускаются).
+    """
+    months = months_window(months_ahead, today)
+    start_serial = months[0][0] * 12 + months[0][1]
+    end_serial = months[-1][0] * 12 + months[-1][1]
+
+    latest_before = (
+        MonthSchedule.objects.filter(user=models.OuterRef("pk"))
+        .annotate(serial=models.F("year") * 12 + models.F("month"))
+        .filter(serial__lt=start_serial)
+        .order_by("-year", "-month")
+        .values("pattern_id")[:1]
+    )
+    users = get_user_model().objects.order_by("pk")
+    if user_ids is not None:
+        users = users.filter(pk__in=list(user_ids))
+
+    # пары (user_id, pattern_id) дешёвые — читаем целиком, чтобы не держать
+    # открытый курсор во время bulk_create
+    rows = list(users.annotate(previous_pattern_id=models.Subquery(latest_before)).values_list("pk", "previous_pattern_id"))
+
+    default_pattern_id = None
+    created = 0
+    for offset in range(0, len(rows), batch_size):
+        created_now, default_pattern_id = _fill_batch(
+            rows[offset:offset + batch_size], months, start_serial, end_serial, default_pattern_id, batch_size,
+        )
+        created += created_now
+    return created
+
+
+def _fill_batch(batch, months, start_serial, end_serial, default_pattern_id, batch_size):
+    """Дыры окна для пачки [(user_id, previous_pattern_id)] → один bulk_create."""
+    existing = {}
+    rows = (
+        MonthSchedule.objects.filter(user_id__in=[user_id for user_id, _ in batch])
+        .annotate(serial=models.F("year") * 12 + models.F("month"))
+        .filter(serial__gte=start_serial, serial__lte=end_serial)
+        .values_list("user_id", "year", "month", "pattern_id")
+    )
+    for user_id, year, month, pattern_id in rows:
+        existing[(user_id, year, month)] = pattern_id
+
+    missing = []
+    for user_id, pattern_id in batch:
+        for year, month in months:
+            key = (user_id, year, month)
+            if key in existing:
+                pattern_id = existing[key]
+                continue
+            if pattern_id is None:
+                if default_pattern_id is None:
+                    default_pattern_id = MonthSchedule.default_pattern().pk
+                pattern_id = default_pattern_id
+            missing.append(MonthSchedule(user_id=user_id, year=year, month=month, pattern_id=pattern_id))
+
+    if missing:
+        MonthSchedule.objects.bulk_create(missing, batch_size=batch_size, ignore_conflicts=True)
+    return len(missing), default_pattern_id
+
+
+# ------------------------------------------------------------
+# 🔹 Чтение расписаний без записи (для расчётов)
+# ------------------------------------------------------------
+def resolve_month_schedules(user_ids: Iterable[int], months: List[Tuple[int, int]]) -> Dict[Tuple[int, int, int], MonthSchedule]:
+    """
+    {(user_id, year, month): MonthSchedule} на подряд идущие months для многих
+    пользователей — только чтение. Дыры заполняются НЕсохранёнными
+    MonthSchedule (pk=None) по тому же правилу наследования, что и
+    materialize_month_schedules. Запросов: расписания окна + последние
+    расписания до окна (+ 'Классика', если у кого-то нет ничего).
+    """
+    user_ids = list(user_ids)
+    if not user_ids or not months:
+        return {}
+    start_serial = months[0][0] * 12 + months[0][1]
+    end_serial = months[-1][0] * 12 + months[-1][1]
+
+    existing = {
+        (schedule.user_id, schedule.year, schedule.month): schedule
+        for schedule in (
+            MonthSchedule.objects.filter(user_id__in=user_ids)
+            .annotate(serial=models.F("year") * 12 + models.F("month"))
+            .filter(serial__gte=start_serial, serial__lte=end_serial)
+            .select_related("pattern")
+        )
+    }
+
+    # у кого первый месяц окна пуст — берём шаблон последнего расписания до окна
+    need_previous = [user_id for user_id in user_ids if (user_id, *months[0]) not in existing]
+    previous = {}
+    if need_previous:
+        latest_before = (
+            MonthSchedule.objects.filter(user=models.OuterRef("user"))
+            .annotate(serial=models.F("year") * 12 + models.F("month"))
+            .filter(serial__lt=start_serial)
+            .order_by("-year", "-month")
+            .values("pk")[:1]
+        )
+        previous = {
+            schedule.user_id: schedule.pattern
+            for schedule in (
+                MonthSchedule.objects.filter(user_id__in=need_previous, pk=models.Subquery(latest_before))
+                .select_related("pattern")
+            )
+        }
+
+    default_pattern = None
+    result = {}
+    for user_id in user_ids:
+        pattern = previous.get(user_id)
+        for year, month in months:
+            schedule = existing.get((user_id, year, month))
+            if schedule is None:
+                if pattern is None:
+                    if default_pattern is None:
+                        default_pattern = MonthSchedule.default_pattern()
+                    pattern = default_pattern
+                schedule = MonthSchedule(user_id=user_id, year=year, month=month, pattern=pattern)
+            pattern = schedule.pattern
+            result[(user_id, year, month)] = schedule
+    return result
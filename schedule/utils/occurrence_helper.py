@@ -0,0 +1,337 @@
+from copy import deepcopy
+from datetime import datetime, timedelta
+from math import lcm
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.timezone import make_aware, make_naive
+from recurrence import DAILY, WEEKLY, MONTHLY
+
+from common.choices import EventDateMode, RecurrenceType
+from common.datetime import ensure_timezone
+from schedule.models import Event, EventInstance
+from schedule.utils.recurrence_cache import get_compiled_recurrence, with_cached_recurrence
+
+
+# ------------------------------------------------------------
+# 🔹 Индекс оверлеев (EventInstance) для окна дат
+# ------------------------------------------------------------
+OverlayIndex = Dict[Tuple[int, datetime], EventInstance]
+
+
+def build_overlay_index(start_dt: datetime, end_dt: datetime, *, user=None,
+                        events: Optional[Iterable] = None) -> OverlayIndex:
+    """
+    Загружает все EventInstance в окне [start_dt, end_dt] ОДНИМ запросом и
+    возвращает словарь {(event_id, instance_datetime): EventInstance}.
+
+    Фильтр — либо по пользователю (user), либо по списку событий (events),
+    можно и то и другое. Aware-datetime сравниваются по моменту времени,
+    поэтому искать в индексе можно значением в любом tz.
+
+    Если на одно вхождение несколько инстансов — берём первый по id
+    (как делал прежний .first()).
+    """
+    qs = EventInstance.objects.filter(
+        instance_datetime__gte=start_dt,
+        instance_datetime__lte=end_dt,
+    )
+    if user is not None:
+        qs = qs.filter(parent_event__user=user)
+    if events is not None:
+        event_ids = [getattr(e, "pk", e) for e in events]
+        if not event_ids:
+            return {}
+        qs = qs.filter(parent_event_id__in=event_ids)
+
+    index: OverlayIndex = {}
+    for instance in qs.order_by("id"):
+        index.setdefault((instance.parent_event_id, instance.instance_datetime), instance)
+    return index
+
+
+# ------------------------------------------------------------
+# 🔹 Разворачивание события во вхождения (общая логика календаря)
+# ------------------------------------------------------------
+def get_recurrence_type(event) -> str:
+    if event.date_mode == EventDateMode.NUMBER_OF_MONTH:
+        if event.is_recurring_monthly:
+            return RecurrenceType.MONTHLY
+        else:
+            return RecurrenceType.SINGLE
+    if event.recurrence:
+        return RecurrenceType.RRULE
+    return RecurrenceType.SINGLE
+
+
+def first_of_month(dt: Optional[datetime], tz) -> Optional[datetime]:
+    """Приводит dt к tz и возвращает 00:00 первого числа его месяца (aware)."""
+    if dt is None:
+        return None
+    aware = ensure_timezone(dt, tz=tz)
+    return aware.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(dt: datetime, months: int) -> datetime:
+    # dt — AWARE и первое число месяца; крутим месяцы и сохраняем tz корректно
+    y = dt.year + (dt.month - 1 + months) // 12
+    m = (dt.month - 1 + months) % 12 + 1
+    return dt.replace(year=y, month=m)
+
+
+def month_serial(dt: datetime) -> int:
+    """Порядковый номер месяца: year * 12 + (month - 1)."""
+    return dt.year * 12 + dt.month - 1
+
+
+def monthly_series_hits(series_start: datetime, series_end: datetime, interval: int,
+                        start_dt: datetime, end_dt: datetime, tz) -> List[datetime]:
+    """
+    Месяцы серии «каждые interval месяцев» (series_start..series_end включительно,
+    оба — первые числа месяцев в tz), попадающие в окно [start_dt, end_dt].
+    Считается арифметикой по номерам месяцев — без прохода от начала серии.
+    """
+    first = month_serial(series_start)
+    last = month_serial(series_end)
+
+    window_first = first_of_month(start_dt, tz)
+    lo = month_serial(window_first) + (1 if window_first < start_dt else 0)
+    hi = min(month_serial(first_of_month(end_dt, tz)), last)
+    if lo < first:
+        lo = first
+    # ближайший месяц серии, не раньше lo
+    lo = first + -(-(lo - first) // interval) * interval
+
+    return [
+        series_start.replace(year=serial // 12, month=serial % 12 + 1)
+        for serial in range(lo, hi + 1, interval)
+    ]
+
+
+# Историческая опора RRULE: все правила считаются от 2010-01-01 00:00 (naive).
+RRULE_ANCHOR = datetime(2010, 1, 1, 0, 0, 0)
+
+
+def skip_ahead_dtstart(recurrence, window_start: datetime, anchor: datetime = RRULE_ANCHOR) -> datetime:
+    """
+    Возвращает dtstart, с которого правило даёт в окне РОВНО те же вхождения,
+    что и от anchor, но без прохода по годам истории.
+
+    Для DAILY/WEEKLY/MONTHLY (с INTERVAL) фаза правила периодична:
+    сдвиг dtstart на целое число периодов её не меняет. Прыгаем на последний
+    такой сдвиг, который ещё на один период раньше окна (запас на неполную
+    первую неделю). Если хоть одно правило не поддаётся (COUNT, другая
+    частота, смесь дневных и месячных периодов) — остаёмся на anchor.
+    Все datetime — naive.
+    """
+    rules = list(recurrence.rrules) + list(recurrence.exrules)
+    if not rules or window_start <= anchor:
+        return anchor
+
+    period_days = 0
+    period_months = 0
+    for rule in rules:
+        if rule.count:
+            # COUNT считается от dtstart — сдвигать нельзя
+            return anchor
+        interval = int(rule.interval or 1)
+        if rule.freq == DAILY:
+            period_days = lcm(period_days or 1, interval)
+        elif rule.freq == WEEKLY:
+            period_days = lcm(period_days or 1, 7 * interval)
+        elif rule.freq == MONTHLY:
+            period_months = lcm(period_months or 1, interval)
+        else:
+            return anchor
+    if period_days and period_months:
+        return anchor
+
+    if period_days:
+        periods = (window_start - anchor).days // period_days - 1
+        if periods <= 0:
+            return anchor
+        return anchor + timedelta(days=periods * period_days)
+
+    months_between = (window_start.year - anchor.year) * 12 + (window_start.month - anchor.month)
+    periods = months_between // period_months - 1
+    if periods <= 0:
+        return anchor
+    months = periods * period_months
+    return anchor.replace(
+        year=anchor.year + (anchor.month - 1 + months) // 12,
+        month=(anchor.month - 1 + months) % 12 + 1,
+    )
+
+
+def expand_event(event, start_dt: datetime, end_dt: datetime, tz=None) -> List[Tuple[datetime, str]]:
+    """
+    Возвращает вхождения события в окне [start_dt, end_dt] как список
+    (aware datetime в tz, recurrence_type) по возрастанию даты.
+
+    Единая логика для календаря (all_events), индекса Occurrence и
+    Event.get_occurrences:
+      • NUMBER_OF_MONTH одиночное — 00:00 первого числа месяца start_datetime;
+      • NUMBER_OF_MONTH повторяемое — каждые month_interval месяцев
+        от месяца start_datetime до месяца end_datetime включительно;
+      • EXACT_DATE без RRULE — сам start_datetime;
+      • RRULE — вхождения правила, но только в месяцах, где событие «живёт»
+        (от месяца start_datetime до end_datetime), как и фильтр календаря.
+    """
+    tz = tz or timezone.get_current_timezone()
+    rtype = get_recurrence_type(event)
+    result: List[Tuple[datetime, str]] = []
+
+    if event.date_mode == EventDateMode.NUMBER_OF_MONTH:
+        # 1) одиночное "за месяц"
+        if rtype == RecurrenceType.SINGLE:
+            anchor = first_of_month(event.start_datetime, tz)
+            if anchor and start_dt <= anchor <= end_dt:
+                result.append((anchor, rtype))
+            return result
+
+        # 2) повторяемое "каждые N месяцев"
+        interval = int(event.month_interval or 1)
+        series_start = first_of_month(event.start_datetime, tz)
+        series_end = first_of_month(event.end_datetime, tz)
+        if not series_start or not series_end:
+            # на валидатор надеемся, но защитимся от битых данных
+            return result
+
+        for current in monthly_series_hits(series_start, series_end, interval, start_dt, end_dt, tz):
+            result.append((current, rtype))
+        return result
+
+    # EXACT_DATE (без RRULE) => одиночное
+    if rtype == RecurrenceType.SINGLE:
+        if event.start_datetime and start_dt <= event.start_datetime <= end_dt:
+            result.append((ensure_timezone(event.start_datetime, tz=tz), rtype))
+        return result
+
+    # EXACT_DATE + RRULE
+    # django-recurrence обычно дружит с naive датами;
+    # правило берём уже разобранным из recurrence_cache
+    start_naive = make_naive(start_dt, tz)
+    compiled = get_compiled_recurrence(event)
+    recurrences = compiled.between(
+        start_naive,
+        make_naive(end_dt, tz),
+        dtstart=skip_ahead_dtstart(compiled.recurrence, start_naive)
+    )
+    live_from = first_of_month(event.start_datetime, tz)
+    live_until = event.end_datetime
+    for recurrence in recurrences:
+        # recurrence приходит naive — делаем его aware
+        occurs_at = ensure_timezone(make_aware(recurrence, tz), tz=tz)
+        if live_from and occurs_at < live_from:
+            continue
+        if live_until and first_of_month(occurs_at, tz) > live_until:
+            continue
+        result.append((occurs_at, rtype))
+    return result
+
+
+# ------------------------------------------------------------
+# 🔹 Лёгкое вхождение события (вместо deepcopy модели)
+# ------------------------------------------------------------
+class EventOccurrence:
+    """
+    Одно вхождение события: ссылка на родителя + то, что у вхождения своё
+    (дата, конец, сумма, статус). Остальные атрибуты (name, user, account…)
+    читаются у родительского Event — для кода, который раньше получал
+    deepcopy модели. Настоящий экземпляр Event даёт as_event().
+    """
+    __slots__ = ("event", "start_datetime", "end_datetime", "amount", "status", "is_completed")
+
+    is_occurrence = True
+    # у копий прежней реализации id сбрасывался — вхождение не строка БД
+    id = None
+    pk = None
+
+    def __init__(self, event, start_datetime, end_datetime=None, amount=None,
+                 status=None, is_completed=False):
+        self.event = event
+        self.start_datetime = start_datetime
+        self.end_datetime = end_datetime
+        self.amount = amount
+        self.status = status
+        self.is_completed = is_completed
+
+    @classmethod
+    def from_event(cls, event, dt: datetime, instance=None) -> "EventOccurrence":
+        """Вхождение event на дату dt; instance (EventInstance) переопределяет статус."""
+        end = dt + timedelta(minutes=event.duration_minutes) if event.duration_minutes else event.end_datetime
+        source = instance or event
+        return cls(event, dt, end, event.amount, source.status, source.is_completed)
+
+    def __getattr__(self, name):
+        # сюда попадаем только для атрибутов, которых нет в слотах;
+        # пустой слот event (copy/pickle создают объект без __init__) — не уходим в рекурсию
+        if name == "event":
+            raise AttributeError(name)
+        return getattr(self.event, name)
+
+    def as_event(self):
+        """Копия Event с полями вхождения (старое поведение get_occurrences)."""
+        copy_obj = deepcopy(self.event)
+        copy_obj.id = None
+        copy_obj.is_occurrence = True
+        for name in self.__slots__[1:]:
+            setattr(copy_obj, name, getattr(self, name))
+        return copy_obj
+
+    def __repr__(self):
+        return f"<EventOccurrence event={self.event.pk} at {self.start_datetime.isoformat()}>"
+
+
+# ------------------------------------------------------------
+# 🔹 Поток вхождений пользователя по диапазону (для пагинации)
+# ------------------------------------------------------------
+Cursor = Tuple[datetime, int]
+
+
+def _is_after(occurs_at: datetime, event_id: int, after: Optional[Cursor]) -> bool:
+    return after is None or (occurs_at, event_id) > after
+
+
+def iter_expanded_occurrences(user, start_dt: datetime, end_dt: datetime, tz=None,
+                              after: Optional[Cursor] = None, first_chunk_days: int = 7):
+    """
+    Лениво отдаёт вхождения событий пользователя в [start_dt, end_dt] как
+    (event, occurs_at, recurrence_type, instance), упорядоченные по
+    (occurs_at, event_id).
+
+    after — позиция курсора (occurs_at, event_id): всё, что не позже неё,
+    пропускается, а разворачивание начинается сразу с occurs_at курсора.
+    Окно разворачивается кусками (7, 14, 28… дней), поэтому страница из
+    начала длинного диапазона не трогает его хвост.
+    """
+    tz = tz or timezone.get_current_timezone()
+    chunk_start = max(start_dt, after[0]) if after else start_dt
+    chunk_days = first_chunk_days
+
+    while chunk_start <= end_dt:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), end_dt)
+
+        # префильтр с запасом до границ месяцев: точную отсечку делает expand_event
+        events = Event.objects.filter(
+            user=user,
+            start_datetime__lt=add_months(first_of_month(chunk_end, tz), 1),
+        ).filter(
+            Q(end_datetime__gte=first_of_month(chunk_start, tz)) | Q(end_datetime__isnull=True)
+        )
+        overlays = build_overlay_index(chunk_start, chunk_end, user=user)
+
+        batch = []
+        for event in with_cached_recurrence(events):
+            for occurs_at, rtype in expand_event(event, chunk_start, chunk_end, tz):
+                if not _is_after(occurs_at, event.id, after):
+                    continue
+                instance = overlays.get((event.id, occurs_at)) if rtype != RecurrenceType.SINGLE else None
+                batch.append((event, occurs_at, rtype, instance))
+
+        batch.sort(key=lambda item: (item[1], item[0].id))
+        yield from batch
+
+        chunk_start = chunk_end + timedelta(microseconds=1)
+        chunk_days *= 2
@@ -0,0 +1,209 @@
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from common.choices import RecurrenceType
+from schedule.models import Event, EventInstance, Occurrence, OccurrenceHorizon
+from common.datetime import ensure_timezone
+from schedule.utils.occurrence_helper import (
+    Cursor, add_months, build_overlay_index, expand_event, first_of_month,
+)
+from schedule.utils.recurrence_cache import with_cached_recurrence
+
+
+# ------------------------------------------------------------
+# 🔹 Горизонт индекса
+# ------------------------------------------------------------
+def default_horizon(months_back=None, months_ahead=None, today=None, tz=None) -> Tuple[datetime, datetime]:
+    """
+    Скользящее окно индекса: months_back месяцев назад и months_ahead вперёд
+    от текущего месяца (по умолчанию — SCHEDULE_OCCURRENCE_HISTORY_MONTHS /
+    SCHEDULE_OCCURRENCE_HORIZON_MONTHS). Возвращает (starts_at, ends_at) —
+    aware, ends_at включительно.
+    """
+    tz = tz or timezone.get_current_timezone()
+    today = today or timezone.localdate()
+    if months_back is None:
+        months_back = getattr(settings, "SCHEDULE_OCCURRENCE_HISTORY_MONTHS", 12)
+    if months_ahead is None:
+        months_ahead = getattr(settings, "SCHEDULE_OCCURRENCE_HORIZON_MONTHS", 12)
+
+    this_month = first_of_month(datetime(today.year, today.month, 1), tz)
+    starts_at = add_months(this_month, -int(months_back))
+    ends_at = add_months(this_month, int(months_ahead) + 1) - timedelta(seconds=1)
+    return starts_at, ends_at
+
+
+def get_horizon() -> Optional[OccurrenceHorizon]:
+    """Текущий горизонт индекса или None, если индекс ещё не строился."""
+    return OccurrenceHorizon.objects.order_by("-built_at").first()
+
+
+def get_covering_horizon(start_dt, end_dt) -> Optional[OccurrenceHorizon]:
+    """Горизонт, если он целиком покрывает [start_dt, end_dt], иначе None."""
+    horizon = get_horizon()
+    if horizon is not None and horizon.covers(start_dt, end_dt):
+        return horizon
+    return None
+
+
+# ------------------------------------------------------------
+# 🔹 Чтение индекса
+# ------------------------------------------------------------
+def iter_indexed_occurrences(user, start_dt, end_dt, after: Optional[Cursor] = None, chunk_size=500):
+    """
+    То же, что occurrence_helper.iter_expanded_occurrences, но из индекса:
+    keyset-выборка по (occurs_at, event_id) после курсора after.
+    """
+    tz = timezone.get_current_timezone()
+    qs = Occurrence.objects.filter(user=user, occurs_at__gte=start_dt, occurs_at__lte=end_dt)
+    if after is not None:
+        qs = qs.filter(Q(occurs_at__gt=after[0]) | Q(occurs_at=after[0], event_id__gt=after[1]))
+    qs = qs.select_related("event", "instance").order_by("occurs_at", "event_id")
+    for row in qs.iterator(chunk_size=chunk_size):
+        instance = row.instance if row.recurrence_type != RecurrenceType.SINGLE else None
+        yield row.event, ensure_timezone(row.occurs_at, tz=tz), row.recurrence_type, instance
+
+
+# ------------------------------------------------------------
+# 🔹 Построение строк индекса
+# ------------------------------------------------------------
+def _build_rows(event, starts_at, ends_at, overlays, tz):
+    rows = []
+    for occurs_at, rtype in expand_event(event, starts_at, ends_at, tz):
+        # оверлеи применяются только к повторяемым вхождениям (как в календаре)
+        instance = overlays.get((event.id, occurs_at)) if rtype != RecurrenceType.SINGLE else None
+        rows.append(Occurrence(
+            event=event,
+            user_id=event.user_id,
+            occurs_at=occurs_at,
+            recurrence_type=rtype,
+            status=instance.status if instance else event.status,
+            amount=event.amount,
+            instance=instance,
+        ))
+    return rows
+
+
+@transaction.atomic
+def rebuild_event_occurrences(event, horizon: Optional[OccurrenceHorizon] = None) -> int:
+    """
+    Пересобирает вхождения одного события в пределах горизонта.
+    Если индекс ещё не строился — ничего не делает (читатели откатятся
+    на разворачивание «на лету»). Возвращает число созданных строк.
+    """
+    horizon = horizon or get_horizon()
+    if horizon is None:
+        return 0
+
+    tz = timezone.get_current_timezone()
+    Occurrence.objects.filter(event_id=event.pk).delete()
+    overlays = build_overlay_index(horizon.starts_at, horizon.ends_at, events=[event])
+    rows = _build_rows(event, horizon.starts_at, horizon.ends_at, overlays, tz)
+    Occurrence.objects.bulk_create(rows)
+    return len(rows)
+
+
+def _fill_window(events, starts_at, ends_at, overlays, tz, batch_size) -> int:
+    total = 0
+    rows = []
+    for event in with_cached_recurrence(events, chunk_size=batch_size):
+        rows.extend(_build_rows(event, starts_at, ends_at, overlays, tz))
+        if len(rows) >= batch_size:
+            Occurrence.objects.bulk_create(rows)
+            total += len(rows)
+            rows = []
+    if rows:
+        Occurrence.objects.bulk_create(rows)
+        total += len(rows)
+    return total
+
+
+def _save_horizon(horizon, starts_at, ends_at) -> OccurrenceHorizon:
+    horizon = horizon or OccurrenceHorizon()
+    horizon.starts_at = starts_at
+    horizon.ends_at = ends_at
+    horizon.save()
+    return horizon
+
+
+@transaction.atomic
+def rebuild_occurrence_index(starts_at=None, ends_at=None, batch_size=500) -> Tuple[OccurrenceHorizon, int]:
+    """
+    Полная пересборка индекса на окно [starts_at, ends_at]
+    (по умолчанию — default_horizon()) и сдвиг горизонта.
+    Возвращает (horizon, число созданных строк).
+    """
+    tz = timezone.get_current_timezone()
+    if starts_at is None or ends_at is None:
+        starts_at, ends_at = default_horizon(tz=tz)
+
+    Occurrence.objects.all().delete()
+    overlays = build_overlay_index(starts_at, ends_at)
+    total = _fill_window(Event.objects.all(), starts_at, ends_at, overlays, tz, batch_size)
+    return _save_horizon(get_horizon(), starts_at, ends_at), total
+
+
+@transaction.atomic
+def extend_occurrence_index(starts_at=None, ends_at=None, batch_size=500) -> Tuple[OccurrenceHorizon, int]:
+    """
+    Сдвигает горизонт без полной пересборки: удаляет строки вне нового окна
+    и достраивает только недостающие края. Если индекса ещё нет —
+    делает полную пересборку.
+    """
+    tz = timezone.get_current_timezone()
+    if starts_at is None or ends_at is None:
+        starts_at, ends_at = default_horizon(tz=tz)
+
+    horizon = get_horizon()
+    if horizon is None or ends_at < horizon.starts_at or starts_at > horizon.ends_at:
+        # окна не пересекаются — достраивать нечего, проще собрать заново
+        return rebuild_occurrence_index(starts_at, ends_at, batch_size=batch_size)
+
+    Occurrence.objects.filter(occurs_at__lt=starts_at).delete()
+    Occurrence.objects.filter(occurs_at__gt=ends_at).delete()
+
+    gaps = []
+    if starts_at < horizon.starts_at:
+        gaps.append((starts_at, horizon.starts_at - timedelta(microseconds=1)))
+    if ends_at > horizon.ends_at:
+        gaps.append((horizon.ends_at + timedelta(microseconds=1), ends_at))
+
+    total = 0
+    for gap_start, gap_end in gaps:
+        overlays = build_overlay_index(gap_start, gap_end)
+        total += _fill_window(Event.objects.all(), gap_start, gap_end, overlays, tz, batch_size)
+    return _save_horizon(horizon, starts_at, ends_at), total
+
+
+# ------------------------------------------------------------
+# 🔹 Точечные патчи от EventInstance
+# ------------------------------------------------------------
+def patch_instance_occurrence(instance: EventInstance) -> int:
+    """Переносит статус оверлея на строку индекса (если такая есть)."""
+    return Occurrence.objects.filter(
+        event_id=instance.parent_event_id,
+        occurs_at=instance.instance_datetime,
+    ).exclude(recurrence_type=RecurrenceType.SINGLE).update(status=instance.status, instance=instance)
+
+
+def unpatch_instance_occurrence(instance: EventInstance, event_id: Optional[int] = None,
+                                occurs_at: Optional[datetime] = None) -> int:
+    """
+    После удаления оверлея возвращает строке индекса статус самого события.
+    event_id/occurs_at — прежнее место оверлея, если его перенесли на другую
+    дату (по умолчанию — текущее).
+    """
+    event_id = event_id or instance.parent_event_id
+    event_status = Event.objects.filter(pk=event_id).values_list("status", flat=True).first()
+    if event_status is None:
+        # событие удаляется каскадом — его строки уйдут вместе с ним
+        return 0
+    return Occurrence.objects.filter(
+        event_id=event_id,
+        occurs_at=occurs_at or instance.instance_datetime,
+    ).exclude(recurrence_type=RecurrenceType.SINGLE).update(status=event_status, instance=None)
@@ -0,0 +1,500 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple, TypeVar
+import calendar
+
+from django.conf import settings
+
+from schedule.models import PatternMode
+
+
+T = TypeVar("T")
+
+WEEKDAY_KEYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+OFF = "off"
+
+
+# ------------------------------------------------------------
+# 🔹 Скомпилированный шаблон: таблица цикла + модульная арифметика
+# ------------------------------------------------------------
+class CompiledPattern:
+    """
+    SchedulePattern, развёрнутый в таблицу одного цикла:
+      • WEEKDAY — 7 меток (пн..вс), тип дня = table[d.weekday()];
+      • ALTERNATING — метки одного цикла pattern_after_start (work, off, work…),
+        перед циклом — lead_off выходных (days_off_at_start).
+
+    Для ALTERNATING есть «начало отсчёта» (origin): по умолчанию — первое
+    число месяца (цикл перезапускается каждый месяц, как раньше); если у
+    шаблона задан phase_anchor — эта дата, и фаза идёт сквозь месяцы.
+    Тип любой даты — O(1), подсчёт типов за период — O(длина цикла).
+    """
+    __slots__ = ("mode", "table", "lead_off", "anchor", "_prefix")
+
+    def __init__(self, mode: str, table: Tuple[str, ...], lead_off: int = 0, anchor: Optional[date] = None):
+        self.mode = mode
+        self.table = table
+        self.lead_off = lead_off
+        self.anchor = anchor
+        # _prefix[label][k] — сколько раз label встречается в table[:k]
+        self._prefix: Dict[str, List[int]] = {}
+        for label in set(table):
+            running = [0]
+            for item in table:
+                running.append(running[-1] + (item == label))
+            self._prefix[label] = running
+
+    @property
+    def cycle_length(self) -> int:
+        return len(self.table)
+
+    @property
+    def is_continuous(self) -> bool:
+        return self.mode == PatternMode.ALTERNATING and self.anchor is not None
+
+    def origin_for(self, d: date) -> date:
+        """Дата, от которой считается цикл для дня d."""
+        if self.anchor is not None:
+            return self.anchor
+        return d.replace(day=1)
+
+    # --- один день ---
+    def _type_at(self, offset: int) -> str:
+        """Тип дня с номером offset от начала отсчёта (offset может быть < 0)."""
+        if 0 <= offset < self.lead_off:
+            return OFF
+        return self.table[(offset - self.lead_off) % len(self.table)]
+
+    def cycle_position(self, d: date, origin: Optional[date] = None) -> Optional[int]:
+        """Позиция d в цикле (0 — первый день цикла) или None для стартовых выходных."""
+        if self.mode == PatternMode.WEEKDAY:
+            return d.weekday()
+        offset = (d - (origin or self.origin_for(d))).days
+        if 0 <= offset < self.lead_off:
+            return None
+        return (offset - self.lead_off) % len(self.table)
+
+    def day_type(self, d: date, origin: Optional[date] = None) -> str:
+        if self.mode == PatternMode.WEEKDAY:
+            return self.table[d.weekday()]
+        return self._type_at((d - (origin or self.origin_for(d))).days)
+
+    # --- диапазоны ---
+    def day_types(self, start_date: date, days: int, origin: Optional[date] = None) -> List[str]:
+        """
+        Метки days дней подряд с start_date. Без origin/anchor цикл стартует
+        в start_date (поведение generate_day_types при прямом вызове).
+        """
+        if days <= 0:
+            return []
+        if self.mode == PatternMode.WEEKDAY:
+            first = start_date.weekday()
+            return [self.table[(first + i) % 7] for i in range(days)]
+        base = (start_date - (origin or self.anchor or start_date)).days
+        return [self._type_at(base + i) for i in range(days)]
+
+    def month_day_types(self, year: int, month: int) -> List[str]:
+        start = date(year, month, 1)
+        return self.day_types(start, calendar.monthrange(year, month)[1], origin=self.origin_for(start))
+
+    # --- битовые маски ---
+    def masks(self, start_date: date, days: int, origin: Optional[date] = None) -> Dict[str, int]:
+        """
+        {label: маска}, бит i — день start_date + i. Маска цикла поворачивается
+        на фазу start_date и размножается сдвигами (удвоением), без обхода дней.
+        """
+        if days <= 0:
+            return {}
+        if self.mode == PatternMode.WEEKDAY:
+            base = 0
+            phase = start_date.weekday()
+        else:
+            base = (start_date - (origin or self.anchor or start_date)).days
+            phase = (base - self.lead_off) % len(self.table)
+
+        period = len(self.table)
+        period_bits = (1 << period) - 1
+        month_bits = (1 << days) - 1
+        result: Dict[str, int] = {}
+        for label in set(self.table):
+            cycle = 0
+            for i, item in enumerate(self.table):
+                if item == label:
+                    cycle |= 1 << i
+            tiled = ((cycle >> phase) | (cycle << (period - phase))) & period_bits
+            width = period
+            while width < days:
+                tiled |= tiled << width
+                width *= 2
+            result[label] = tiled & month_bits
+
+        # стартовые выходные: номера дней [0, lead_off) от начала отсчёта
+        if self.mode == PatternMode.ALTERNATING and self.lead_off:
+            lo = max(0, -base)
+            hi = min(days, self.lead_off - base)
+            if hi > lo:
+                lead = ((1 << (hi - lo)) - 1) << lo
+                for label in result:
+                    result[label] &= ~lead
+                result[OFF] = result.get(OFF, 0) | lead
+        return result
+
+    def month_masks(self, year: int, month: int) -> "MonthMasks":
+        start = date(year, month, 1)
+        days = calendar.monthrange(year, month)[1]
+        return MonthMasks(year, month, days, self.masks(start, days, origin=self.origin_for(start)))
+
+    def _count_cycle(self, label: str, position: int, days: int) -> int:
+        """Сколько раз label встречается в days днях цикла начиная с позиции position."""
+        prefix = self._prefix.get(label)
+        if prefix is None or days <= 0:
+            return 0
+        length = len(self.table)
+        full, rest = divmod(days, length)
+        total = full * prefix[length]
+        end = position + rest
+        if end <= length:
+            total += prefix[end] - prefix[position]
+        else:
+            total += prefix[length] - prefix[position] + prefix[end - length]
+        return total
+
+    def _count_run(self, label: str, start_offset: int, days: int) -> int:
+        """Подсчёт label на отрезке [start_offset, start_offset + days) от начала отсчёта."""
+        if days <= 0:
+            return 0
+        if self.mode == PatternMode.WEEKDAY:
+            return self._count_cycle(label, start_offset % 7, days)
+        count = 0
+        # кусок, попадающий в стартовые выходные
+        lead_from = max(start_offset, 0)
+        lead_to = min(start_offset + days, self.lead_off)
+        if lead_to > lead_from:
+            if label == OFF:
+                count += lead_to - lead_from
+        # всё остальное — цикл (до origin цикл тоже продолжается «назад»)
+        before = min(days, max(0, -start_offset))
+        if before:
+            count += self._count_cycle(label, (start_offset - self.lead_off) % len(self.table), before)
+        after_from = max(start_offset, self.lead_off)
+        after_days = start_offset + days - after_from
+        if after_days > 0:
+            count += self._count_cycle(label, (after_from - self.lead_off) % len(self.table), after_days)
+        return count
+
+    def count_types(self, start_date: date, end_date: date) -> Dict[str, int]:
+        """
+        {label: число дней} за [start_date, end_date] включительно, без
+        построения списка дней. Без phase_anchor — по месяцам (в каждом
+        месяце цикл с первого числа), с anchor или для WEEKDAY — одним отрезком.
+        """
+        counts = {label: 0 for label in set(self.table) | {OFF}}
+        if end_date < start_date:
+            return counts
+
+        if self.mode == PatternMode.WEEKDAY:
+            spans = [(start_date.weekday(), (end_date - start_date).days + 1)]
+        elif self.anchor is not None:
+            spans = [((start_date - self.anchor).days, (end_date - start_date).days + 1)]
+        else:
+            spans = []
+            current = start_date
+            while current <= end_date:
+                month_end = current.replace(day=calendar.monthrange(current.year, current.month)[1])
+                last = min(month_end, end_date)
+                spans.append((current.day - 1, (last - current).days + 1))
+                current = last + timedelta(days=1)
+
+        for label in counts:
+            counts[label] = sum(self._count_run(label, offset, days) for offset, days in spans)
+        return counts
+
+
+# ------------------------------------------------------------
+# 🔹 Месяц как набор битовых масок
+# ------------------------------------------------------------
+class MonthMasks:
+    """
+    Разметка месяца: одна маска на тип дня, бит (day - 1) — число месяца.
+    Неизменяемая: with_overrides() возвращает новый объект. Подсчёты —
+    popcount, пересечения между людьми — побитовое И.
+    """
+    __slots__ = ("year", "month", "days", "masks")
+
+    def __init__(self, year: int, month: int, days: int, masks: Dict[str, int]):
+        self.year = year
+        self.month = month
+        self.days = days
+        self.masks = {label: mask for label, mask in masks.items() if mask}
+
+    def mask(self, label: str) -> int:
+        return self.masks.get(label, 0)
+
+    def count(self, label: str) -> int:
+        return self.mask(label).bit_count()
+
+    def counts(self) -> Dict[str, int]:
+        return {label: mask.bit_count() for label, mask in self.masks.items()}
+
+    def label_at(self, day: int) -> Optional[str]:
+        bit = 1 << (day - 1)
+        for label, mask in self.masks.items():
+            if mask & bit:
+                return label
+        return None
+
+    def labels(self) -> List[Optional[str]]:
+        """Метки по дням — только для сериализации."""
+        return [self.label_at(day) for day in range(1, self.days + 1)]
+
+    def with_overrides(self, overrides: Dict[int, str]) -> "MonthMasks":
+        """overrides: {число месяца: тип} — переносит бит дня в маску нового типа."""
+        if not overrides:
+            return self
+        moved = 0
+        for day in overrides:
+            moved |= 1 << (day - 1)
+        masks = {label: mask & ~moved for label, mask in self.masks.items()}
+        for day, label in overrides.items():
+            masks[label] = masks.get(label, 0) | (1 << (day - 1))
+        return MonthMasks(self.year, self.month, self.days, masks)
+
+
+def month_overrides(pairs: Iterable[Tuple[date, T]], year: int, month: int) -> Dict[int, T]:
+    """
+    (дата исключения, значение) → {число месяца: значение} только для дат
+    самого year/month: DayOverride не проверяет, что date лежит в месяце
+    своего MonthSchedule, и чужой месяц не должен задеть тот же номер дня.
+    """
+    return {day.day: value for day, value in pairs if day.year == year and day.month == month}
+
+
+def days_of_mask(mask: int) -> List[int]:
+    """Числа месяца, чьи биты выставлены в mask."""
+    days = []
+    while mask:
+        low = mask & -mask
+        days.append(low.bit_length())
+        mask ^= low
+    return days
+
+
+def intersect_label(month_masks: List[MonthMasks], label: str) -> int:
+    """Маска дней, где у ВСЕХ label (например, «оба работают»)."""
+    if not month_masks:
+        return 0
+    result = month_masks[0].mask(label)
+    for item in month_masks[1:]:
+        result &= item.mask(label)
+    return result
+
+
+# ------------------------------------------------------------
+# 🔹 Компиляция SchedulePattern
+# ------------------------------------------------------------
+def compile_pattern(pattern) -> CompiledPattern:
+    """
+    Проверяет шаблон и строит CompiledPattern. Ошибки — ValueError с тем же
+    текстом, что и у прежнего построчного генератора.
+    """
+    if pattern.mode == PatternMode.WEEKDAY:
+        weekday_map = getattr(pattern, "weekday_map", None)
+        if not weekday_map:
+            raise ValueError(
+                "SchedulePattern.weekday_map пуст для режима WEEKDAY — заполните карту дней недели."
+            )
+        missing = set(WEEKDAY_KEYS).difference(set(weekday_map.keys()))
+        if missing:
+            raise ValueError(f"В weekday_map отсутствуют ключи: {', '.join(sorted(missing))}.")
+        for key in WEEKDAY_KEYS:
+            if weekday_map.get(key) is None:
+                raise ValueError(f"В weekday_map отсутствует ключ '{key}' для режима WEEKDAY.")
+        return CompiledPattern(PatternMode.WEEKDAY, tuple(weekday_map[key] for key in WEEKDAY_KEYS))
+
+    pattern_list = pattern.pattern_after_start or []
+    if not pattern_list:
+        raise ValueError(
+            "pattern_after_start пуст для режима ALTERNATING. "
+            "Заполните список (например, [2,2] или [5,2,2])."
+        )
+
+    table: List[str] = []
+    is_work_block = True  # стартуем с рабочих после начальных выходных
+    for block_index, raw_value in enumerate(pattern_list):
+        try:
+            block_len = int(raw_value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Элемент pattern_after_start[{block_index}] = {raw_value!r} не число.")
+        if block_len <= 0:
+            raise ValueError(f"Длина блока должна быть > 0 (ошибка в позиции {block_index + 1}).")
+        table.extend(["work" if is_work_block else OFF] * block_len)
+        is_work_block = not is_work_block
+
+    # нечётное число блоков: следующий проход по списку начинается с «выходного» блока,
+    # поэтому полный цикл — два прохода
+    if len(pattern_list) % 2:
+        table.extend("work" if label == OFF else OFF for label in list(table))
+
+    return CompiledPattern(
+        PatternMode.ALTERNATING,
+        tuple(table),
+        lead_off=int(getattr(pattern, "days_off_at_start", 0) or 0),
+        anchor=getattr(pattern, "phase_anchor", None),
+    )
+
+
+# ------------------------------------------------------------
+# 🔹 LRU-мемо по версии шаблона и месяцу
+# ------------------------------------------------------------
+def pattern_fingerprint(pattern) -> str:
+    """Хэш полей, от которых зависит разметка дней (а не pk/name)."""
+    anchor = getattr(pattern, "phase_anchor", None)
+    raw = json.dumps([
+        pattern.mode,
+        getattr(pattern, "weekday_map", None),
+        int(getattr(pattern, "days_off_at_start", 0) or 0),
+        list(pattern.pattern_after_start or []),
+        anchor.isoformat() if anchor else None,
+    ], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class DayTypesMemo:
+    """
+    Ограниченный LRU: (namespace, fingerprint, year, month) → результат
+    (кортежи, чтобы вызывающий не испортил закэшированное).
+    Ключ — хэш содержимого шаблона, поэтому правка шаблона сама даёт новый
+    ключ; сигнал на SchedulePattern (forget_pattern) дополнительно сразу
+    выкидывает записи старой версии. Хранится в памяти процесса.
+
+    Ограничено всё: скомпилированные шаблоны — тот же LRU на maxsize, а
+    pk → fingerprint помнит только последнюю версию шаблона (появилась
+    новая — записи старой выкидываются сразу), так что память не растёт
+    с каждой правкой шаблона.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._compiled = OrderedDict()  # fingerprint → CompiledPattern (LRU)
+        self._by_pattern = {}           # pattern pk → fingerprint последней версии
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(maxsize=getattr(settings, "SCHEDULE_DAY_TYPES_MEMO_SIZE", 1024))
+
+    def _drop(self, fingerprints):
+        # вызывается под self._lock
+        for fingerprint in fingerprints:
+            self._compiled.pop(fingerprint, None)
+        for key in [key for key in self._entries if key[1] in fingerprints]:
+            del self._entries[key]
+
+    def _remember(self, pattern, fingerprint):
+        # вызывается под self._lock
+        pk = getattr(pattern, "pk", None)
+        if pk is None:
+            return
+        previous = self._by_pattern.get(pk)
+        if previous != fingerprint:
+            self._by_pattern[pk] = fingerprint
+            if previous is not None:
+                self._drop({previous})
+
+    def compiled(self, pattern) -> CompiledPattern:
+        fingerprint = pattern_fingerprint(pattern)
+        with self._lock:
+            compiled = self._compiled.get(fingerprint)
+            if compiled is not None:
+                self._compiled.move_to_end(fingerprint)
+        if compiled is None:
+            compiled = compile_pattern(pattern)
+            with self._lock:
+                self._compiled[fingerprint] = compiled
+                self._remember(pattern, fingerprint)
+                while len(self._compiled) > self.maxsize:
+                    self._compiled.popitem(last=False)
+        return compiled
+
+    def get_or_compute(self, namespace: str, pattern, year: int, month: int, compute):
+        """compute(compiled) вызывается только при промахе; ValueError не кэшируется."""
+        fingerprint = pattern_fingerprint(pattern)
+        key = (namespace, fingerprint, year, month)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = compute(self.compiled(pattern))
+        with self._lock:
+            self._entries[key] = value
+            self._remember(pattern, fingerprint)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def forget_pattern(self, pattern_id):
+        with self._lock:
+            fingerprint = self._by_pattern.pop(pattern_id, None)
+            if fingerprint is not None:
+                self._drop({fingerprint})
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._compiled.clear()
+            self._by_pattern.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "patterns": len(self._compiled),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+day_types_memo = DayTypesMemo.from_settings()
+
+
+def month_day_types(pattern, year: int, month: int) -> Tuple[str, ...]:
+    """Метки дней месяца по шаблону — через day_types_memo."""
+    return day_types_memo.get_or_compute(
+        "days", pattern, year, month,
+        lambda compiled: tuple(compiled.month_day_types(year, month)),
+    )
+
+
+def month_masks(pattern, year: int, month: int) -> MonthMasks:
+    """Разметка месяца битовыми масками — через day_types_memo."""
+    return day_types_memo.get_or_compute(
+        "masks", pattern, year, month,
+        lambda compiled: compiled.month_masks(year, month),
+    )
+
+
+def pattern_hours_per_day(pattern) -> float:
+    """Часы на рабочий день: берём из pattern, иначе дефолт 8."""
+    hours_per_day = None
+    if pattern and hasattr(pattern, "working_day_duration"):
+        try:
+            # working_day_duration может быть Decimal/None — приводим к float/int
+            hours_per_day = float(pattern.working_day_duration) if pattern.working_day_duration is not None else None
+        except (TypeError, ValueError):
+            hours_per_day = None
+    if hours_per_day is None:
+        hours_per_day = 8.0
+    return hours_per_day
@@ -0,0 +1,186 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import TextField
+from django.db.models.functions import Cast
+
+from schedule.models import Event
+
+
+# ------------------------------------------------------------
+# 🔹 Скомпилированное правило события
+# ------------------------------------------------------------
+class CompiledRecurrence:
+    """
+    Разобранный RecurrenceField + собранные dateutil-rruleset'ы по dtstart
+    (последние max_rulesets). Повторный between() на том же dtstart
+    (тот же месяц) не пересобирает правило.
+
+    Встроенный кэш django-recurrence (cache=True) не используем: он не
+    ограничен и кладёт в Recurrence объекты с lock'ами, а Event с таким
+    правилом потом не проходит deepcopy в get_occurrences.
+    """
+    max_rulesets = 16
+
+    def __init__(self, recurrence):
+        self.recurrence = recurrence
+        self._rulesets = OrderedDict()
+
+    def rruleset(self, dtstart: datetime):
+        ruleset = self._rulesets.get(dtstart)
+        if ruleset is None:
+            ruleset = self.recurrence.to_dateutil_rruleset(dtstart)
+            self._rulesets[dtstart] = ruleset
+            if len(self._rulesets) > self.max_rulesets:
+                self._rulesets.popitem(last=False)
+        else:
+            self._rulesets.move_to_end(dtstart)
+        return ruleset
+
+    def between(self, after: datetime, before: datetime, dtstart: datetime):
+        return self.rruleset(dtstart).between(after, before, inc=True)
+
+
+# ------------------------------------------------------------
+# 🔹 LRU-кэш по версии события (event_id, updated_at)
+# ------------------------------------------------------------
+class RecurrenceCache:
+    """
+    Локальный (на процесс) LRU скомпилированных правил + необязательный
+    общий уровень в Django cache (SCHEDULE_RECURRENCE_SHARED_CACHE — алиас
+    из CACHES). Версия события — updated_at: после сохранения Event ключ
+    меняется, и старая запись просто не совпадает.
+    """
+
+    def __init__(self, maxsize: int = 2048, shared_alias: Optional[str] = None, shared_timeout: int = 24 * 3600):
+        self.maxsize = maxsize
+        self.shared_alias = shared_alias
+        self.shared_timeout = shared_timeout
+        self._entries = OrderedDict()  # event_id -> (version, CompiledRecurrence)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            maxsize=getattr(settings, "SCHEDULE_RECURRENCE_CACHE_SIZE", 2048),
+            shared_alias=getattr(settings, "SCHEDULE_RECURRENCE_SHARED_CACHE", None),
+        )
+
+    @staticmethod
+    def _version(updated_at) -> str:
+        return updated_at.isoformat() if updated_at else ""
+
+    def _shared_key(self, event_id, version) -> str:
+        return f"schedule:recurrence:{event_id}:{version}"
+
+    def get(self, event_id, updated_at, loader) -> CompiledRecurrence:
+        """Скомпилированное правило для версии события; loader() → Recurrence при промахе."""
+        version = self._version(updated_at)
+        with self._lock:
+            entry = self._entries.get(event_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(event_id)
+                self.hits += 1
+                return entry[1]
+
+        recurrence = None
+        shared = caches[self.shared_alias] if self.shared_alias else None
+        if shared is not None:
+            recurrence = shared.get(self._shared_key(event_id, version))
+
+        with self._lock:
+            if recurrence is not None:
+                self.shared_hits += 1
+            else:
+                self.misses += 1
+
+        if recurrence is None:
+            recurrence = loader()
+            if shared is not None:
+                shared.set(self._shared_key(event_id, version), recurrence, self.shared_timeout)
+
+        compiled = CompiledRecurrence(recurrence)
+        with self._lock:
+            self._entries[event_id] = (version, compiled)
+            self._entries.move_to_end(event_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return compiled
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.shared_hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round((self.hits + self.shared_hits) / lookups, 4) if lookups else None,
+                "shared_tier": self.shared_alias,
+            }
+
+
+recurrence_cache = RecurrenceCache.from_settings()
+
+
+# ------------------------------------------------------------
+# 🔹 Загрузка событий без разбора RecurrenceField
+# ------------------------------------------------------------
+def with_cached_recurrence(queryset, chunk_size: Optional[int] = None):
+    """
+    Итерирует события queryset'а, не разбирая RecurrenceField на каждой строке:
+    поле откладывается (defer), сырой текст приходит аннотацией, а разобранное
+    правило берётся из recurrence_cache и подставляется в event.recurrence.
+    chunk_size — читать потоково через .iterator().
+    """
+    queryset = queryset.defer("recurrence").annotate(recurrence_text=Cast("recurrence", TextField()))
+    rows = queryset.iterator(chunk_size=chunk_size) if chunk_size else queryset
+    for event in rows:
+        get_compiled_recurrence(event)
+        yield event
+
+
+def get_compiled_recurrence(event) -> Optional[CompiledRecurrence]:
+    """
+    CompiledRecurrence события или None, если RRULE нет.
+    Работает и с обычным экземпляром, и с загруженным через with_cached_recurrence
+    (тогда же заполняет event.recurrence).
+    """
+    field = Event._meta.get_field("recurrence")
+    loaded = field.attname in event.__dict__
+    if loaded:
+        if not event.recurrence:
+            return None
+        raw_text = None
+    else:
+        raw_text = getattr(event, "recurrence_text", None)
+        if not raw_text:
+            event.recurrence = None
+            return None
+
+    if event.pk is None:
+        return CompiledRecurrence(event.recurrence)
+
+    def _load():
+        return event.recurrence if loaded else field.to_python(raw_text)
+
+    compiled = recurrence_cache.get(event.pk, event.updated_at, _load)
+    if not loaded:
+        event.recurrence = compiled.recurrence
+    return compiled
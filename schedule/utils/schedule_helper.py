@@ -1,17 +1,9 @@
-from datetime import date, timedelta
+from datetime import date
 from typing import List, Tuple
 import calendar
 
 from schedule.models import PatternMode
-
-
-# ------------------------------------------------------------
-# 🔹 Вспомогательная функция для получения ключа дня недели
-# ------------------------------------------------------------
-def _weekday_key(d) -> str:
-    """Возвращает ключ 'mon'..'sun' по числу weekday(), без зависимости от локали."""
-    keys = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
-    return keys[d.weekday()]
+from schedule.utils.pattern_engine import day_types_memo, month_day_types
 
 
 # ------------------------------------------------------------
@@ -21,71 +13,20 @@ def _generate_day_types_core(start_date: date, days_in_month: int, pattern) -> L
     """
     Возвращает список типов дней ('work', 'off', ...) длиной days_in_month.
     Используется обеими обёртками: для schedule и для прямого вызова.
+    Считается по таблице цикла (utils/pattern_engine.py): цикл ALTERNATING
+    стартует в start_date, а если у шаблона задан phase_anchor — от него.
+    Целые месяцы мемоизируются (day_types_memo).
     """
     if days_in_month <= 0:
         return []
+    if _is_whole_month(start_date, days_in_month):
+        # целый месяц — из LRU-мемо по версии шаблона
+        return list(month_day_types(pattern, start_date.year, start_date.month))
+    return day_types_memo.compiled(pattern).day_types(start_date, days_in_month)
 
-    # === Ветка 1: режим WEEKDAY ==============================================
-    if pattern.mode == PatternMode.WEEKDAY:
-        weekday_map = getattr(pattern, "weekday_map", None)
-        if not weekday_map:
-            raise ValueError(
-                "SchedulePattern.weekday_map пуст для режима WEEKDAY — заполните карту дней недели."
-            )
-
-        required_keys = {"mon", "tue", "wed", "thu", "fri", "sat", "sun"}
-        missing = required_keys.difference(set(weekday_map.keys()))
-        if missing:
-            raise ValueError(f"В weekday_map отсутствуют ключи: {', '.join(sorted(missing))}.")
-
-        result: List[str] = []
-        for i in range(days_in_month):
-            day_date = start_date + timedelta(days=i)
-            key = _weekday_key(day_date)
-            day_type = weekday_map.get(key)
-            if day_type is None:
-                raise ValueError(f"В weekday_map отсутствует ключ '{key}' для режима WEEKDAY.")
-            result.append(day_type)
-        return result
-
-    # === Ветка 2: режим ALTERNATING ==========================================
-    pattern_list = pattern.pattern_after_start or []
-    if not pattern_list:
-        raise ValueError(
-            "pattern_after_start пуст для режима ALTERNATING. "
-            "Заполните список (например, [2,2] или [5,2,2])."
-        )
-
-    result: List[str] = []
-
-    # 1) Блок выходных в начале
-    days_off_at_start = getattr(pattern, "days_off_at_start", 0) or 0
-    for _ in range(min(days_off_at_start, days_in_month)):
-        result.append("off")
-
-    # 2) Основной цикл блоков (чередование work/off)
-    block_index = 0
-    is_work_block = True  # стартуем с рабочих после начальных выходных
-
-    while len(result) < days_in_month:
-        raw_value = pattern_list[block_index]
-        try:
-            block_len = int(raw_value)
-        except (TypeError, ValueError):
-            raise ValueError(f"Элемент pattern_after_start[{block_index}] = {raw_value!r} не число.")
-        if block_len <= 0:
-            raise ValueError(f"Длина блока должна быть > 0 (ошибка в позиции {block_index + 1}).")
-
-        label = "work" if is_work_block else "off"
-        for _ in range(block_len):
-            if len(result) >= days_in_month:
-                break
-            result.append(label)
 
-        is_work_block = not is_work_block
-        block_index = (block_index + 1) % len(pattern_list)
-
-    return result
+def _is_whole_month(start_date: date, days_in_month: int) -> bool:
+    return start_date.day == 1 and days_in_month == calendar.monthrange(start_date.year, start_date.month)[1]
 
 
 # ------------------------------------------------------------
@@ -189,6 +130,12 @@ def return_groups_by_pattern(schedule_or_date, days_in_month: int = None, patter
         start_date = schedule_or_date
         if days_in_month is None or pattern is None:
             raise ValueError("Необходимо указать days_in_month и pattern при прямом вызове.")
+    if days_in_month > 0 and _is_whole_month(start_date, days_in_month):
+        groups, labels = day_types_memo.get_or_compute(
+            "groups", pattern, start_date.year, start_date.month,
+            lambda compiled: tuple(map(tuple, _return_groups_core(start_date, days_in_month, pattern))),
+        )
+        return list(groups), list(labels)
     return _return_groups_core(start_date, days_in_month, pattern)
 
 
@@ -240,6 +187,9 @@ def group_days_by_cycles(days, pattern=None):
     if not pattern_list:
         return [days]
 
+    if getattr(pattern, "phase_anchor", None):
+        return _group_days_by_anchored_cycles(days, pattern)
+
     begin_off = int(getattr(pattern, "days_off_at_start", 0) or 0)
     cycle_len = sum(int(x) for x in pattern_list)
 
@@ -258,3 +208,26 @@ def group_days_by_cycles(days, pattern=None):
         idx = next_idx
 
     return groups
+
+
+def _group_days_by_anchored_cycles(days, pattern):
+    """
+    То же для шаблона с phase_anchor: фаза идёт сквозь месяцы, поэтому
+    границы групп — дни, где цикл начинается заново (позиция 0), а не
+    фиксированные отступы от первого числа.
+    """
+    compiled = day_types_memo.compiled(pattern)
+    groups = []
+    previous = "start"
+    for item in days:
+        position = compiled.cycle_position(date.fromisoformat(item["date"]))
+        starts_group = (
+            not groups
+            or position == 0
+            or (position is not None and previous is None)
+        )
+        if starts_group:
+            groups.append([])
+        groups[-1].append(item)
+        previous = position
+    return groups
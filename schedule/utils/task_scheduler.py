@@ -0,0 +1,209 @@
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from schedule.models import CompletionStatus, Event
+from schedule.utils.capacity_planner import EPSILON, WorkCapacity, build_work_capacities
+from schedule.utils.month_cache import EVENTS, month_cache
+
+
+# ------------------------------------------------------------
+# 🔹 Настройки раскладки задач
+# ------------------------------------------------------------
+DEFAULT_TASK_MINUTES = 60
+
+# не больше N задач с таким type / category в день;
+# переопределяется SCHEDULE_TASK_DAY_LIMITS (та же форма)
+DEFAULT_TASK_DAY_LIMITS = {
+    "type": {Event.TypeChoices.HEAVY: 1},
+    "category": {},
+}
+LIMIT_FIELDS = ("type", "category")
+
+# в каком порядке раскладывать: сначала просроченные, затем важные, ..., кайфовые
+TYPE_PRIORITY = {
+    Event.TypeChoices.IMPORTANT: 0,
+    Event.TypeChoices.HEAVY: 1,
+    Event.TypeChoices.GROSS: 2,
+    Event.TypeChoices.ROUTINE: 3,
+    Event.TypeChoices.FUN: 4,
+}
+
+CLOSED_STATUSES = (CompletionStatus.COMPLETE, CompletionStatus.CANCELLED)
+
+
+def task_day_limits() -> Dict[str, Dict[str, int]]:
+    return getattr(settings, "SCHEDULE_TASK_DAY_LIMITS", DEFAULT_TASK_DAY_LIMITS)
+
+
+def task_hours(task) -> float:
+    return (task.duration_minutes or DEFAULT_TASK_MINUTES) / 60
+
+
+# ------------------------------------------------------------
+# 🔹 Дни-корзины
+# ------------------------------------------------------------
+class DayBin:
+    """Свободные часы дня и счётчики задач по (поле, значение) — для лимитов."""
+    __slots__ = ("index", "free", "counts", "tasks")
+
+    def __init__(self, index: int, hours: float):
+        self.index = index
+        self.free = hours
+        self.counts = {}
+        self.tasks = 0
+
+    def take(self, task, hours: float):
+        self.free -= hours
+        self.tasks += 1
+        for field in LIMIT_FIELDS:
+            value = getattr(task, field)
+            if value:
+                self.counts[(field, value)] = self.counts.get((field, value), 0) + 1
+
+    def allows(self, task, limits) -> bool:
+        for field in LIMIT_FIELDS:
+            value = getattr(task, field)
+            limit = limits.get(field, {}).get(value) if value else None
+            if limit is not None and self.counts.get((field, value), 0) >= limit:
+                return False
+        return True
+
+
+class TaskAssignment(NamedTuple):
+    task_id: int
+    old_date: Optional[date]
+    new_date: Optional[date]  # None — не влезла в окно
+    hours: float
+    oversized: bool  # длиннее рабочего дня — поставлена одна на пустой день
+
+
+# ------------------------------------------------------------
+# 🔹 Раскладка (first-fit decreasing по рабочим дням)
+# ------------------------------------------------------------
+def pack_tasks(tasks, capacity: WorkCapacity, busy: List[Event] = (), limits=None) -> List[TaskAssignment]:
+    """
+    Раскладывает задачи по рабочим дням capacity: first fit — в самый ранний
+    день, где хватает часов и не нарушен лимит по type/category. Порядок задач задаёт
+    вызывающий (приоритет, внутри — длинные первыми: FFD).
+    busy — уже стоящие в окне задачи: занимают часы и лимиты.
+
+    Дни, где часов меньше самой короткой из оставшихся задач, отсекаются
+    указателем first_open, так что на тысячах задач обход остаётся почти
+    линейным.
+    """
+    limits = task_day_limits() if limits is None else limits
+    bins = [DayBin(index, hours) for index, hours in enumerate(capacity.hours) if hours > EPSILON]
+    by_index = {day.index: day for day in bins}
+    for task in busy:
+        day = by_index.get((task.date_day - capacity.start_date).days)
+        if day is not None:
+            day.take(task, task_hours(task))
+
+    # минимум по хвосту — сколько часов нужно самой короткой из оставшихся задач
+    hours = [task_hours(task) for task in tasks]
+    tail_min = [0.0] * (len(tasks) + 1)
+    tail_min[len(tasks)] = float("inf")
+    for i in range(len(tasks) - 1, -1, -1):
+        tail_min[i] = min(hours[i], tail_min[i + 1])
+
+    first_open = 0
+    result = []
+    for i, task in enumerate(tasks):
+        need = hours[i]
+        while first_open < len(bins) and bins[first_open].free + EPSILON < tail_min[i]:
+            first_open += 1
+
+        placed = None
+        oversized = False
+        for index in range(first_open, len(bins)):
+            day = bins[index]
+            if day.free + EPSILON >= need and day.allows(task, limits):
+                placed = day
+                break
+        if placed is None:
+            # длиннее любого дня — ставим одну на первый пустой рабочий день
+            for day in bins:
+                if day.tasks == 0 and day.allows(task, limits):
+                    placed, oversized = day, True
+                    break
+
+        if placed is not None:
+            placed.take(task, need)
+        result.append(TaskAssignment(
+            task_id=task.pk,
+            old_date=task.date_day,
+            new_date=capacity.date_at(placed.index) if placed is not None else None,
+            hours=need,
+            oversized=oversized,
+        ))
+    return result
+
+
+def _task_order(task, today: date):
+    """Просроченные (по давности) → без даты; внутри — по type, затем длинные первыми."""
+    overdue = task.date_day is not None
+    return (
+        0 if overdue else 1,
+        task.date_day or today,
+        TYPE_PRIORITY.get(task.type, len(TYPE_PRIORITY)),
+        -task_hours(task),
+        task.pk,
+    )
+
+
+def auto_schedule_tasks(user, days: Optional[int] = None, start_date: Optional[date] = None,
+                        dry_run: bool = False) -> dict:
+    """
+    Раскладывает незапланированные (date_day пуст) и просроченные
+    (date_day < start_date) открытые задачи пользователя по его рабочим дням
+    начиная с start_date (по умолчанию — сегодня). Ёмкость дня —
+    working_day_duration шаблона минус уже стоящие на этот день задачи.
+
+    Запись — одним bulk_update(date_day, updated_at). bulk_update не шлёт
+    сигналов, поэтому месячный кэш all_events пользователя сбрасываем сами.
+    """
+    start_date = start_date or timezone.localdate()
+    if days is None:
+        days = getattr(settings, "SCHEDULE_PLANNER_HORIZON_DAYS", 120)
+    end_date = start_date + timedelta(days=days - 1)
+
+    open_tasks = (
+        Event.objects.filter(user=user, event_type=Event.EventType.TASK, is_active=True, is_completed=False)
+        .exclude(status__in=CLOSED_STATUSES)
+        .only("pk", "date_day", "duration_minutes", "type", "category")
+    )
+    pending = list(open_tasks.filter(Q(date_day__isnull=True) | Q(date_day__lt=start_date)))
+    busy = list(open_tasks.filter(date_day__gte=start_date, date_day__lte=end_date))
+    pending.sort(key=lambda task: _task_order(task, start_date))
+
+    capacity = build_work_capacities([user.pk], start_date, days)[user.pk]
+    assignments = pack_tasks(pending, capacity, busy)
+
+    if not dry_run:
+        now = timezone.now()
+        by_id = {task.pk: task for task in pending}
+        changed = []
+        for item in assignments:
+            if item.new_date is None:
+                continue
+            task = by_id[item.task_id]
+            task.date_day = item.new_date
+            task.updated_at = now
+            changed.append(task)
+        if changed:
+            Event.objects.bulk_update(changed, ["date_day", "updated_at"], batch_size=500)
+            month_cache.invalidate_user(EVENTS, user.pk)
+
+    return {
+        "start": start_date,
+        "end": end_date,
+        "dry_run": dry_run,
+        "capacity_hours": capacity.total_hours,
+        "assigned": [item._asdict() for item in assignments if item.new_date is not None],
+        "unplaced": [item._asdict() for item in assignments if item.new_date is None],
+        "errors": capacity.errors,
+    }
@@ -1,35 +1,54 @@
-import logging
+import base64
+import binascii
 import calendar
+import logging
 from datetime import datetime, timedelta, date
+from itertools import islice
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.utils.timezone import make_aware, make_naive
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.utils.timezone import make_aware
 
 from rest_framework import generics, status, viewsets
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.exceptions import ValidationError
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from common.choices import EventDateMode
+from common.choices import RecurrenceType
+from identity.models import Artist, Manager
 from .models import (
-    CompletionStatus, Event, EventInstance, Slot,
+    CompletionStatus, Event, EventInstance, Occurrence, Slot,
     SchedulePattern, MonthSchedule, DayOverride
 )
 from .serializers import (
     EventSerializer, EventInstanceSerializer, SlotSerializer,
     SchedulePatternSerializer, MonthScheduleSerializer, DayOverrideSerializer
 )
-from .utils.schedule_helper import generate_day_types, return_groups_by_pattern
+from .utils.schedule_helper import return_groups_by_pattern
 from .weekdays import Weekday
 
 from schedule.models import PatternMode
 from .utils.schedule_helper import group_days_by_cycles
+from .utils.occurrence_helper import (
+    build_overlay_index, expand_event, get_recurrence_type, iter_expanded_occurrences,
+)
+from .utils.occurrence_index import get_covering_horizon, iter_indexed_occurrences
+from .utils.recurrence_cache import recurrence_cache, with_cached_recurrence
+from .utils.availability import find_free_windows, next_free_windows
+from .utils.capacity_planner import plan_commissions
+from .utils.task_scheduler import auto_schedule_tasks
+from .utils.calendar_version import CalendarVersion, get_calendar_version
+from .utils.month_cache import EVENTS, PREVIEW, is_cache_bypassed, month_cache
+from .utils.pattern_engine import (
+    day_types_memo, days_of_mask, intersect_label, month_masks, month_overrides, pattern_hours_per_day,
+)
 from common.datetime import ensure_timezone
 
 
@@ -83,11 +102,29 @@ class EventInstanceViewSet(UserScopedQuerySetMixin, viewsets.ModelViewSet):
 # Расширенная выдача вхождений
 # -----------------------------
 class EventExpandedListView(generics.ListAPIView):
+    """
+    Вхождения событий пользователя.
+
+    Два режима:
+      • ?year=&month= — весь месяц одним списком (как раньше);
+      • ?from=&to=[&limit=&cursor=] — произвольный диапазон, поток вхождений
+        по (datetime, event_id) с курсорной пагинацией.
+
+    Оба режима отдают ETag / Last-Modified и отвечают 304 на условный GET,
+    если события и оверлеи окна не менялись (без разворачивания).
+    Месячный ответ кэшируется (utils/month_cache.py); ?nocache=1 — в обход кэша.
+    """
     permission_classes = [IsAuthenticated]
     serializer_class = EventSerializer
     queryset = Event.objects.none()
 
+    range_page_size = 200
+    range_max_page_size = 1000
+
     def get(self, request, *args, **kwargs):
+        if 'from' in request.query_params or 'to' in request.query_params:
+            return self._get_range(request)
+
         year = request.query_params.get('year')
         month = request.query_params.get('month')
 
@@ -105,28 +142,6 @@ class EventExpandedListView(generics.ListAPIView):
         errors = []
         debug_notes = []
 
-        # --- helpers ---
-        def _first_of_month(dt):
-            if dt is None:
-                return None
-            # приводим к локальному tz и делаем ровно 00:00 первого числа
-            if dt.tzinfo is None:
-                aware = make_aware(dt, tz)
-            else:
-                aware = timezone.localtime(dt, tz)
-            aware = aware.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            return aware
-
-        def _add_months(dt, months):
-            # dt — AWARE; крутим месяцы и сохраняем tz корректно
-            y = dt.year + (dt.month - 1 + months) // 12
-            m = (dt.month - 1 + months) % 12 + 1
-            return dt.replace(year=y, month=m)
-
-        def _serialize_datetime(value):
-            aware_value = ensure_timezone(value, tz=tz)
-            return aware_value.isoformat()
-
         # --- границы выбранного месяца [start_dt, end_dt] (aware) ---
         start_dt = make_aware(datetime(year, month, 1, 0, 0, 0), tz)
         if month == 12:
@@ -135,7 +150,236 @@ class EventExpandedListView(generics.ListAPIView):
             next_month = make_aware(datetime(year, month + 1, 1, 0, 0, 0), tz)
         end_dt = next_month - timedelta(seconds=1)
 
-        events_data = []
+        shape = self._parse_shape(request)
+
+        # готовый ответ из кэша: ни отпечатка, ни разворачивания
+        cache_key, cached = month_cache.lookup(
+            EVENTS, request.user.pk, year, month,
+            variant=f"{shape}|debug={int(debug_mode)}", bypass=is_cache_bypassed(request),
+        )
+        if cached is not None:
+            version = CalendarVersion(*cached["version"])
+            payload = cached["payload"]
+            if debug_mode:
+                payload["meta"]["cache"] = "hit"
+            return self._conditional(request, version) or self._versioned(Response(payload), version)
+
+        version = self._calendar_version(request, start_dt, end_dt, debug_mode)
+        not_modified = self._conditional(request, version)
+        if not_modified is not None:
+            return not_modified
+
+        # индекс Occurrence покрывает месяц → берём готовые вхождения одним range-scan'ом
+        source = "index" if get_covering_horizon(start_dt, end_dt) else "expand"
+        if source == "index":
+            occurrences = self._from_index(request, start_dt, end_dt)
+        else:
+            occurrences = self._expand(request, start_dt, end_dt, tz, errors, debug_notes)
+
+        serializer_context = {"request": request}
+        serialize_event = self._event_serializer_memo(serializer_context)
+
+        # Ответ
+        if shape == 'normalized':
+            payload = self._render_normalized(occurrences, serialize_event, serializer_context)
+            count_events = len(payload["occurrences"])
+        else:
+            payload = [
+                self._render_flat_item(occurrence, serialize_event, serializer_context)
+                for occurrence in occurrences
+            ]
+            count_events = len(payload)
+
+        if debug_mode:
+            meta = {
+                "user_id": getattr(request.user, "id", None),
+                "year": year,
+                "month": month,
+                "source": source,
+                "shape": shape,
+                "count_events": count_events,
+                "count_errors": len(errors),
+                "notes": debug_notes,
+            }
+            if shape == 'normalized':
+                payload = {**payload, "errors": errors, "meta": meta}
+            else:
+                payload = {"events": payload, "errors": errors, "meta": meta}
+
+        # ответы с ошибками разворачивания не кэшируем
+        if not errors:
+            month_cache.store(cache_key, {"payload": payload, "version": tuple(version)})
+        if debug_mode:
+            meta["cache"] = "miss" if cache_key else "bypass"
+        return self._versioned(Response(payload), version)
+
+    def _get_range(self, request):
+        tz = timezone.get_current_timezone()
+        debug_mode = settings.DEBUG or (request.query_params.get('debug') == '1')
+        shape = self._parse_shape(request)
+
+        start_dt = _parse_range_bound(request.query_params.get('from'), 'from', tz)
+        end_dt = _parse_range_bound(request.query_params.get('to'), 'to', tz, inclusive_end=True)
+        if start_dt > end_dt:
+            raise ValidationError({"detail": "'from' must not be later than 'to'."})
+
+        try:
+            limit = int(request.query_params.get('limit', self.range_page_size))
+        except ValueError:
+            raise ValidationError({"detail": "'limit' must be an integer."})
+        limit = max(1, min(limit, self.range_max_page_size))
+
+        after = _decode_cursor(request.query_params.get('cursor'))
+
+        version = self._calendar_version(request, start_dt, end_dt, debug_mode)
+        not_modified = self._conditional(request, version)
+        if not_modified is not None:
+            return not_modified
+
+        # индекс покрывает диапазон → keyset-выборка; иначе разворачиваем кусками
+        if get_covering_horizon(start_dt, end_dt):
+            source = "index"
+            stream = iter_indexed_occurrences(request.user, start_dt, end_dt, after=after)
+        else:
+            source = "expand"
+            stream = iter_expanded_occurrences(request.user, start_dt, end_dt, tz, after=after)
+
+        # берём на одно больше, чтобы понять, есть ли следующая страница
+        page = list(islice(stream, limit + 1))
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            last_event, last_dt, _, _ = page[-1]
+            next_cursor = _encode_cursor(last_dt, last_event.id)
+
+        serializer_context = {"request": request}
+        serialize_event = self._event_serializer_memo(serializer_context)
+        if shape == 'normalized':
+            payload = self._render_normalized(page, serialize_event, serializer_context)
+        else:
+            payload = {
+                "results": [
+                    self._render_flat_item(occurrence, serialize_event, serializer_context)
+                    for occurrence in page
+                ],
+            }
+        payload.update({
+            "from": start_dt.isoformat(),
+            "to": end_dt.isoformat(),
+            "next_cursor": next_cursor,
+        })
+        if debug_mode:
+            payload["meta"] = {
+                "user_id": getattr(request.user, "id", None),
+                "source": source,
+                "shape": shape,
+                "limit": limit,
+                "count_events": len(page),
+            }
+        return self._versioned(Response(payload), version)
+
+    # --- условный GET ---
+    @staticmethod
+    def _calendar_version(request, start_dt, end_dt, debug_mode):
+        # тело ответа зависит ещё от параметров запроса и debug-режима
+        variant = f"{request.get_full_path()}|debug={int(debug_mode)}"
+        return get_calendar_version(request.user, start_dt, end_dt, variant=variant)
+
+    @staticmethod
+    def _timestamp(dt):
+        return int(dt.timestamp()) if dt else None
+
+    def _conditional(self, request, version):
+        """304 с заголовками версии, если у клиента актуальная копия, иначе None."""
+        not_modified = get_conditional_response(
+            request, etag=version.etag, last_modified=self._timestamp(version.last_modified),
+        )
+        if not_modified is None:
+            return None
+        return self._versioned(not_modified, version)
+
+    def _versioned(self, response, version):
+        response["ETag"] = version.etag
+        if version.last_modified:
+            response["Last-Modified"] = http_date(self._timestamp(version.last_modified))
+        # ответ персональный; клиент каждый раз переспрашивает, но может получить 304
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    # --- сборка ответа ---
+    @staticmethod
+    def _parse_shape(request):
+        # ?shape=normalized — каждое родительское событие один раз в "events",
+        # вхождения — компактным списком (`format` занят DRF под выбор рендерера)
+        shape = request.query_params.get('shape', 'flat')
+        if shape not in ('flat', 'normalized'):
+            raise ValidationError({"detail": "'shape' must be 'flat' or 'normalized'."})
+        return shape
+
+    @staticmethod
+    def _event_serializer_memo(context):
+        """EventSerializer(...).data с мемоизацией по id в пределах запроса."""
+        cache = {}
+
+        def serialize_event(event):
+            data = cache.get(event.id)
+            if data is None:
+                data = cache[event.id] = EventSerializer(event, context=context).data
+            return data
+
+        return serialize_event
+
+    @staticmethod
+    def _occurrence_id(event, occurs_at, rtype):
+        if rtype == RecurrenceType.SINGLE:
+            return str(event.id)
+        return f"{event.id}_{int(occurs_at.timestamp())}"
+
+    def _render_flat_item(self, occurrence, serialize_event, context):
+        event, occurs_at, rtype, instance = occurrence
+        occurrence_id = self._occurrence_id(event, occurs_at, rtype)
+        return {
+            "id": occurrence_id,
+            "occurrence_id": occurrence_id,
+            "source_event_id": event.id,
+            "instance_id": instance.id if instance else None,
+            "datetime": occurs_at.isoformat(),
+            "event": serialize_event(event),
+            "overlay": EventInstanceSerializer(instance, context=context).data if instance else None,
+            "is_recurring": rtype != RecurrenceType.SINGLE,
+            "recurrence_type": str(rtype),
+        }
+
+    def _render_normalized(self, occurrences, serialize_event, context):
+        events = {}
+        compact = []
+        for event, occurs_at, rtype, instance in occurrences:
+            if event.id not in events:
+                events[event.id] = serialize_event(event)
+            compact.append({
+                "source_event_id": event.id,
+                "datetime": occurs_at.isoformat(),
+                "instance_id": instance.id if instance else None,
+                "overlay": EventInstanceSerializer(instance, context=context).data if instance else None,
+            })
+        return {"events": events, "occurrences": compact}
+
+    # --- источники вхождений: список (event, occurs_at, rtype, instance) ---
+    def _from_index(self, request, start_dt, end_dt):
+        tz = timezone.get_current_timezone()
+        rows = Occurrence.objects.filter(
+            user=request.user,
+            occurs_at__gte=start_dt,
+            occurs_at__lte=end_dt,
+        ).select_related("event", "instance").order_by("event_id", "occurs_at")
+        return [
+            (row.event, ensure_timezone(row.occurs_at, tz=tz), row.recurrence_type,
+             row.instance if row.recurrence_type != RecurrenceType.SINGLE else None)
+            for row in rows
+        ]
+
+    def _expand(self, request, start_dt, end_dt, tz, errors, debug_notes):
+        occurrences = []
 
         # ⚠️ фильтруем только события текущего пользователя
         events = Event.objects.filter(
@@ -145,147 +389,30 @@ class EventExpandedListView(generics.ListAPIView):
             (Q(end_datetime__gte=start_dt) | Q(end_datetime__isnull=True))
         )[:1000]  # safety cap
 
-        for event in events:
+        # все оверлеи (EventInstance) за месяц — одним запросом, дальше матчим в памяти
+        overlays = build_overlay_index(start_dt, end_dt, user=request.user)
+
+        # RRULE не разбираем заново: берём из кэша по (event_id, updated_at)
+        for event in with_cached_recurrence(events):
             try:
                 rtype = get_recurrence_type(event)
-
-                # =========================
-                # A) MONTH-режим (NUMBER_OF_MONTH)
-                # =========================
-                if event.date_mode == EventDateMode.NUMBER_OF_MONTH:
-                    # 1) одиночное "за месяц"
-                    if not event.is_recurring_monthly:
-                        anchor = _first_of_month(event.start_datetime)
-                        if anchor and (start_dt <= anchor <= end_dt):
-                            occurrence_id = str(event.id)
-                            events_data.append({
-                                "id": occurrence_id,
-                                "occurrence_id": occurrence_id,
-                                "source_event_id": event.id,
-                                "instance_id": None,
-                                "datetime": _serialize_datetime(anchor),
-                                "event": EventSerializer(
-                                    event, context={"request": request}
-                                ).data,
-                                "overlay": None,
-                                "is_recurring": False,
-                                "recurrence_type": "single",
-                            })
-                        continue  # MONTH-ветка обработана
-
-                    # 2) повторяемое "каждые N месяцев"
-                    interval = int(event.month_interval or 1)
-                    series_start = _first_of_month(event.start_datetime)
-                    series_end = _first_of_month(event.end_datetime)
-
-                    if not series_start or not series_end:
-                        # на валидатор надеемся, но защитимся от битых данных
-                        debug_notes.append({
-                            "event_id": event.id,
-                            "note": "monthly series skipped due to missing series_start/series_end"
-                        })
-                        continue
-
-                    current = series_start
-                    while current <= series_end:
-                        if start_dt <= current <= end_dt:
-                            current_aware = ensure_timezone(current, tz=tz)
-                            instance = EventInstance.objects.filter(
-                                parent_event=event,
-                                instance_datetime=current_aware
-                            ).first()
-                            unique_id = f"{event.id}_{int(current_aware.timestamp())}"
-
-                            events_data.append({
-                                "id": unique_id,
-                                "occurrence_id": unique_id,
-                                "source_event_id": event.id,
-                                "instance_id": instance.id if instance else None,
-                                "datetime": current_aware.isoformat(),
-                                "event": EventSerializer(
-                                    instance.parent_event if instance else event,
-                                    context={"request": request}
-                                ).data,
-                                "overlay": EventInstanceSerializer(
-                                    instance, context={"request": request}
-                                ).data if instance else None,
-                                "is_recurring": True,
-                                "recurrence_type": "monthly",
-                            })
-                        current = _add_months(current, interval)
-
-                    continue  # MONTH-ветка обработана
-
-                # =========================
-                # B) EXACT_DATE (без RRULE) => одиночное
-                # =========================
-                if rtype == 'single' and not event.recurrence:
-                    if start_dt <= event.start_datetime <= end_dt:
-                        event_start = ensure_timezone(event.start_datetime, tz=tz)
-                        occurrence_id = str(event.id)
-                        events_data.append({
-                            "id": occurrence_id,
-                            "occurrence_id": occurrence_id,
-                            "source_event_id": event.id,
-                            "instance_id": None,
-                            "datetime": event_start.isoformat(),
-                            "event": EventSerializer(
-                                event, context={"request": request}
-                            ).data,
-                            "overlay": None,
-                            "is_recurring": False,
-                            "recurrence_type": "single",
-                        })
+                if rtype == RecurrenceType.MONTHLY and not (event.start_datetime and event.end_datetime):
+                    # на валидатор надеемся, но защитимся от битых данных
+                    debug_notes.append({
+                        "event_id": event.id,
+                        "note": "monthly series skipped due to missing series_start/series_end"
+                    })
                     continue
 
-                # =========================
-                # C) EXACT_DATE + RRULE
-                # =========================
-                if event.recurrence:
-                    # django-recurrence обычно дружит с naive датами
-                    start_naive = make_naive(start_dt, tz)
-                    end_naive = make_naive(end_dt, tz)
-                    dtstart_naive = datetime(2010, 1, 1, 0, 0, 0)
-
-                    recurrences = event.recurrence.between(
-                        start_naive,
-                        end_naive,
-                        inc=True,
-                        dtstart=dtstart_naive
-                    )
-                    for recurrence in recurrences:
-                        # recurrence приходит naive — делаем его aware
-                        recurrence_aware = make_aware(recurrence, tz)
-
-                        unique_id = f"{event.id}_{int(recurrence_aware.timestamp())}"
-                        normalized = ensure_timezone(recurrence_aware, tz=tz)
-                        instance = EventInstance.objects.filter(
-                            parent_event=event,
-                            instance_datetime=normalized
-                        ).first()
-
-                        events_data.append({
-                            "id": unique_id,
-                            "occurrence_id": unique_id,
-                            "source_event_id": event.id,
-                            "instance_id": instance.id if instance else None,
-                            "datetime": normalized.isoformat(),
-                            "event": EventSerializer(
-                                instance.parent_event if instance else event,
-                                context={"request": request}
-                            ).data,
-                            "overlay": EventInstanceSerializer(
-                                instance, context={"request": request}
-                            ).data if instance else None,
-                            "is_recurring": True,
-                            "recurrence_type": "rrule",
-                        })
+                for occurs_at, rtype in expand_event(event, start_dt, end_dt, tz):
+                    instance = overlays.get((event.id, occurs_at)) if rtype != RecurrenceType.SINGLE else None
+                    occurrences.append((event, occurs_at, rtype, instance))
 
             except Exception as e:
                 # Лог в консоль со стеком и контекстом
                 logger.exception(
-                    "all_events crash on event %s (user=%s, year=%s, month=%s)",
-                    getattr(event, "id", None), getattr(request.user, "id", None), year, month
+                    "all_events crash on event %s (user=%s, window=%s..%s)",
+                    getattr(event, "id", None), getattr(request.user, "id", None), start_dt, end_dt
                 )
                 # В ответ для дебага (если можно)
                 errors.append({
@@ -296,22 +423,58 @@ class EventExpandedListView(generics.ListAPIView):
                 })
                 continue
 
-        # Ответ
-        payload = events_data
-        if debug_mode:
-            payload = {
-                "events": events_data,
-                "errors": errors,
-                "meta": {
-                    "user_id": getattr(request.user, "id", None),
-                    "year": year,
-                    "month": month,
-                    "count_events": len(events_data),
-                    "count_errors": len(errors),
-                    "notes": debug_notes,
-                }
-            }
-        return Response(payload)
+        return occurrences
+
+
+# допустимые годы границ диапазона: запас в год по краям, чтобы сдвиг tz,
+# «конец дня» и add_months(…, 1) при разворачивании не выходили за datetime.min/max
+RANGE_MIN_YEAR = 2
+RANGE_MAX_YEAR = 9998
+
+
+def _parse_range_bound(value, name, tz, inclusive_end=False):
+    """
+    'YYYY-MM-DD' или ISO-datetime → aware datetime.
+    Для дат-границы 'to' берём конец дня (включительно).
+    """
+    if not value:
+        raise ValidationError({"detail": f"'{name}' query parameter is required."})
+    try:
+        is_day = len(value) == 10
+        parsed = date.fromisoformat(value) if is_day else datetime.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({"detail": f"'{name}' must be YYYY-MM-DD or an ISO datetime."})
+    if not RANGE_MIN_YEAR <= parsed.year <= RANGE_MAX_YEAR:
+        raise ValidationError({"detail": f"'{name}' must be between years {RANGE_MIN_YEAR} and {RANGE_MAX_YEAR}."})
+    try:
+        if is_day:
+            if inclusive_end:
+                return make_aware(datetime.combine(parsed + timedelta(days=1), datetime.min.time()), tz) \
+                    - timedelta(microseconds=1)
+            return make_aware(datetime.combine(parsed, datetime.min.time()), tz)
+        return ensure_timezone(parsed, tz=tz)
+    except (ValueError, OverflowError):
+        raise ValidationError({"detail": f"'{name}' is out of the supported range."})
+
+
+def _encode_cursor(occurs_at, event_id) -> str:
+    raw = f"{occurs_at.isoformat()}|{event_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(value):
+    """Курсор → (occurs_at, event_id) или None."""
+    if not value:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(value.encode()).decode()
+        dt_part, id_part = raw.rsplit("|", 1)
+        occurs_at = datetime.fromisoformat(dt_part)
+        if timezone.is_naive(occurs_at):
+            raise ValueError("naive cursor")
+        return occurs_at, int(id_part)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise ValidationError({"detail": "Invalid cursor."})
 
 
 def group_days_by_iso_week(days):
@@ -433,13 +596,94 @@ class UpdateOccurrenceStatusView(APIView):
         return Response({"detail": "Status updated."})
 
 
+def summarize_month(masks, pattern) -> dict:
+    """Сводка месяца по битовым маскам (MonthMasks): счётчики — popcount."""
+    hours_per_day = pattern_hours_per_day(pattern)
+    type_counts = masks.counts()
+    work_days = type_counts.get("work", 0)
+    return {
+        "work_days": work_days,
+        "off_days": type_counts.get("off", 0),
+        "holidays": type_counts.get("holiday", 0),
+        "vacation_days": type_counts.get("vacation", 0),
+        "sick_days": type_counts.get("sick", 0),
+        "hours_per_day": hours_per_day,
+        "work_hours_total": int(round(work_days * hours_per_day)),
+        # при необходимости можно добавить и общее число дней:
+        "total_days": masks.days,
+        # и «прочие» дни, если у вас есть другие типы:
+        "other_days": sum(
+            c for k, c in type_counts.items() if k not in {"work", "off", "holiday", "vacation", "sick"}
+        ),
+    }
+
+
+def build_month_preview(schedule, year, month, pattern_data, overrides=()):
+    """
+    Превью одного месяца по готовому MonthSchedule: дни, группы, сводка.
+    pattern_data — уже сериализованный шаблон (в диапазоне сериализуем
+    каждый шаблон один раз); overrides — DayOverride этого месяца,
+    они подменяют тип дня и учитываются в группах и сводке.
+    ValueError — битый шаблон.
+    """
+    # --- Разметка месяца битовыми масками (шаблон + исключения) ---
+    start_date = date(year, month, 1)
+    base_masks = month_masks(schedule.pattern, year, month)
+    overrides_by_day = month_overrides(((override.date, override) for override in overrides), year, month)
+    masks = base_masks.with_overrides({day: override.type for day, override in overrides_by_day.items()})
+
+    # --- Дни: dict'ы собираем только здесь, для ответа ---
+    today = date.today()
+    pattern_types = base_masks.labels()
+    day_types = masks.labels()
+    days = []
+    for i, day_type in enumerate(day_types):
+        d = start_date + timedelta(days=i)
+        override = overrides_by_day.get(d.day)
+        days.append({
+            "date": d.isoformat(),  # 'YYYY-MM-DD'
+            "day": d.day,
+            "weekday": Weekday.get_day_by_number(d.isoweekday(), format_type="short_RU"),
+            "is_today": d == today,
+            "group_id": None,
+            "overrides": (
+                [{"id": override.id, "type": override.type, "comment": override.comment}] if override else []
+            ),
+            "notes": override.comment if override and override.comment else "",
+            # ✅ ключи под фронт: type (с учётом DayOverride) и pattern_type (по шаблону)
+            "type": day_type,
+            "pattern_type": pattern_types[i],
+        })
+
+    # --- Группы по ISO-неделям из уже нормализованных days
+    if schedule.pattern and schedule.pattern.mode == PatternMode.WEEKDAY:
+        groups = group_days_by_iso_week(days)  # недельная нарезка (пн–вс)
+    else:
+        groups = group_days_by_cycles(days, schedule.pattern)
+
+    # --- Сводка по месяцу (агрегаты для фронта) — popcount по маскам ---
+    summary = summarize_month(masks, schedule.pattern)
+    summary["overridden_days"] = len(overrides_by_day)
+
+    payload = {
+        "year": year,
+        "month": month,
+        "pattern": pattern_data,
+        "grouping_mode": "week" if schedule.pattern and schedule.pattern.mode == PatternMode.WEEKDAY else "type_runs",
+        "groups": groups,
+        "days": days,
+        "summary": summary,
+    }
+    return payload
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def schedule_preview(request):
     """
     Возвращает предварительный просмотр расписания за указанный год и месяц.
     В ответе:
-      - список дней с типами (work/off/...),
+      - список дней с типами (work/off/...) с учётом DayOverride,
       - pattern для фронта,
     """
     user_id = request.query_params.get('user')
@@ -459,108 +703,387 @@ def schedule_preview(request):
     User = get_user_model()
     user_obj = User.objects.get(pk=user_id)
 
+    # сначала расписание: его создание двигает версию месяца (post_save),
+    # и снятый до этого ключ кэша сразу бы устарел
     schedule, created = MonthSchedule.get_or_create_for_month(user_obj, year, month)
+
+    # --- Готовый ответ из кэша (is_today зависит от даты — она в ключе) ---
+    cache_key, cached = month_cache.lookup(
+        PREVIEW, user_id, year, month,
+        variant=date.today().isoformat(), bypass=is_cache_bypassed(request),
+    )
+    if cached is not None:
+        return Response(cached)
+
     # 🛡️ на случай, если у MonthSchedule ещё не выбран pattern
     pattern_data = SchedulePatternSerializer(schedule.pattern).data if schedule.pattern else None
 
-    # --- Генерация дней ---
-    start_date = date(year, month, 1)
-    _, days_in_month = calendar.monthrange(year, month)
+    # исключения месяца — одним запросом (у только что созданного их нет)
+    overrides = () if created else list(schedule.overrides.all())
+
     try:
-        day_types = generate_day_types(schedule)
+        payload = build_month_preview(schedule, year, month, pattern_data, overrides=overrides)
     except ValueError as e:
         return Response({'error': str(e)}, status=400)
+    month_cache.store(cache_key, payload)
+    return Response(payload)
+
+
+PREVIEW_RANGE_MAX_MONTHS = 24
+
+
+def _parse_year_month(value):
+    """'YYYY-MM' → (year, month) или None."""
+    try:
+        year, month = (int(part) for part in str(value).split("-"))
+    except (TypeError, ValueError):
+        return None
+    if not 1 <= month <= 12:
+        return None
+    return year, month
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def schedule_preview_range(request):
+    """
+    Превью расписания за несколько месяцев: ?user=&from=YYYY-MM&to=YYYY-MM.
+    Формат каждого месяца — как у schedule_preview. Число запросов не
+    зависит от длины диапазона: расписания, шаблоны и исключения грузятся
+    пачкой, недостающие месяцы создаются одним bulk_create.
+    """
+    start = _parse_year_month(request.query_params.get('from'))
+    end = _parse_year_month(request.query_params.get('to'))
+    try:
+        user_id = int(request.query_params.get('user'))
+    except (ValueError, TypeError):
+        user_id = None
+
+    if start is None or end is None or user_id is None:
+        return Response({'error': 'Неверные параметры from/to (YYYY-MM) или user'}, status=400)
+    months_count = (end[0] * 12 + end[1]) - (start[0] * 12 + start[1]) + 1
+    if months_count < 1:
+        return Response({'error': "'from' не может быть позже 'to'"}, status=400)
+    if months_count > PREVIEW_RANGE_MAX_MONTHS:
+        return Response({'error': f'Не больше {PREVIEW_RANGE_MAX_MONTHS} месяцев за запрос'}, status=400)
+
+    User = get_user_model()
+    user_obj = get_object_or_404(User, pk=user_id)
+
+    schedules = MonthSchedule.get_or_create_for_range(user_obj, start, end)
+
+    # исключения всех уже существовавших месяцев — одним запросом
+    overrides_by_schedule = {}
+    existing_ids = [schedule.pk for _, _, schedule in schedules if schedule.pk]
+    for override in DayOverride.objects.filter(month_schedule_id__in=existing_ids).order_by("date"):
+        overrides_by_schedule.setdefault(override.month_schedule_id, []).append(override)
+
+    # каждый шаблон сериализуем один раз
+    patterns_data = {}
+    months = []
+    for year, month, schedule in schedules:
+        pattern = schedule.pattern
+        if pattern is not None and pattern.pk not in patterns_data:
+            patterns_data[pattern.pk] = SchedulePatternSerializer(pattern).data
+        pattern_data = patterns_data.get(pattern.pk) if pattern is not None else None
+        try:
+            months.append(build_month_preview(
+                schedule, year, month, pattern_data,
+                overrides=overrides_by_schedule.get(schedule.pk, ()),
+            ))
+        except ValueError as e:
+            return Response({'error': f'{year}-{month:02d}: {e}'}, status=400)
+
+    return Response({
+        "user": user_id,
+        "from": f"{start[0]}-{start[1]:02d}",
+        "to": f"{end[0]}-{end[1]:02d}",
+        "months": months,
+    })
+
+
+def _resolve_team_manager(request, manager_id):
+    """
+    (Manager, None) или (None, Response с ошибкой). Без manager_id — менеджер
+    текущего пользователя; чужую команду видит только staff.
+    """
+    if manager_id is None:
+        manager = Manager.objects.filter(user=request.user).first()
+        if manager is None:
+            return None, Response({'error': 'Параметр manager обязателен'}, status=400)
+    else:
+        manager = get_object_or_404(Manager, pk=manager_id)
+    if manager.user_id != request.user.pk and not request.user.is_staff:
+        return None, Response({'error': 'Можно смотреть только свою команду'}, status=403)
+    return manager, None
+
 
-    # --- Генерация дней ---
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def schedule_preview_team(request):
+    """
+    Сетка расписаний команды менеджера за месяц: ?manager=&year=&month=
+    (manager по умолчанию — менеджер текущего пользователя).
+
+    Компактно: шапка дней — один раз, у художника — только строка типов
+    по дням, номера дней с DayOverride и сводка. Шаблоны сериализуются по
+    одному разу в "patterns". В "team" — дни, когда работают / отдыхают все.
+    Запросов — константа: менеджер, художники, пачка MonthSchedule,
+    исключения одним запросом.
+    """
+    try:
+        year = int(request.query_params.get('year'))
+        month = int(request.query_params.get('month'))
+        manager_id = request.query_params.get('manager')
+        manager_id = int(manager_id) if manager_id is not None else None
+    except (ValueError, TypeError):
+        return Response({'error': 'Неверные параметры year/month/manager'}, status=400)
+    if not 1 <= month <= 12 or not RANGE_MIN_YEAR <= year <= RANGE_MAX_YEAR:
+        return Response({'error': 'Неверные параметры year/month/manager'}, status=400)
+
+    manager, error = _resolve_team_manager(request, manager_id)
+    if error is not None:
+        return error
+
+    artists = list(Artist.objects.filter(manager=manager).select_related("user"))
+    schedules = MonthSchedule.get_or_create_for_users([artist.user_id for artist in artists], year, month)
+
+    # исключения всех уже существовавших расписаний — одним запросом
+    overrides_by_schedule = {}
+    existing_ids = [schedule.pk for schedule in schedules.values() if schedule.pk]
+    override_rows = DayOverride.objects.filter(month_schedule_id__in=existing_ids).values_list(
+        "month_schedule_id", "date", "type",
+    )
+    for schedule_id, day, day_type in override_rows:
+        overrides_by_schedule.setdefault(schedule_id, []).append((day, day_type))
+
+    # --- Шапка: дни месяца ---
+    start_date = date(year, month, 1)
+    today = date.today()
     days = []
-    for i, day_type in enumerate(day_types):
+    for i in range(calendar.monthrange(year, month)[1]):
         d = start_date + timedelta(days=i)
         days.append({
-            "date": d.isoformat(),  # 'YYYY-MM-DD'
+            "date": d.isoformat(),
             "day": d.day,
             "weekday": Weekday.get_day_by_number(d.isoweekday(), format_type="short_RU"),
-            "day_type": day_type,
-            "is_today": d == date.today(),
-            "group_id": None,
-            "overrides": [],
-            "notes": "",
+            "is_today": d == today,
         })
 
-    # ✅ Нормализуем ключи под фронт: day_type -> type
-    normalized_days = []
-    for item in days:
-        new_item = dict(item)
-        new_item["type"] = new_item.pop("day_type")
-        normalized_days.append(new_item)
-    days = normalized_days
+    # --- Строки художников ---
+    patterns_data = {}
+    rows = []
+    team_masks = []
+    for artist in artists:
+        schedule = schedules[artist.user_id]
+        pattern = schedule.pattern
+        if pattern is not None and pattern.pk not in patterns_data:
+            patterns_data[pattern.pk] = SchedulePatternSerializer(pattern).data
+        overrides = month_overrides(overrides_by_schedule.get(schedule.pk, ()), year, month) if schedule.pk else {}
+        row = {
+            "artist": artist.pk,
+            "user": artist.user_id,
+            "name": str(artist),
+            "pattern": pattern.pk if pattern is not None else None,
+            "overridden_days": sorted(overrides),
+        }
+        try:
+            masks = month_masks(pattern, year, month).with_overrides(overrides)
+        except ValueError as e:
+            # битый шаблон одного художника не должен ронять всю сетку
+            row.update({"types": None, "summary": None, "error": str(e)})
+        else:
+            row.update({"types": masks.labels(), "summary": summarize_month(masks, pattern)})
+            team_masks.append(masks)
+        rows.append(row)
+
+    return Response({
+        "manager": manager.pk,
+        "year": year,
+        "month": month,
+        "days": days,
+        "patterns": patterns_data,
+        "artists": rows,
+        "team": {
+            "all_work_days": days_of_mask(intersect_label(team_masks, "work")),
+            "all_off_days": days_of_mask(intersect_label(team_masks, "off")),
+        },
+    })
 
-    # --- Группы по ISO-неделям из уже нормализованных days
-    if schedule.pattern and schedule.pattern.mode == PatternMode.WEEKDAY:
-        groups = group_days_by_iso_week(days)  # недельная нарезка (пн–вс)
+
+def _resolve_artist(request, artist_id):
+    """(Artist, None) или (None, Response): художника видят он сам, его менеджер и staff."""
+    artist = get_object_or_404(Artist.objects.select_related("user", "manager"), pk=artist_id)
+    allowed = (
+        request.user.is_staff
+        or artist.user_id == request.user.pk
+        or (artist.manager is not None and artist.manager.user_id == request.user.pk)
+    )
+    if not allowed:
+        return None, Response({'error': 'Нет доступа к этому художнику'}, status=403)
+    return artist, None
+
+
+PLANNER_MAX_DAYS = 366
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def commission_plan(request):
+    """
+    Прогноз сдачи незавершённых работ: ?manager= (вся команда, по умолчанию —
+    своя) или ?artist= (один художник), &days= — окно, &start=YYYY-MM-DD.
+    Рабочие часы — из MonthSchedule/DayOverride, работы раскладываются по
+    EDF (utils/capacity_planner.py). Только чтение: недостающие месяцы не
+    создаются.
+    """
+    try:
+        manager_id = request.query_params.get('manager')
+        manager_id = int(manager_id) if manager_id is not None else None
+        artist_id = request.query_params.get('artist')
+        artist_id = int(artist_id) if artist_id is not None else None
+        days = request.query_params.get('days')
+        days = int(days) if days is not None else getattr(settings, "SCHEDULE_PLANNER_HORIZON_DAYS", 120)
+        start = request.query_params.get('start')
+        start = date.fromisoformat(start) if start else None
+    except (ValueError, TypeError):
+        return Response({'error': 'Неверные параметры manager/artist/days/start'}, status=400)
+    if not 1 <= days <= PLANNER_MAX_DAYS:
+        return Response({'error': f'days — от 1 до {PLANNER_MAX_DAYS}'}, status=400)
+
+    if artist_id is not None:
+        artist, error = _resolve_artist(request, artist_id)
+        if error is not None:
+            return error
+        artists = [artist]
     else:
-        groups = group_days_by_cycles(days, schedule.pattern)
+        manager, error = _resolve_team_manager(request, manager_id)
+        if error is not None:
+            return error
+        artists = Artist.objects.filter(manager=manager).select_related("user")
 
-    # --- Сводка по месяцу (агрегаты для фронта) ---
-    # Часы на рабочий день: берём из pattern, иначе дефолт 8
-    hours_per_day = None
-    if schedule.pattern and hasattr(schedule.pattern, "working_day_duration"):
-        try:
-            # working_day_duration может быть Decimal/None — приводим к float/int
-            hours_per_day = float(
-                schedule.pattern.working_day_duration) if schedule.pattern.working_day_duration is not None else None
-        except (TypeError, ValueError):
-            hours_per_day = None
-
-    if hours_per_day is None:
-        hours_per_day = 8.0
-
-    # Счётчики по типам
-    type_counts = {}
-    for itm in days:
-        t = itm.get("type")
-        if not t:
-            continue
-        type_counts[t] = type_counts.get(t, 0) + 1
+    return Response(plan_commissions(artists, start_date=start, days=days))
 
-    work_days = type_counts.get("work", 0)
-    off_days = type_counts.get("off", 0)
-    holidays = type_counts.get("holiday", 0)
-    sick_days = type_counts.get("sick", 0)
 
-    summary = {
-        "work_days": work_days,
-        "off_days": off_days,
-        "holidays": holidays,
-        "sick_days": sick_days,
-        "hours_per_day": hours_per_day,
-        "work_hours_total": int(round(work_days * hours_per_day)),
-        # при необходимости можно добавить и общее число дней:
-        "total_days": len(days),
-        # и «прочие» дни, если у вас есть другие типы:
-        "other_days": sum(c for k, c in type_counts.items() if k not in {"work", "off", "holiday", "sick"}),
-    }
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def auto_schedule_tasks_view(request):
+    """
+    Раскладывает незапланированные и просроченные задачи (event_type=TASK)
+    текущего пользователя по его рабочим дням (utils/task_scheduler.py).
+    Тело/параметры: days, start=YYYY-MM-DD, dry_run=1 — только показать план.
+    """
+    params = request.data if request.data else request.query_params
+    try:
+        days = params.get('days')
+        days = int(days) if days is not None else getattr(settings, "SCHEDULE_PLANNER_HORIZON_DAYS", 120)
+        start = params.get('start')
+        start = date.fromisoformat(start) if start else None
+    except (ValueError, TypeError):
+        return Response({'error': 'Неверные параметры days/start'}, status=400)
+    if not 1 <= days <= PLANNER_MAX_DAYS:
+        return Response({'error': f'days — от 1 до {PLANNER_MAX_DAYS}'}, status=400)
+    dry_run = str(params.get('dry_run', '')).lower() in ('1', 'true')
 
-    payload = {
-        "year": year,
-        "month": month,
-        "pattern": pattern_data,
-        "grouping_mode": "week" if schedule.pattern and schedule.pattern.mode == PatternMode.WEEKDAY else "type_runs",
-        "groups": groups,
-        "days": days,
-        "summary": summary,
-    }
-    return Response(payload)
+    return Response(auto_schedule_tasks(request.user, days=days, start_date=start, dry_run=dry_run))
 
 
-def get_recurrence_type(event) -> str:
-    if event.date_mode == EventDateMode.NUMBER_OF_MONTH:
-        if event.is_recurring_monthly:
-            return 'monthly'
-        else:
-            return 'single'
-    if event.recurrence:
-        return 'rrule'
-    return 'single'
+AVAILABILITY_MAX_DAYS = 92
+AVAILABILITY_MAX_COUNT = 50
+
+
+def _availability_user(request):
+    """Чьё время смотрим: ?artist= (он сам, менеджер, staff) или текущий пользователь."""
+    artist_id = request.query_params.get('artist')
+    if artist_id is None:
+        return request.user, None
+    try:
+        artist_id = int(artist_id)
+    except ValueError:
+        return None, Response({'error': 'Неверный параметр artist'}, status=400)
+    artist, error = _resolve_artist(request, artist_id)
+    return (artist.user if artist is not None else None), error
+
+
+def _free_window_data(window):
+    return {"start": window.start, "end": window.end, "minutes": window.minutes}
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def availability(request):
+    """
+    Свободное рабочее время за период: ?from=&to=[&min_minutes=][&artist=].
+    Рабочие интервалы дней (шаблон + DayOverride, начало — SCHEDULE_WORKDAY_START)
+    минус вхождения событий с длительностью и забронированные Slot'ы.
+    """
+    tz = timezone.get_current_timezone()
+    start_dt = _parse_range_bound(request.query_params.get('from'), 'from', tz)
+    end_dt = _parse_range_bound(request.query_params.get('to'), 'to', tz, inclusive_end=True)
+    try:
+        min_minutes = int(request.query_params.get('min_minutes', 0))
+    except ValueError:
+        return Response({'error': 'Неверный параметр min_minutes'}, status=400)
+    if end_dt < start_dt:
+        return Response({'error': "'from' не может быть позже 'to'"}, status=400)
+    if end_dt - start_dt > timedelta(days=AVAILABILITY_MAX_DAYS):
+        return Response({'error': f'Не больше {AVAILABILITY_MAX_DAYS} дней за запрос'}, status=400)
+
+    user, error = _availability_user(request)
+    if error is not None:
+        return error
+
+    windows = find_free_windows(user, start_dt, end_dt, min_minutes, tz)
+    return Response({
+        "from": start_dt,
+        "to": end_dt,
+        "free_minutes": sum(window.minutes for window in windows),
+        "windows": [_free_window_data(window) for window in windows],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def availability_next(request):
+    """
+    Ближайшие свободные окна под бронь: ?duration=120&count=5[&after=][&artist=].
+    Свободные интервалы режутся на окна длиной duration подряд.
+    """
+    tz = timezone.get_current_timezone()
+    try:
+        duration = int(request.query_params.get('duration', 120))
+        count = int(request.query_params.get('count', 1))
+    except ValueError:
+        return Response({'error': 'Неверные параметры duration/count'}, status=400)
+    if duration < 1 or not 1 <= count <= AVAILABILITY_MAX_COUNT:
+        return Response({'error': f'duration > 0, count — от 1 до {AVAILABILITY_MAX_COUNT}'}, status=400)
+    after = request.query_params.get('after')
+    after = _parse_range_bound(after, 'after', tz) if after else None
+
+    user, error = _availability_user(request)
+    if error is not None:
+        return error
+
+    windows = next_free_windows(user, duration, count, after=after, tz=tz)
+    return Response({
+        "duration": duration,
+        "count": len(windows),
+        "windows": [_free_window_data(window) for window in windows],
+    })
+
+
+# ------------------------------------------------------------
+# 🔹 Мониторинг кэшей расписания
+# ------------------------------------------------------------
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """Счётчики кэшей расписания текущего процесса: RRULE, месячные ответы, разметка дней."""
+    return Response({
+        "recurrence": recurrence_cache.stats(),
+        "month": month_cache.stats(),
+        "day_types": day_types_memo.stats(),
+    })
 
 
 class SlotViewSet(viewsets.ModelViewSet):